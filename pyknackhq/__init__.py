@@ -12,15 +12,58 @@ Quick start guide is at http://www.wbh-doc.com.s3.amazonaws.com/pyknackhq/quick%
 :license: MIT, see LICENSE for more details.
 """
 
-from .client import KnackhqAuth, KnackhqClient
-from .schema import Application
-from .datatype import (dtype, 
-    ShortTextType, ParagraphTextType, YesNoType, 
-    SingleChoiceType, MultipleChoiceType, 
-    DateTimeType, DateTimeFromToType, NumberType, 
-    AddressType, NameType, LinkType, EmailType, 
-    PhoneType, RichTextType, TimerType, CurrencyType, RatingType,
-)
+import sys
+
+_lazy_attrs = {
+    "KnackhqAuth": "client",
+    "KnackhqClient": "client",
+    "Application": "schema",
+    "KnackhqError": "exc",
+    "BulkResult": "pool",
+    "Snapshot": "snapshot",
+}
+for _name in ["dtype", 
+    "ShortTextType", "ParagraphTextType", "YesNoType", 
+    "SingleChoiceType", "MultipleChoiceType", 
+    "DateTimeType", "DateTimeFromToType", "NumberType", 
+    "ImageType", "FileType",
+    "AddressType", "NameType", "LinkType", "EmailType", 
+    "PhoneType", "RichTextType", "TimerType", "CurrencyType", "RatingType",
+    "json_default", "DataTypeJSONEncoder"]:
+    _lazy_attrs[_name] = "datatype"
+
+if sys.version_info >= (3, 7):
+    # submodules (and requests) are imported on first attribute access,
+    # so ``import pyknackhq`` and the command line tool start fast.
+    def __getattr__(name):
+        try:
+            module_name = _lazy_attrs[name]
+        except KeyError:
+            raise AttributeError(
+                "module 'pyknackhq' has no attribute '%s'" % name)
+        import importlib
+        value = getattr(
+            importlib.import_module("pyknackhq." + module_name), name)
+        globals()[name] = value
+        return value
+    
+    def __dir__():
+        return sorted(set(globals()) | set(_lazy_attrs))
+else: # pragma: no cover, module __getattr__ is not supported
+    from .client import KnackhqAuth, KnackhqClient
+    from .schema import Application
+    from .exc import KnackhqError
+    from .pool import BulkResult
+    from .snapshot import Snapshot
+    from .datatype import (dtype, 
+        ShortTextType, ParagraphTextType, YesNoType, 
+        SingleChoiceType, MultipleChoiceType, 
+        DateTimeType, DateTimeFromToType, NumberType, 
+        ImageType, FileType,
+        AddressType, NameType, LinkType, EmailType, 
+        PhoneType, RichTextType, TimerType, CurrencyType, RatingType,
+        json_default, DataTypeJSONEncoder,
+    )
 
 __version__ = "0.0.2"
 __short_description__ = "knackhq root access Python API."
\ No newline at end of file
@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Module description
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Backup and restore a whole :class:`~pyknackhq.schema.Application`.
+
+A backup directory looks like::
+
+    backup_dir
+        |--- schema.json          # Application.to_json
+        |--- object_1.jsonl.gz    # raw values, keyed by field key, with id
+        |--- object_2.jsonl.gz
+        |--- ...
+        |--- manifest.json        # {object_key: number of records}
+
+All objects are scanned in parallel, every request takes a token from the
+client's :class:`~pyknackhq.pool.RateBudget`, so the whole backup runs at the
+api rate limit. ``manifest.json`` is written last, a directory without it is
+an incomplete backup.
+
+Restore inserts objects in :meth:`~pyknackhq.schema.Application.dependency_order`,
+so the records a connection field points to already exist, and their new id
+is known. Connections to an object that is not restored yet (self reference,
+connection cycle) are filled in with an update after all inserts. Connections
+to an object left out of a partial restore are not set, with a warning.
+
+
+Import Command
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+from pyknackhq.backup import backup, restore
+"""
+
+from __future__ import print_function
+from pyknackhq.js import (load_js, safe_dump_js,
+    JsonlWriter, iter_jsonl)
+from pyknackhq.schema import Application
+from pyknackhq.pool import map_concurrent, run_bulk, BulkResult
+from pyknackhq.exc import KnackhqError
+import warnings
+import os
+
+SCHEMA_FILE = "schema.json"
+MANIFEST_FILE = "manifest.json"
+
+#: field type computed by knackhq, can't be inserted
+COMPUTED_FIELD_TYPE = frozenset(["auto_increment", "equation",
+    "concatenation", "sum", "min", "max", "average", "count"])
+
+def _data_file(dirpath, object_key):
+    return os.path.join(dirpath, "%s.jsonl.gz" % object_key)
+
+def backup(client, dirpath, workers=4, object_keys=None, replace=False):
+    """Backup records of all objects of an application to a directory.
+    Returns ``{object_key: number of records}``.
+
+    :param client: :class:`~pyknackhq.client.KnackhqClient` instance
+    :param workers: number of objects scanned at the same time
+    :param object_keys: list of object key to backup, default all objects
+    :param replace: set True to overwrite an existing backup
+
+    **中文文档**
+
+    并行地备份整个App的所有Object的数据和Schema。
+    """
+    if not os.path.exists(dirpath):
+        os.makedirs(dirpath)
+    manifest_path = os.path.join(dirpath, MANIFEST_FILE)
+    if os.path.exists(manifest_path):
+        if replace:
+            os.remove(manifest_path)
+        else:
+            raise Exception("\tCANNOT WRITE to %s, it's already "
+                            "a backup!" % dirpath)
+
+    client.application.to_json(os.path.join(dirpath, SCHEMA_FILE))
+    if object_keys is None:
+        object_keys = client.all_object_key
+
+    def dump_object(object_key):
+        collection = client.get_collection(object_key, using_name=False)
+        with JsonlWriter(_data_file(dirpath, object_key),
+                         replace=True) as writer:
+            writer.write_many(collection.iter_find(
+                using_name=False, recovery_name=False))
+        return writer.count
+
+    counts = map_concurrent(dump_object, object_keys, workers=workers)
+    manifest = dict(zip(object_keys, counts))
+    safe_dump_js(manifest, manifest_path, enable_verbose=False)
+    return manifest
+
+def _connected_ids(value):
+    """Raw connection value ``[{"id": ..., "identifier": ...}]`` to id list.
+    """
+    if isinstance(value, list):
+        return [v["id"] if isinstance(v, dict) else v for v in value]
+    elif isinstance(value, dict):
+        return [value["id"]]
+    elif value:
+        return [value]
+    return []
+
+def restore(client, dirpath, workers=4, object_keys=None, batch_size=1000):
+    """Restore a backup created by :func:`backup` into the application of
+    ``client``, which has to have the same object and field keys, usually
+    the same app or a copy of it. Records get new id, connection field values
+    are remapped to the new id.
+
+    Returns ``{object_key: BulkResult}``, inputs of failed records are the
+    backup records with their old id. If some connections are filled in 
+    after all inserts, the result of those updates is under the key 
+    ``"connections"``, with ``(object_key, old id, {field_key: old ids})`` 
+    as input, the update of a record which failed to insert fails too.
+
+    :param object_keys: list of object key to restore, default all objects in
+      the backup.
+
+    Raise ``IOError`` if ``manifest.json`` is missing, the backup is 
+    incomplete.
+
+    **中文文档**
+
+    按照Object之间的依赖顺序恢复备份, 并将Connection字段中的旧id替换为新id。
+    """
+    manifest = load_js(os.path.join(dirpath, MANIFEST_FILE),
+                       default=None, enable_verbose=False)
+    if manifest is None:
+        raise IOError("%s is not a complete backup, %s is missing!" % (
+            dirpath, MANIFEST_FILE))
+    application = Application.from_json(os.path.join(dirpath, SCHEMA_FILE))
+    if object_keys is None:
+        object_keys = list(manifest)
+    object_keys = set(object_keys)
+    object_keys = [key for key in application.dependency_order()
+                   if key in object_keys]
+    restored = set(object_keys)
+
+    id_map = dict() # {object_key: {old id: new id}}
+    deferred = list() # [(object_key, old id, {field_key: old ids})]
+    results = dict()
+    targets = dict() # {object_key: {connection field_key: object_key}}
+    for object_key in object_keys:
+        object_ = application.get_object(object_key, using_name=False)
+        connections = dict()
+        skip = set([field.key for field in object_
+                    if field.type in COMPUTED_FIELD_TYPE])
+        for field, target in object_.connection_fields:
+            if target in restored:
+                connections[field.key] = target
+            else:
+                skip.add(field.key)
+                warnings.warn("%s.%s connects to %s which is not restored, "
+                              "it is left empty" % (
+                                  object_key, field.key, target))
+        targets[object_key] = connections
+        collection = client.get_collection(object_key, using_name=False)
+        mapping = id_map.setdefault(object_key, dict())
+
+        def to_insert(record):
+            data, later = dict(), dict()
+            for key, value in record.items():
+                if key == "id" or key in skip:
+                    continue
+                if key in connections:
+                    target_map = id_map.get(connections[key])
+                    old_ids = _connected_ids(value)
+                    if target_map is None or connections[key] == object_key:
+                        if old_ids:
+                            later[key] = old_ids
+                        continue
+                    value = [target_map[i] for i in old_ids if i in target_map]
+                data[key] = value
+            if later:
+                deferred.append((object_key, record["id"], later))
+            return data
+
+        def insert_batch(batch):
+            result = collection.insert([to_insert(record) for record in batch],
+                                       using_name=False, workers=workers)
+            for record, res in zip(batch, result.results):
+                if res is not None:
+                    mapping[record["id"]] = res["id"]
+            # report failure with the backup record, not the translated one
+            result.failed = [(index, batch[index], error)
+                             for index, _, error in result.failed]
+            return result
+
+        result = BulkResult()
+        batch = list()
+        for record in iter_jsonl(_data_file(dirpath, object_key)):
+            batch.append(record)
+            if len(batch) >= batch_size:
+                result.extend(insert_batch(batch))
+                batch = list()
+        if batch:
+            result.extend(insert_batch(batch))
+        results[object_key] = result
+
+    # fill in connections to objects restored later
+    def update(item):
+        object_key, old_id, later = item
+        new_id = id_map[object_key].get(old_id)
+        if new_id is None: # the record itself failed
+            raise KnackhqError(
+                "record %s of %s was not restored, can't set its "
+                "connections" % (old_id, object_key), retryable=False)
+        data = dict()
+        for key, old_ids in later.items():
+            target_map = id_map.get(targets[object_key][key], dict())
+            data[key] = [target_map[i] for i in old_ids if i in target_map]
+        return client.auth.request("PUT",
+            "https://api.knackhq.com/v1/objects/%s/records/%s" % (
+                object_key, new_id), data=data)
+
+    if deferred:
+        results["connections"] = run_bulk(update, deferred, workers=workers,
+            errors=KnackhqError)
+    return results
@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Module description
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+``pyknackhq`` command line tool, for one-shot jobs like cron tasks.
+
+Subcommands:
+
+- ``export OBJECT PATH``: export all records to json lines file
+- ``import OBJECT PATH``: insert all records from json lines file
+- ``truncate OBJECT --yes``: delete all records
+- ``count OBJECT``: print the number of records
+- ``schema-dump PATH``: save the application schema to json file
+- ``backup DIR``: backup schema and records of all objects
+- ``restore DIR``: restore a backup, connection id are remapped
+
+Credential is read from ``--auth auth.json``, or from the environment variable
+``KNACKHQ_APPLICATION_ID`` and ``KNACKHQ_API_KEY``. Use ``--schema`` to load
+the application schema from a local file instead of the server.
+
+Only :mod:`argparse` is imported on start up, :mod:`pyknackhq.client` and
+``requests`` are imported when a subcommand runs, so ``pyknackhq --help`` is
+instant.
+
+``import`` and ``truncate`` print a summary, and exit with status 2 if any
+record failed.
+
+Usage::
+
+    $ pyknackhq --auth auth.json export "test_object" test_object.jsonl.gz
+    $ pyknackhq --auth auth.json --workers 8 import "test_object" data.jsonl \\
+        --failed failed.jsonl
+
+
+Import Command
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+from pyknackhq.cli import main
+"""
+
+from __future__ import print_function
+import argparse
+import sys
+import os
+
+def make_client(args):
+    from pyknackhq.client import KnackhqAuth, KnackhqClient
+    from pyknackhq.schema import Application
+
+    if args.auth:
+        auth = KnackhqAuth.from_json(args.auth)
+    else:
+        try:
+            auth = KnackhqAuth(os.environ["KNACKHQ_APPLICATION_ID"],
+                               os.environ["KNACKHQ_API_KEY"])
+        except KeyError:
+            raise SystemExit("credential not found, use --auth or set "
+                             "KNACKHQ_APPLICATION_ID and KNACKHQ_API_KEY")
+    if args.schema:
+        application = Application.from_json(args.schema)
+    else:
+        application = None
+    return KnackhqClient(auth=auth, application=application)
+
+def get_collection(client, name):
+    """Get collection by object name, or by object key.
+    """
+    try:
+        return client.get_collection(name)
+    except ValueError:
+        return client.get_collection(name, using_name=False)
+
+def cmd_export(args):
+    collection = get_collection(make_client(args), args.object)
+    if args.index:
+        n = collection.export_indexed(
+            args.path, index_fields=args.index, replace=args.replace)
+    else:
+        n = collection.export_jsonl(args.path, replace=args.replace)
+    print("%s records exported to '%s'" % (n, args.path))
+
+def report(result, failed_path=None):
+    """Print summary of a :class:`~pyknackhq.pool.BulkResult`, save failed
+    inputs to ``failed_path`` so that only those get retried.
+    """
+    summary = result.summary()
+    print("%(succeeded)s succeeded, %(failed)s failed, "
+          "%(retryable)s retryable" % summary)
+    for status, n in sorted(summary["failed_by_status"].items(), 
+                            key=lambda item: str(item[0])):
+        print("  status %s: %s" % (status, n))
+    if result.failed and failed_path:
+        from pyknackhq.js import dump_jsonl
+        dump_jsonl(result.failed_inputs, failed_path, replace=True)
+        print("failed inputs saved to '%s'" % failed_path)
+    return 0 if result.ok else 2
+
+def cmd_import(args):
+    collection = get_collection(make_client(args), args.object)
+    return report(collection.import_jsonl(args.path, workers=args.workers),
+                  args.failed)
+
+def cmd_truncate(args):
+    if not args.yes:
+        raise SystemExit("refuse to delete all records without --yes")
+    collection = get_collection(make_client(args), args.object)
+    return report(collection.delete_all(workers=args.workers))
+
+def cmd_count(args):
+    collection = get_collection(make_client(args), args.object)
+    # counts in a local schema file may be stale
+    print(collection.count(exact=bool(args.schema)))
+
+def cmd_schema_dump(args):
+    make_client(args).export_schema(args.path)
+    print("schema saved to '%s'" % args.path)
+
+def cmd_backup(args):
+    manifest = make_client(args).backup(
+        args.dir, workers=args.workers, replace=args.replace)
+    print("%s records of %s objects saved to '%s'" % (
+        sum(manifest.values()), len(manifest), args.dir))
+
+def cmd_restore(args):
+    results = make_client(args).restore(args.dir, workers=args.workers)
+    status = 0
+    for object_key, result in results.items():
+        print("%s:" % object_key)
+        status = max(status, report(result))
+    return status
+
+def make_parser():
+    parser = argparse.ArgumentParser(
+        prog="pyknackhq", description="knackhq command line tool.")
+    parser.add_argument("--auth",
+        help="json file with application_id and api_key")
+    parser.add_argument("--schema",
+        help="local application schema json file, skip downloading")
+    parser.add_argument("--workers", type=int, default=4,
+        help="number of concurrent requests for bulk operation")
+    subparsers = parser.add_subparsers(dest="command")
+
+    sub = subparsers.add_parser("export", help="export records to json lines")
+    sub.add_argument("object", help="object name or key")
+    sub.add_argument("path", help=".jsonl, .gz, .bz2, .xz file")
+    sub.add_argument("--replace", action="store_true",
+        help="overwrite existing file")
+    sub.add_argument("--index", nargs="+", metavar="FIELD",
+        help="also build an id and unique field index, .jsonl only")
+    sub.set_defaults(func=cmd_export)
+
+    sub = subparsers.add_parser("import",
+        help="insert records from json lines")
+    sub.add_argument("object", help="object name or key")
+    sub.add_argument("path", help=".jsonl, .gz, .bz2, .xz file")
+    sub.add_argument("--failed", metavar="PATH",
+        help="save failed records to this json lines file for retry")
+    sub.set_defaults(func=cmd_import)
+
+    sub = subparsers.add_parser("truncate", help="delete all records")
+    sub.add_argument("object", help="object name or key")
+    sub.add_argument("--yes", action="store_true",
+        help="confirm deleting all records")
+    sub.set_defaults(func=cmd_truncate)
+
+    sub = subparsers.add_parser("count", help="print number of records")
+    sub.add_argument("object", help="object name or key")
+    sub.set_defaults(func=cmd_count)
+
+    sub = subparsers.add_parser("schema-dump",
+        help="save application schema to json file")
+    sub.add_argument("path", help="json file")
+    sub.set_defaults(func=cmd_schema_dump)
+
+    sub = subparsers.add_parser("backup",
+        help="backup schema and records of all objects")
+    sub.add_argument("dir", help="backup directory")
+    sub.add_argument("--replace", action="store_true",
+        help="overwrite existing backup")
+    sub.set_defaults(func=cmd_backup)
+
+    sub = subparsers.add_parser("restore", help="restore a backup")
+    sub.add_argument("dir", help="backup directory")
+    sub.set_defaults(func=cmd_restore)
+    return parser
+
+def main(argv=None):
+    """Entry point of ``pyknackhq`` console script.
+    """
+    parser = make_parser()
+    args = parser.parse_args(argv)
+    if getattr(args, "func", None) is None:
+        parser.print_help()
+        return 1
+    return args.func(args) or 0
+
+if __name__ == "__main__":
+    sys.exit(main())
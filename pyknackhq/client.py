@@ -2,10 +2,27 @@
 # -*- coding: utf-8 -*-
 
 from __future__ import print_function
-from pyknackhq.js import load_js, safe_dump_js, js2str, prt_js
+from pyknackhq.js import (load_js, safe_dump_js, js2str, prt_js, 
+    RecordStream, JsonlWriter, iter_jsonl, dump_indexed_jsonl)
 from pyknackhq.schema import Application, Object
+from pyknackhq.encoder import Encoder
+from pyknackhq.decoder import Decoder
+from pyknackhq.validator import Validator
+from pyknackhq.pool import RateBudget, run_bulk, BulkResult
+from pyknackhq.exc import KnackhqError
+from pyknackhq.backup import backup, restore
+from pyknackhq.reconcile import plan_reconcile, key_of, NUMERIC_FIELD_TYPE
+from pyknackhq.include import fetch_by
+from pyknackhq.query import Query
+from pyknackhq.upload import upload_assets
+from pyknackhq import download
+from pyknackhq.store import RecordStore
+from pyknackhq.planner import estimate
+from pyknackhq.py23compatible import _str_type
+from collections import OrderedDict
+from pyknackhq import codec
+import threading
 import requests
-import json
 
 class Collection(Object):
     """A collection is the equivalent of an RDBMS table, collection of MongoDB 
@@ -15,10 +32,27 @@ class Collection(Object):
     - :meth:`~Collection.insert`
     - :meth:`~Collection.find_one`
     - :meth:`~Collection.find`
+    - :meth:`~Collection.query`
+    - :meth:`~Collection.get_many`
+    - :meth:`~Collection.count`
+    - :meth:`~Collection.explain`
+    - :meth:`~Collection.iter_find`
+    - :meth:`~Collection.to_store`
     - :meth:`~Collection.update_one`
+    - :meth:`~Collection.update`
     - :meth:`~Collection.delete_one`
     - :meth:`~Collection.delete_all` 
+    - :meth:`~Collection.validate`
+    - :meth:`~Collection.reconcile`
+    - :meth:`~Collection.export_jsonl`
+    - :meth:`~Collection.import_jsonl`
+    - :meth:`~Collection.export_indexed`
+    - :meth:`~Collection.download_assets`
     """
+    budget = None # RateBudget shared with the client
+    client = None # KnackhqClient this collection comes from
+    schema_version = 0 # increased each time the schema of this object changes
+    
     def __str__(self):
         return "Collection('%s')" % self.name
                 
@@ -37,6 +71,56 @@ class Collection(Object):
     def post_url(self):
         return "https://api.knackhq.com/v1/objects/%s/records" % self.key
         
+    @property
+    def encoder(self):
+        """The :class:`~pyknackhq.encoder.Encoder` of this collection, compiled
+        on first access.
+        """
+        try:
+            return self._encoder
+        except AttributeError:
+            self._encoder = Encoder(self)
+            return self._encoder
+    
+    @property
+    def decoder(self):
+        """The :class:`~pyknackhq.decoder.Decoder` of this collection, compiled
+        on first access.
+        """
+        try:
+            return self._decoder
+        except AttributeError:
+            self._decoder = Decoder(self)
+            return self._decoder
+    
+    @property
+    def validator(self):
+        """The :class:`~pyknackhq.validator.Validator` of this collection, 
+        compiled on first access.
+        """
+        try:
+            return self._validator
+        except AttributeError:
+            self._validator = Validator(self)
+            return self._validator
+    
+    def validate(self, data, using_name=True, partial=False, existing=None):
+        """Validate one or many records locally against the schema, no api 
+        request is sent. Returns list of :class:`~pyknackhq.validator.Invalid`,
+        empty if everything is fine.
+        
+        :param data: dict type data or list of dict
+        :param partial: True for update, required fields are not checked.
+        :param existing: optional local index of existing values of unique
+          fields, ``{field_name: set of values}``.
+        
+        **中文文档**
+        
+        在本地根据Schema检查数据, 返回所有错误。
+        """
+        return self.validator.validate(data, using_name=using_name,
+                                       partial=partial, existing=existing)
+    
     def convert_keys(self, pydict):
         """Convert field_name to field_key.
                
@@ -76,8 +160,34 @@ class Collection(Object):
                     new_dict[field.key] = pydict[raw_key]
         return new_dict
     
+    def _make_translator(self, raw=True, recovery_name=True, 
+                         fields=None, using_name=True):
+        """Compile a function doing what :meth:`Collection.get_raw_values` 
+        or :meth:`Collection.get_html_values` does, for the projected 
+        ``fields`` only (all fields if None). Field names are resolved once.
+        """
+        if fields is None:
+            selected = list(self)
+        else:
+            selected = [self.get_field(name, using_name=using_name) 
+                        for name in fields]
+        pairs = [("%s_raw" % field.key if raw else field.key,
+                  field.name if recovery_name else field.key) 
+                 for field in selected]
+        
+        def translate(pydict):
+            new_dict = {"id": pydict["id"]}
+            for src, dst in pairs:
+                if src in pydict:
+                    new_dict[dst] = pydict[src]
+            return new_dict
+        return translate
+    
     def convert_values(self, pydict):
         """Convert knackhq data type instance to json friendly data.
+        
+        Not needed to send data any more, :mod:`pyknackhq.codec` serializes
+        data type instance directly.
         """
         new_dict = dict()
         for key, value in pydict.items():
@@ -98,6 +208,10 @@ class Collection(Object):
         For more information of the raw structure of all data type, read this:
         http://helpdesk.knackhq.com/support/solutions/articles/5000446405-field-types
         
+        Plain python values (datetime, date, dict, tuple) are encoded by 
+        :attr:`Collection.encoder` according to field type, see 
+        :mod:`pyknackhq.encoder`.
+        
         :param data: dict type data
         :param using_name: if you are using field_name in data,
           please set using_name = True (it's the default), otherwise, False
@@ -106,30 +220,50 @@ class Collection(Object):
         
         插入一条记录
         """
-        data = self.convert_values(data)
-        if using_name:
-            data = self.convert_keys(data)
+        data = self.encoder.encode(data, using_name=using_name)
         res = self.post(self.post_url, data)
         return res
     
-    def insert(self, data, using_name=True):
+    def insert(self, data, using_name=True, validate=False, workers=1,
+               keep_results=True):
         """Insert one or many records.
 
         :param data: dict type data or list of dict
         :param using_name: if you are using field name in data,
           please set using_name = True (it's the default), otherwise, False
-          
+        :param validate: if True, validate the whole batch locally first,
+          raise :class:`~pyknackhq.validator.ValidationError` before any 
+          record is sent if anything is invalid.
+        :param workers: number of concurrent requests for a list of records,
+          all workers share the rate budget of the client, see 
+          :class:`KnackhqAuth`.
+        :param keep_results: if False, the inserted records returned by 
+          knackhq are not kept in the :class:`~pyknackhq.pool.BulkResult`, 
+          only counted.
+        
+        For a list of records, returns a :class:`~pyknackhq.pool.BulkResult`,
+        a failed record doesn't stop the others, it is reported with its
+        :class:`~pyknackhq.exc.KnackhqError` in ``BulkResult.failed``.
+        
         **中文文档**
         
         插入多条记录
         """
+        if validate:
+            self.validator.check(data, using_name=using_name)
         if isinstance(data, list): # if iterable, insert one by one
-            for d in data:
-                self.insert_one(d, using_name=using_name)
+            encode = self.encoder.encode
+            def insert(record):
+                return self.request("POST", self.post_url, 
+                                    data=encode(record, using_name))
+            return run_bulk(insert, data, workers=workers,
+                            errors=(KnackhqError, ValueError),
+                            keep_results=keep_results)
         else: # not iterable, execute insert_one
-            self.insert_one(data, using_name=using_name)
+            return self.insert_one(data, using_name=using_name)
 
-    def find_one(self, id_, raw=True, recovery_name=True):
+    def find_one(self, id_, raw=True, recovery_name=True, decode=False,
+                 fields=None, using_name=True):
         """Find one record.
         
         Ref: http://helpdesk.knackhq.com/support/solutions/articles/5000446111-api-reference-root-access#retrieve
@@ -141,32 +275,204 @@ class Collection(Object):
           Otherwise, html format
         :param recovery_name: Default True, set True if you want field name 
           instead of field key
+        :param decode: Default False, set True to convert raw values to 
+          native python values, see :mod:`pyknackhq.decoder`. Only works with
+          raw = True.
+        :param fields: list of field to keep, others are dropped. Field name
+          if using_name is True, otherwise field key.
           
         **中文文档**
         
         返回一条记录
         """
-            
+        translate = self._make_translator(raw, recovery_name, 
+                                          fields, using_name)
         url = "https://api.knackhq.com/v1/objects/%s/records/%s" % (
             self.key, id_)
         res = self.get(url)
         
-        if raw:
-            try:
-                res = self.get_raw_values(res, recovery_name=recovery_name)
-            except:
-                pass
-        else:
-            try:
-                res = self.get_html_values(res, recovery_name=recovery_name)
-            except:
-                pass
+        try:
+            res = translate(res)
+        except:
+            return res
+        if raw and decode:
+            res = self.decoder.decode(res)
         return res
 
-    def find(self, filter=list(), 
+    def get_many(self, values, by="id", using_name=True, raw=True, 
+                 recovery_name=True, decode=False, chunk_size=50, workers=1):
+        """Get many records by id or by a unique field. Duplicate values are
+        looked up once, values are packed into ``or`` filter queries of 
+        ``chunk_size`` values, queries run concurrently.
+        
+        Returns an OrderedDict ``{value: record}`` in input order, a value
+        without matching record maps to None. If any query fails, 
+        :class:`~pyknackhq.exc.KnackhqError` is raised and nothing is 
+        returned, so None always means the record doesn't exist.
+        
+        :param values: list of record id or unique field value
+        :param by: "id" or a unique field name (key if using_name is False)
+        :param chunk_size: number of values per request
+        :param workers: number of concurrent requests
+        
+        Other parameters are the same as :meth:`Collection.find`.
+        
+        **中文文档**
+        
+        根据id或唯一字段批量获取记录, 自动去重, 合并为少量的OR查询并发执行。
+        """
+        if by == "id":
+            field_key, numeric = "id", False
+        else:
+            field = self.get_field(by, using_name=using_name)
+            field_key = field.key
+            numeric = field.type in NUMERIC_FIELD_TYPE
+        
+        result = OrderedDict()
+        for value in values:
+            result.setdefault(value, None)
+        
+        found = dict() # {normalized value: record}
+        folded = dict() # same with lower case, knackhq "is" ignores case
+        for record in fetch_by(self, field_key, list(result), 
+                               chunk_size=chunk_size, workers=workers):
+            if field_key == "id":
+                value = record["id"]
+            else:
+                value = record.get("%s_raw" % field_key)
+                if isinstance(value, dict): # email, link, phone
+                    value = value.get("email") or value.get("url") \
+                        or value.get("full")
+            key = key_of(value, numeric)
+            found.setdefault(key, record)
+            if isinstance(key, _str_type):
+                folded.setdefault(key.lower(), record)
+        
+        for value in result:
+            key = key_of(value, numeric)
+            record = found.get(key)
+            if record is None and isinstance(key, _str_type):
+                record = folded.get(key.lower())
+            if record is not None:
+                if raw:
+                    record = self.get_raw_values(record, recovery_name)
+                    if decode:
+                        record = self.decoder.decode(record)
+                else:
+                    record = self.get_html_values(record, recovery_name)
+                result[value] = record
+        return result
+    
+    def _sample(self, filter, using_name):
+        """Request a one row page, returns (total_records, bytes of the
+        record in the api response). Raise 
+        :class:`~pyknackhq.exc.KnackhqError` if the request fails.
+        """
+        params = self._find_params(filter, None, None, 1, 1, using_name)
+        res = self.request("GET", self.get_url, params=params)
+        try:
+            records = res["records"]
+            total = int(res["total_records"])
+        except (KeyError, TypeError, ValueError):
+            raise KnackhqError("unexpected response: %r" % (res,),
+                               body=res, url=self.get_url)
+        if records:
+            return total, len(codec.dumpb(records[0]))
+        return total, 0
+    
+    def count(self, filter=None, using_name=True, exact=False):
+        """Number of records matching the filter. 
+        
+        Without filter, the ``counts`` of the application schema is used, no
+        request is sent. Otherwise, or if ``exact`` is True, a one row page
+        is requested and its ``total_records`` is returned, a failed request
+        raises :class:`~pyknackhq.exc.KnackhqError`.
+        
+        **中文文档**
+        
+        返回满足条件的记录数。
+        """
+        if (not filter) and (not exact):
+            application = getattr(self.client, "application", None)
+            counts = getattr(application, "counts", None) or dict()
+            if self.key in counts:
+                return counts[self.key]
+        return self._sample(filter, using_name)[0]
+    
+    def explain(self, operation, filter=None, records=None, using_name=True,
+                workers=1, latency=0.3):
+        """Estimate api calls, wall time and bytes of a bulk job, one
+        request is sent to count the records and measure their size, a 
+        failed request raises :class:`~pyknackhq.exc.KnackhqError`.
+        
+        :param operation: "export", "update", "delete" or "insert"
+        :param filter: records involved, for export, update and delete
+        :param records: number of records, required for insert. Overrides 
+          the count for others.
+        :param workers: number of concurrent write requests planned
+        :param latency: average seconds of one request
+        :returns: :class:`~pyknackhq.planner.Estimate`
+        
+        Usage::
+        
+            >>> collection.explain("delete", workers=4)
+            Estimate(operation='delete', records=2500, read_requests=3, 
+            write_requests=2500, api_calls=2503, seconds=250.3, bytes=0)
+        
+        **中文文档**
+        
+        估算批量操作需要的API调用次数, 在速率限制下的耗时, 以及数据量。
+        """
+        total, record_bytes = self._sample(filter, using_name)
+        if records is None:
+            if operation == "insert":
+                raise ValueError("records is required for insert!")
+            records = total
+        rate = self.budget.rate if self.budget is not None else 10
+        return estimate(operation, records, record_bytes=record_bytes, 
+                        rate=rate, workers=workers, latency=latency)
+    
+    def _find_params(self, filter, sort_field, sort_order, 
+                     page, rows_per_page, using_name):
+        """Build the http get parameters for :meth:`Collection.find`. The
+        criteria in ``filter`` are not modified.
+        """
+        return Query(self, filter, sort_field, sort_order, rows_per_page,
+                     using_name).page_params(page)
+    
+    def query(self, filter=None, 
+              sort_field=None, sort_order=None, rows_per_page=None,
+              using_name=True, raw=True, recovery_name=True, 
+              include=None, fields=None):
+        """Prepare a find query, returns a :class:`~pyknackhq.query.Query`.
+        Field names are resolved, the filter is serialized and the record 
+        translator is compiled once, the query can then be executed many 
+        times with ``query.find(page=...)`` or ``query.iter_find()``. Queries
+        with the same criteria are equal, they can be used as cache key.
+        
+        Parameters are the same as :meth:`Collection.find`.
+        
+        Usage::
+        
+            >>> query = collection.query(
+            ...     [{"field": "status", "operator": "is", "value": "new"}],
+            ...     sort_field="created", sort_order=-1, rows_per_page=100)
+            >>> while True:
+            ...     records = query.find(page=1)
+            ...     time.sleep(60)
+        
+        **中文文档**
+        
+        创建一个可以反复执行的预编译查询。
+        """
+        return Query(self, filter, sort_field, sort_order, rows_per_page,
+                     using_name, raw, recovery_name, include, fields)
+    
+    def find(self, filter=None, 
              sort_field=None, sort_order=None, 
              page=None, rows_per_page=None,
-             using_name=True, data_only=True, raw=True, recovery_name=True):
+             using_name=True, data_only=True, raw=True, recovery_name=True,
+             stream=False, decode=False, include=None, fields=None):
         """Execute a find query.
         
         Ref: http://helpdesk.knackhq.com/support/solutions/articles/5000446111-api-reference-root-access#retrieve
@@ -187,72 +493,99 @@ class Collection(Object):
           Otherwise, html format
         :param recovery_name: Default True, set True if you want field name
           instead of field key
+        :param stream: Default False, set True to parse the response
+          incrementally. Returns a :class:`~pyknackhq.js.RecordStream`
+          yielding records one by one, the pagination metadata is available
+          in its ``meta`` attribute. ``data_only`` is ignored.
+        :param decode: Default False, set True to convert raw values to 
+          native python values, see :mod:`pyknackhq.decoder`. Only works with
+          raw = True.
+        :param include: list of connection field, each reference is replaced
+          with the full connected record, fetched in a few batched queries, 
+          see :mod:`pyknackhq.include`. Only works with raw = True and 
+          stream = False.
+        :param fields: list of field to keep, projection is applied while
+          records are translated, the other fields are never copied.
+          Field name if using_name is True, otherwise field key.
+        
+        To run the same query many times, prepare it once with 
+        :meth:`Collection.query`.
         
         **中文文档**
         
         返回多条记录
         """
-        if using_name:            
-            for criterion in filter:
-                criterion["field"] = self.get_field_key(criterion["field"])
-            
-            if sort_field:
-                sort_field = self.get_field_key(sort_field)
-            
-        if sort_order is None:
-            pass
-        elif sort_order == 1:
-            sort_order = "asc"
-        elif sort_order == -1:
-            sort_order = "desc"
-        else:
-            raise ValueError
-        
-        params = dict()
-        if len(filter) >= 1:
-            params["filters"] = json.dumps(filter)
-        
-        if sort_field:
-            params["sort_field"] = sort_field
-            params["sort_order"] = sort_order
-        
-        if (page is not None) \
-            and (rows_per_page is not None) \
-            and isinstance(page, int) \
-            and isinstance(rows_per_page, int) \
-            and (page >= 1) \
-            and (rows_per_page >= 1):
-            params["page"] = page
-            params["rows_per_page"] = rows_per_page
-            
-        res = self.get(self.get_url, params)
-        
-        # handle data_only and recovery
-        if data_only:
-            try:
-                res = res["records"]
-                if raw:
-                    res = [self.get_raw_values(data, recovery_name) for data in res]
-                else:
-                    res = [self.get_html_values(data, recovery_name) for data in res]
-            except KeyError:
-                pass
-        else:
-            if raw:
-                try:
-                    res["records"] = [
-                        self.get_raw_values(data, recovery_name) for data in res["records"]]
-                except KeyError:
-                    pass
-            else:
-                try:
-                    res["records"] = [
-                        self.get_html_values(data, recovery_name) for data in res["records"]]
-                except KeyError:
-                    pass
-        return res
+        return self.query(filter, sort_field, sort_order, rows_per_page,
+                          using_name, raw, recovery_name, include, fields
+                          ).find(page, data_only, decode, stream)
+    
+    def _translate_stream(self, stream, raw, recovery_name, decode=False,
+                          translate=None):
+        """Wrap a :class:`~pyknackhq.js.RecordStream`, translate each record
+        to raw or html values as it is decoded.
+        
+        :param translate: function made by :meth:`Collection._make_translator`
+        """
+        if translate is None:
+            translate = self._make_translator(raw, recovery_name)
+        stream.map(translate)
+        if raw and decode:
+            stream.map(self.decoder.decode)
+        return stream
     
-    def update_one(self, id_, data, using_name=True):
+    def iter_find(self, filter=None, 
+                  sort_field=None, sort_order=None, rows_per_page=1000,
+                  using_name=True, raw=True, recovery_name=True, decode=False,
+                  include=None, fields=None):
+        """Iterate all records matching the query, page by page. Each page is
+        parsed incrementally, so only one record is fully held in memory at
+        a time.
+        
+        :param rows_per_page: page size used to scan, 1000 is the maximum 
+          knackhq api allows.
+        :param include: list of connection field to expand, connected records
+          are fetched once per page and cached for the whole scan. A page of
+          records is held in memory to collect the references.
+        :param fields: list of field to keep, see :meth:`Collection.find`.
+        
+        Other parameters are the same as :meth:`Collection.find`.
+        
+        **中文文档**
+        
+        以流的方式, 逐页遍历所有满足条件的记录。
+        """
+        return self.query(filter, sort_field, sort_order, rows_per_page,
+                          using_name, raw, recovery_name, include, fields
+                          ).iter_find(decode)
+    
+    def to_store(self, filter=None, 
+                 sort_field=None, sort_order=None, rows_per_page=1000,
+                 using_name=True, raw=True, recovery_name=True, decode=False,
+                 fields=None, intern_fields=None):
+        """Load all records matching the query into a compact 
+        :class:`~pyknackhq.store.RecordStore`. Records are streamed from 
+        :meth:`Collection.iter_find` and converted one by one, the list of 
+        dict is never built.
+        
+        :param intern_fields: fields whose repeated values are stored once,
+          choice fields always are. True for all fields.
+        
+        Other parameters are the same as :meth:`Collection.iter_find`.
+        
+        **中文文档**
+        
+        将记录读入紧凑的内存存储, 大幅减少大量记录的内存占用。
+        """
+        store = RecordStore(self, fields=fields, recovery_name=recovery_name,
+                            using_name=using_name, intern_fields=intern_fields)
+        store.extend(self.iter_find(
+            filter=filter, sort_field=sort_field, sort_order=sort_order,
+            rows_per_page=rows_per_page, using_name=using_name, raw=raw,
+            recovery_name=recovery_name, decode=decode, fields=fields))
+        return store
+    
+    def update_one(self, id_, data, using_name=True, validate=False,
+                   snapshot=None):
         """Update one record. Any fields you don't specify will remain unchanged.
         
         Ref: http://helpdesk.knackhq.com/support/solutions/articles/5000446111-api-reference-root-access#update
@@ -261,20 +594,90 @@ class Collection(Object):
         :param data: the new data fields and values
         :param using_name: if you are using field name in data,
           please set using_name = True (it's the default), otherwise, False
+        :param validate: if True, validate data locally first, raise
+          :class:`~pyknackhq.validator.ValidationError` if anything is invalid.
+        :param snapshot: a :class:`~pyknackhq.snapshot.Snapshot`, only send
+          the fields changed since the last-known version of this record. 
+          If nothing changed, no request is sent and None is returned.
           
         **中文文档**
         
         对一条记录进行更新
         """
-        data = self.convert_values(data)
-        if using_name:
-            data = self.convert_keys(data)
+        if validate:
+            self.validator.check(data, using_name=using_name, partial=True)
+        data = self.encoder.encode(data, using_name=using_name)
+        if snapshot is not None:
+            data = snapshot.diff(id_, data)
+            if not data:
+                return None
         url = "https://api.knackhq.com/v1/objects/%s/records/%s" % (
             self.key, id_)
         res = self.put(url, data)
-         
+        if snapshot is not None and isinstance(res, dict) \
+                and ("errors" not in res):
+            snapshot.update(id_, data)
         return res
     
+    def update(self, records, using_name=True, validate=False, 
+               snapshot=None, workers=1):
+        """Update many records, each record is a dict with its ``id``. 
+        Returns a :class:`~pyknackhq.pool.BulkResult`.
+        
+        :param snapshot: a :class:`~pyknackhq.snapshot.Snapshot`, only the 
+          fields changed since the last-known version are sent, records 
+          without any change are skipped and counted in 
+          ``BulkResult.skipped``. The snapshot is updated after each 
+          successful request.
+        :param workers: number of concurrent requests.
+        
+        Failed records are reported with the record given, so 
+        ``collection.update(result.failed_inputs)`` retries them.
+        
+        Other parameters are the same as :meth:`Collection.update_one`.
+        
+        **中文文档**
+        
+        批量更新记录。使用snapshot时只发送有变化的字段, 没有变化的记录不发送请求。
+        """
+        records = list(records)
+        if validate:
+            self.validator.check([dict([(k, v) for k, v in record.items() 
+                                        if k != "id"]) for record in records],
+                                 using_name=using_name, partial=True)
+        jobs = list() # [(id, payload)]
+        inputs = list() # the record of each job
+        skipped = 0
+        encode = self.encoder.encode
+        for record in records:
+            data = dict(record)
+            id_ = data.pop("id")
+            data = encode(data, using_name)
+            if snapshot is not None:
+                data = snapshot.diff(id_, data)
+                if not data:
+                    skipped += 1
+                    continue
+            jobs.append((id_, data))
+            inputs.append(record)
+        
+        def update(job):
+            id_, data = job
+            res = self.request("PUT", 
+                "https://api.knackhq.com/v1/objects/%s/records/%s" % (
+                    self.key, id_), data=data)
+            if snapshot is not None:
+                snapshot.update(id_, data)
+            return res
+        
+        result = run_bulk(update, jobs, workers=workers,
+                          errors=KnackhqError)
+        # report failure with the record given, not the encoded payload
+        result.failed = [(index, inputs[index], error)
+                         for index, _, error in result.failed]
+        result.skipped = skipped
+        return result
+    
     def delete_one(self, id_):
         """Delete one record.
         
@@ -291,15 +694,168 @@ class Collection(Object):
         res = self.delete(url)
         return res
     
-    def delete_all(self): 
-        """Delete all record in the table/collection of this object.
+    def delete_all(self, workers=1): 
+        """Delete all record in the table/collection of this object. All 
+        record id are collected first, then deleted. Returns a 
+        :class:`~pyknackhq.pool.BulkResult` of record id.
+        
+        :param workers: number of concurrent requests.
         
         **中文文档**
         
         删除表中的所有记录
         """
-        for record in self.find(using_name=False, data_only=True):
-            res = self.delete_one(record["id"])
+        ids = [record["id"] for record in 
+               self.iter_find(using_name=False, recovery_name=False)]
+        def delete(id_):
+            return self.request("DELETE", 
+                "https://api.knackhq.com/v1/objects/%s/records/%s" % (
+                    self.key, id_))
+        return run_bulk(delete, ids, workers=workers,
+                        errors=KnackhqError)
+    
+    def reconcile(self, source, key_field, using_name=True, delete=True,
+                  dry_run=False, workers=1):
+        """Make this collection match ``source`` with the minimal set of 
+        inserts, updates (changed fields only) and deletes. The collection is
+        scanned once. Returns a :class:`~pyknackhq.reconcile.ReconcilePlan`,
+        after applying, its ``results`` attribute holds the
+        :class:`~pyknackhq.pool.BulkResult` of each operation.
+        
+        :param source: iterable of dict, for example ``csv.DictReader``
+        :param key_field: field identifying a record, unique in source
+        :param using_name: True if source rows and key_field use field name
+        :param delete: if False, records not in the source are kept
+        :param dry_run: if True, only compute the plan, nothing is sent. Use
+          ``plan.summary()`` to see the counts and api calls needed.
+        :param workers: number of concurrent requests.
+        
+        **中文文档**
+        
+        以最少的API调用, 使表中的数据与本地数据源一致。
+        """
+        plan = plan_reconcile(self, source, key_field, 
+                              using_name=using_name, delete=delete)
+        if not dry_run:
+            plan.apply(workers=workers)
+        return plan
+    
+    def download_assets(self, records, field, dest, using_name=True, 
+                        workers=4):
+        """Download the file or image of ``field`` of each record into a 
+        content-addressed cache directory ``dest``. Assets already in the 
+        cache are not downloaded again, an asset used by many records is 
+        downloaded once. See :mod:`pyknackhq.download`.
+        
+        Returns a :class:`~pyknackhq.pool.BulkResult` aligned with 
+        ``records``, each result is the local path of the asset, None if 
+        the record has no asset or the download failed. ``skipped`` is the 
+        number of assets found in the cache.
+        
+        :param records: records returned by :meth:`Collection.find` or 
+          :meth:`Collection.iter_find`, raw or html, by field name or key.
+        :param field: file or image field name (key if using_name is False)
+        :param dest: cache directory
+        :param workers: number of concurrent downloads
+        
+        **中文文档**
+        
+        并发下载记录中的文件或图片, 使用以内容哈希为地址的本地缓存, 已下载的不会重复下载。
+        """
+        field = self.get_field(field, using_name=using_name)
+        names = (field.name, field.key, "%s_raw" % field.key)
+        records = list(records)
+        values = list()
+        for record in records:
+            value = None
+            for name in names:
+                value = record.get(name)
+                if value is not None:
+                    break
+            values.append(value)
+        result = download.download_assets(values, dest, workers=workers)
+        result.failed = [(index, records[index], error) 
+                         for index, _, error in result.failed]
+        return result
+    
+    def export_jsonl(self, abspath, filter=None, 
+                     sort_field=None, sort_order=None, using_name=True,
+                     raw=True, recovery_name=True, replace=False):
+        """Export all records matching the query to a json lines file, one 
+        record per line. Records are streamed from :meth:`Collection.iter_find`
+        to disk, memory usage doesn't grow with the number of records. 
+        Returns the number of records exported.
+        
+        :param abspath: ``.jsonl``, ``.gz``, ``.bz2``, ``.xz`` file, see 
+          :class:`~pyknackhq.js.JsonlWriter`.
+        :param replace: set True to overwrite existing file.
+        
+        Other parameters are the same as :meth:`Collection.find`.
+        
+        **中文文档**
+        
+        将满足条件的记录以Json lines格式流式导出到文件。
+        """
+        with JsonlWriter(abspath, replace=replace) as writer:
+            writer.write_many(self.iter_find(
+                filter=filter, sort_field=sort_field, sort_order=sort_order,
+                using_name=using_name, raw=raw, recovery_name=recovery_name))
+        return writer.count
+    
+    def import_jsonl(self, abspath, using_name=True, 
+                     workers=1, batch_size=1000):
+        """Insert every record from a json lines file, for example the one 
+        created by :meth:`Collection.export_jsonl`. Records are read and 
+        inserted batch by batch. The ``id`` of exported records is ignored,
+        knackhq assigns a new one. Returns a 
+        :class:`~pyknackhq.pool.BulkResult` of all batches, only failed 
+        records are kept in it, inserted ones are counted.
+        
+        :param using_name: if you are using field name in data,
+          please set using_name = True (it's the default), otherwise, False
+        :param workers: number of concurrent requests.
+        :param batch_size: number of records held in memory at a time.
+        
+        **中文文档**
+        
+        从Json lines文件中分批读取并插入记录。
+        """
+        result = BulkResult(keep_results=False)
+        batch = list()
+        for data in iter_jsonl(abspath):
+            data.pop("id", None)
+            batch.append(data)
+            if len(batch) >= batch_size:
+                result.extend(self.insert(batch, using_name=using_name, 
+                    workers=workers, keep_results=False))
+                batch = list()
+        if batch:
+            result.extend(self.insert(batch, using_name=using_name, 
+                workers=workers, keep_results=False))
+        return result
+    
+    def export_indexed(self, abspath, index_fields=None, filter=None, 
+                       sort_field=None, sort_order=None, using_name=True,
+                       raw=True, recovery_name=True, replace=False):
+        """Export all records matching the query to a ``.jsonl`` file with a
+        record id offset index. Open it with :class:`~pyknackhq.js.IndexedJsonl`
+        to lookup single record by id or by unique field without loading the
+        whole file. Returns the number of records exported.
+        
+        :param index_fields: list of unique field to index, use field name
+          if recovery_name is True, otherwise field key.
+        
+        Other parameters are the same as :meth:`Collection.export_jsonl`.
+        
+        **中文文档**
+        
+        导出记录并建立主键和唯一字段的索引, 以便随机读取。
+        """
+        return dump_indexed_jsonl(
+            self.iter_find(
+                filter=filter, sort_field=sort_field, sort_order=sort_order,
+                using_name=using_name, raw=raw, recovery_name=recovery_name),
+            abspath, index_fields=index_fields, replace=replace)
 
 class KnackhqAuth(object):
     """Knackhq API authentication class.
@@ -309,6 +865,13 @@ class KnackhqAuth(object):
     
     To get your Application ID and API Key, read this tutorial:
     http://helpdesk.knackhq.com/support/solutions/articles/5000444173-working-with-the-api#key
+    
+    Thread safe. Each thread sends its requests through its own 
+    ``requests.Session``, so connections are kept alive and never shared 
+    between threads. Every request of every thread takes a token from the 
+    same :attr:`KnackhqAuth.budget` first, see 
+    :class:`~pyknackhq.pool.RateBudget`. ``headers`` is copied into each new
+    session, change it before sending requests.
     """
     def __init__(self, application_id, api_key):
         self.application_id = application_id
@@ -318,6 +881,8 @@ class KnackhqAuth(object):
             "X-Knack-REST-API-Key": self.api_key,
             "Content-Type": "application/json",
         }
+        self.budget = RateBudget(rate=10)
+        self._local = threading.local()
 
     @staticmethod
     def from_dict(d):
@@ -327,47 +892,112 @@ class KnackhqAuth(object):
     def from_json(abspath):
         return KnackhqAuth.from_dict(load_js(abspath, enable_verbose=False))
     
-    def get(self, url, params=dict()):
-        """Http get method wrapper, to support search.
+    @property
+    def session(self):
+        """The ``requests.Session`` of the current thread, created on first
+        access by :meth:`KnackhqAuth.new_session`.
         """
         try:
-            res = requests.get(url, headers=self.headers, params=params)
-            return json.loads(res.text)
-        except Exception as e:
+            return self._local.session
+        except AttributeError:
+            self._local.session = self.new_session()
+            return self._local.session
+    
+    def new_session(self):
+        """Create a ``requests.Session`` sending the authentication headers.
+        """
+        session = requests.Session()
+        session.headers.update(self.headers)
+        return session
+    
+    def request(self, method, url, params=None, data=None, content_type=None):
+        """Send a http request, returns the decoded json response. 
+        
+        Unlike :meth:`KnackhqAuth.get`, :meth:`KnackhqAuth.post`, ...,
+        failure is not swallowed, :class:`~pyknackhq.exc.KnackhqError` is 
+        raised with the http status, the knackhq error body and whether it is
+        retryable.
+        
+        :param method: "GET", "POST", "PUT", "DELETE"
+        :param data: python object, sent as json.
+        :param content_type: if given, ``data`` is sent as it is, for example
+          a :class:`~pyknackhq.upload.MultipartFile`, with this content type.
+        """
+        headers = None
+        if content_type is not None:
+            headers = {"Content-Type": content_type}
+        elif data is not None:
+            data = codec.dumpb(data)
+        if self.budget is not None:
+            self.budget.acquire()
+        try:
+            res = self.session.request(method, url, params=params, data=data,
+                                       headers=headers)
+        except requests.RequestException as e:
+            raise KnackhqError(str(e), url=url)
+        try:
+            body = codec.loads(res.content)
+        except ValueError:
+            body = res.text
+        if res.status_code >= 400:
+            raise KnackhqError.from_response(res, body)
+        return body
+    
+    def _request_or_error(self, method, url, params=None, data=None):
+        """Old behavior of the http method wrapper: print the exception and
+        return "error", error body returned by knackhq is returned as it is.
+        """
+        try:
+            return self.request(method, url, params=params, data=data)
+        except KnackhqError as e:
+            if isinstance(e.body, dict):
+                return e.body
             print(e)
             return "error"
     
+    def get(self, url, params=dict()):
+        """Http get method wrapper, to support search.
+        """
+        return self._request_or_error("GET", url, params=params)
+    
+    def get_stream(self, url, params=dict(), chunk_size=64 * 1024):
+        """Http get method wrapper, parse the response incrementally.
+        
+        Returns a :class:`~pyknackhq.js.RecordStream`, the connection is
+        released when the stream is exhausted. Raise
+        :class:`~pyknackhq.exc.KnackhqError` on error status, before any
+        record is parsed.
+        """
+        if self.budget is not None:
+            self.budget.acquire()
+        try:
+            res = self.session.get(url, params=params, stream=True)
+        except requests.RequestException as e:
+            raise KnackhqError(str(e), url=url)
+        if res.status_code >= 400:
+            try:
+                body = codec.loads(res.content)
+            except ValueError:
+                body = res.text
+            finally:
+                res.close()
+            raise KnackhqError.from_response(res, body)
+        return RecordStream(res.iter_content(chunk_size), close=res.close)
+    
     def post(self, url, data):
         """Http post method wrapper, to support insert.
         """
-        try:
-            res = requests.post(
-                url, headers=self.headers, data=json.dumps(data))
-            return json.loads(res.text)
-        except Exception as e:
-            print(e)
-            return "error"
+        return self._request_or_error("POST", url, data=data)
     
     def put(self, url, data):
         """Http put method wrapper, to support update.
         """
-        try:
-            res = requests.put(
-                url, headers=self.headers, data=json.dumps(data))
-            return json.loads(res.text)
-        except Exception as e:
-            print(e)
-            return "error"
+        return self._request_or_error("PUT", url, data=data)
     
     def delete(self, url):
         """Http delete method wrapper, to support delete.
         """
-        try:
-            res = requests.delete(url, headers=self.headers)
-            return json.loads(res.text)
-        except Exception as e:
-            print(e)
-            return "error"
+        return self._request_or_error("DELETE", url)
         
 class KnackhqClient(object):
     """Knackhq API client class.
@@ -388,10 +1018,9 @@ class KnackhqClient(object):
         if isinstance(application, Application):
             self.application = application
         else: # get the schema json, construct Application instance
-            res = requests.get(
-                "https://api.knackhq.com/v1/applications/%s" % 
-                self.auth.application_id)
-            self.application = Application.from_dict(json.loads(res.text))
+            self.application = self.fetch_application()
+        self._collections = dict() # {object_key: Collection instance}
+        self._collections_lock = threading.Lock()
     
     def __str__(self):
         return "KnackhqClient(application='%s')" % self.application
@@ -410,20 +1039,191 @@ class KnackhqClient(object):
     def get_collection(self, key, using_name=True):
         """Get :class:`Collection` instance.
         
+        Collections are built once per object and cached on the client, every
+        call returns the same instance, with its compiled encoder, decoder and
+        validator. Safe to call from many threads. Call 
+        :meth:`KnackhqClient.clear_collections` after the schema changed.
+        
         :param key: object_key or object_name
         :param using_name: True if getting object by object name
         """
-        object_ = self.application.get_object(key, using_name=using_name)
-        collection = Collection.from_dict(object_.__dict__)
-        for http_cmd in ["get", "post", "put", "delete"]:
-            collection.__setattr__(http_cmd, self.auth.__getattribute__(http_cmd))
-        return collection
+        object_key = self.application.get_object_key(key, using_name=using_name)
+        try:
+            return self._collections[object_key]
+        except KeyError:
+            pass
+        with self._collections_lock:
+            try: # built by another thread while waiting for the lock
+                return self._collections[object_key]
+            except KeyError:
+                pass
+            object_ = self.application.get_object(object_key, using_name=False)
+            collection = Collection.from_dict(object_.__dict__)
+            for http_cmd in ["request", "get", "get_stream", "post", "put", "delete"]:
+                collection.__setattr__(http_cmd, self.auth.__getattribute__(http_cmd))
+            collection.budget = self.auth.budget
+            collection.client = self
+            self._collections[object_key] = collection
+            return collection
+    
+    def clear_collections(self, object_keys=None):
+        """Drop cached :class:`Collection` instances, the next 
+        :meth:`KnackhqClient.get_collection` builds them again from
+        :attr:`KnackhqClient.application`.
+        
+        :param object_keys: list of object_key to drop, all if None.
+        """
+        with self._collections_lock:
+            if object_keys is None:
+                self._collections.clear()
+            else:
+                for object_key in object_keys:
+                    self._collections.pop(object_key, None)
+    
+    def fetch_application(self):
+        """Get the latest application schema from knack server, returns an
+        :class:`~pyknackhq.schema.Application`.
+        """
+        url = "https://api.knackhq.com/v1/applications/%s" % \
+            self.auth.application_id
+        try:
+            res = requests.get(url)
+        except requests.RequestException as e:
+            raise KnackhqError(str(e), url=url)
+        if res.status_code >= 400:
+            raise KnackhqError.from_response(res, res.text)
+        return Application.from_dict(codec.loads(res.content))
+    
+    def refresh_schema(self, application=None):
+        """Replace the application schema without rebuilding the client.
+        Returns a :class:`~pyknackhq.schema.SchemaDiff`.
+        
+        Cached collections of changed objects are updated in place, so
+        references held by the caller stay valid, their encoder, decoder and
+        validator are compiled again on next use, and 
+        :class:`~pyknackhq.query.Query` made from them prepare themselves 
+        again on next execution. Collections of unchanged objects keep all
+        their caches. Collections of removed objects are dropped.
+        
+        :param application: new :class:`~pyknackhq.schema.Application`,
+          fetched from knack server if None.
+        
+        **中文文档**
+        
+        热更新Schema, 只重建发生变化的Collection的缓存。
+        """
+        if application is None:
+            application = self.fetch_application()
+        diff = self.application.diff(application)
+        with self._collections_lock:
+            self.application = application
+            for object_key in diff.removed:
+                self._collections.pop(object_key, None)
+            for object_key in diff.changed:
+                collection = self._collections.get(object_key)
+                if collection is None:
+                    continue
+                # the new Object is fully built first, then its attributes,
+                # field dicts included, are swapped in one assignment each,
+                # so other threads never see a half filled field dict
+                object_ = Object(**application.get_object(
+                    object_key, using_name=False).__dict__)
+                for attr, value in object_.__dict__.items():
+                    setattr(collection, attr, value)
+                for attr in ("_encoder", "_decoder", "_validator"):
+                    collection.__dict__.pop(attr, None)
+                collection.schema_version += 1
+        return diff
+    
+    def watch_schema(self, interval=300, callback=None):
+        """Call :meth:`KnackhqClient.refresh_schema` every ``interval`` 
+        seconds in a daemon thread. Returns the started 
+        :class:`SchemaWatcher`, call its ``stop()`` to end polling.
+        
+        :param callback: function called with the 
+          :class:`~pyknackhq.schema.SchemaDiff` when the schema changed.
+        
+        **中文文档**
+        
+        定时检查Schema的变化并热更新。
+        """
+        watcher = SchemaWatcher(self, interval=interval, callback=callback)
+        watcher.start()
+        return watcher
+    
+    def upload_assets(self, paths, asset_type="file", workers=4):
+        """Upload files or images, streamed from disk, several at a time
+        under the rate budget. Returns a :class:`~pyknackhq.pool.BulkResult`,
+        its ``results`` are :class:`~pyknackhq.datatype.FileType` (or 
+        :class:`~pyknackhq.datatype.ImageType`) in input order, ready to be
+        used as field value. See :mod:`pyknackhq.upload`.
+        
+        :param paths: list of file path
+        :param asset_type: "file" or "image"
+        :param workers: number of concurrent uploads
+        
+        **中文文档**
+        
+        并发上传文件或图片, 以流的方式读取文件, 返回可以直接用于插入的资源。
+        """
+        return upload_assets(self, paths, asset_type=asset_type, 
+                             workers=workers)
     
     def export_schema(self, abspath):
         """Export application detailed information to a nicely formatted json
         file.
         """
         self.application.to_json(abspath)
+    
+    def backup(self, dirpath, workers=4, object_keys=None, replace=False):
+        """Backup schema and records of all objects to a directory, objects
+        are scanned in parallel. See :func:`pyknackhq.backup.backup`.
+        
+        **中文文档**
+        
+        备份整个App。
+        """
+        return backup(self, dirpath, workers=workers, 
+                      object_keys=object_keys, replace=replace)
+    
+    def restore(self, dirpath, workers=4, object_keys=None):
+        """Restore a backup created by :meth:`KnackhqClient.backup`, in 
+        dependency order, connection field id are remapped. See 
+        :func:`pyknackhq.backup.restore`.
+        
+        **中文文档**
+        
+        从备份中恢复整个App的数据。
+        """
+        return restore(self, dirpath, workers=workers, object_keys=object_keys)
+
+class SchemaWatcher(threading.Thread):
+    """Daemon thread polling the schema, see 
+    :meth:`KnackhqClient.watch_schema`. A failed refresh, or an exception
+    raised by the callback, is kept in ``error``, polling goes on at the 
+    next interval.
+    """
+    def __init__(self, client, interval=300, callback=None):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.client = client
+        self.interval = interval
+        self.callback = callback
+        self.error = None
+        self._stopped = threading.Event()
+    
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                diff = self.client.refresh_schema()
+                self.error = None
+                if diff and (self.callback is not None):
+                    self.callback(diff)
+            except Exception as e:
+                self.error = e
+    
+    def stop(self):
+        self._stopped.set()
 
 if __name__ == "__main__":
     from pyknackhq.tests import AUTH_JSON_PATH, SCHEMA_JSON_PATH
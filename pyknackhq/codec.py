@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Module description
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+The json codec used by every http request, response and file of pyknackhq.
+
+The fastest installed backend is used, in this order:
+`orjson <https://pypi.python.org/pypi/orjson>`_,
+`ujson <https://pypi.python.org/pypi/ujson>`_,
+`simplejson <https://pypi.python.org/pypi/simplejson>`_ and the standard
+library ``json``.
+
+- :func:`loads`: Decode json from bytes or str. Bytes are decoded directly,
+  no intermediate str is created.
+
+- :func:`dumps`: Encode python object to compact json str.
+  :mod:`~pyknackhq.datatype` instances are serialized as their payload.
+
+- :func:`dumpb`: Encode python object to compact utf-8 json bytes.
+
+- :func:`set_backend`: Force a backend by name.
+
+
+Compatibility
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+- Python2: Yes
+- Python3: Yes
+
+
+Prerequisites
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+- None, orjson, ujson, simplejson are optional.
+
+
+Import Command
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+from pyknackhq import codec
+"""
+
+from __future__ import print_function
+from pyknackhq.datatype import json_default
+import json
+
+BACKENDS = ["orjson", "ujson", "simplejson", "json"]
+
+def _make_orjson():
+    import orjson
+
+    def loads(data):
+        return orjson.loads(data)
+
+    def dumpb(obj):
+        return orjson.dumps(obj, default=json_default)
+
+    def dumps(obj):
+        return orjson.dumps(obj, default=json_default).decode("utf-8")
+
+    return loads, dumps, dumpb
+
+def _make_ujson():
+    import ujson
+    try: # default hook requires ujson >= 5.4
+        ujson.dumps(None, default=json_default)
+    except TypeError:
+        raise ImportError("ujson doesn't support default hook")
+
+    def loads(data):
+        return ujson.loads(data)
+
+    def dumps(obj):
+        return ujson.dumps(obj, ensure_ascii=False, default=json_default)
+
+    def dumpb(obj):
+        return dumps(obj).encode("utf-8")
+
+    return loads, dumps, dumpb
+
+def _make_simplejson():
+    import simplejson
+
+    def loads(data):
+        return simplejson.loads(data)
+
+    def dumps(obj):
+        return simplejson.dumps(obj, separators=(",", ":"), 
+                                ensure_ascii=False, default=json_default)
+
+    def dumpb(obj):
+        return dumps(obj).encode("utf-8")
+
+    return loads, dumps, dumpb
+
+def _make_json():
+    decoder = json.JSONDecoder()
+    encoder = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False,
+                               default=json_default)
+
+    def loads(data):
+        if isinstance(data, bytes):
+            data = data.decode("utf-8")
+        return decoder.decode(data)
+
+    def dumps(obj):
+        return encoder.encode(obj)
+
+    def dumpb(obj):
+        return encoder.encode(obj).encode("utf-8")
+
+    return loads, dumps, dumpb
+
+_makers = {
+    "orjson": _make_orjson,
+    "ujson": _make_ujson,
+    "simplejson": _make_simplejson,
+    "json": _make_json,
+}
+
+backend = None
+loads = None
+dumps = None
+dumpb = None
+
+def set_backend(name=None):
+    """Select the json backend. If ``name`` is None, use the fastest
+    installed one.
+
+    :param name: one of "orjson", "ujson", "simplejson", "json"
+
+    **中文文档**
+
+    设定Json编码解码所使用的库。默认自动选择已安装的最快的库。
+    """
+    global backend, loads, dumps, dumpb
+    if name is None:
+        candidates = BACKENDS
+    elif name in _makers:
+        candidates = [name]
+    else:
+        raise ValueError("'%s' is not a supported json backend!" % name)
+
+    for candidate in candidates:
+        try:
+            funcs = _makers[candidate]()
+        except ImportError:
+            if name is not None:
+                raise
+            continue
+        backend = candidate
+        loads, dumps, dumpb = funcs
+        return backend
+
+def available_backends():
+    """Return names of all installed json backend.
+    """
+    names = list()
+    for name in BACKENDS:
+        try:
+            _makers[name]()
+            names.append(name)
+        except ImportError:
+            pass
+    return names
+
+set_backend()
+
+if __name__ == "__main__":
+    import unittest
+
+    class CodecUnittest(unittest.TestCase):
+        def test_round_trip(self):
+            data = {"id": "564d0bacde3971932db54093", "field_1": "是",
+                    "field_2": [1, 2.5, True, None]}
+            for name in available_backends():
+                set_backend(name)
+                self.assertEqual(loads(dumpb(data)), data)
+                self.assertEqual(loads(dumps(data)), data)
+                self.assertIsInstance(dumps(data), str)
+                self.assertIsInstance(dumpb(data), bytes)
+            set_backend()
+
+        def test_datatype(self):
+            from pyknackhq.datatype import AddressType
+            data = {"field_1": AddressType(city="Washington")}
+            for name in available_backends():
+                set_backend(name)
+                self.assertEqual(loads(dumps(data)), 
+                                 {"field_1": {"city": "Washington"}})
+            set_backend()
+
+        def test_unknown_backend(self):
+            self.assertRaises(ValueError, set_backend, "cjson")
+
+    unittest.main()
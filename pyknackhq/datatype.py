@@ -9,65 +9,144 @@ import json
 class BaseDataType(object):
     """Base type of all knackhq supported data type.
     
+    Instances are immutable and use ``__slots__``. The payload ``._data`` is
+    computed once in the constructor, attributes of simple and composite 
+    types are read from it. A record holding data type instances can be 
+    serialized directly with :func:`json_default` or 
+    :class:`DataTypeJSONEncoder`.
+    
     **中文文档**
     
     所有DataType类的基类。其中 `._data` 属性是其可用于直接insert的Json Dict形式。
+    实例不可修改, `._data` 只在创建时计算一次。
     """
+    __slots__ = ("_data",)
+    
+    def __setattr__(self, name, value):
+        raise AttributeError("'%s' is immutable" % self.__class__.__name__)
+    
+    def __delattr__(self, name):
+        raise AttributeError("'%s' is immutable" % self.__class__.__name__)
+    
+    def __getstate__(self):
+        """Slot values, for :mod:`copy` and :mod:`pickle`.
+        """
+        state = dict()
+        for klass in self.__class__.__mro__:
+            for name in getattr(klass, "__slots__", ()):
+                if hasattr(self, name):
+                    state[name] = getattr(self, name)
+        return state
+    
+    def __setstate__(self, state):
+        for name, value in state.items():
+            _setattr(self, name, value)
+    
     def __str__(self):
         return json.dumps(self._data, 
             sort_keys=True, indent=4, separators=("," , ": "))
 
+def json_default(obj):
+    """``default`` hook for json encoder, serialize :class:`BaseDataType` 
+    instance as its payload.
+    
+    Usage::
+    
+        >>> json.dumps({"field_1": AddressType(city="Washington")}, 
+        ...            default=json_default)
+        '{"field_1": {"city": "Washington"}}'
+    """
+    if isinstance(obj, BaseDataType):
+        return obj._data
+    raise TypeError("%r is not JSON serializable" % (obj,))
+
+class DataTypeJSONEncoder(json.JSONEncoder):
+    """A :class:`json.JSONEncoder` serialize :class:`BaseDataType` instance
+    as its payload.
+    """
+    def default(self, obj):
+        if isinstance(obj, BaseDataType):
+            return obj._data
+        return json.JSONEncoder.default(self, obj)
+
+_setattr = object.__setattr__ # bypass immutable check in constructor
+
+def _compact(**kwargs):
+    """Build payload dict, empty value are dropped.
+    """
+    return {attr: value for attr, value in kwargs.items() if value}
+
+# simple type payload is the value itself
+_value_property = property(lambda self: self._data, doc="The value.")
+
+def _payload_property(attr):
+    """Composite type attribute, read from the payload, None if empty.
+    """
+    return property(lambda self: self._data.get(attr), 
+                    doc="The '%s' attribute." % attr)
+
 #-----------------------------------------------------------------------------#
 #                                 Basic Type                                  #
 #-----------------------------------------------------------------------------#
 class ShortTextType(BaseDataType):
     """Short text type.
     """
+    __slots__ = ()
+    value = _value_property
+    
     def __init__(self, value):
         if not isinstance(value, _str_type):
             raise TypeError("'value' has to be str")
-        self.value = value
         
         # construct data
-        self._data = self.value
+        _setattr(self, "_data", value)
         
 class ParagraphTextType(BaseDataType):
     """Paragraph text type.
     """
+    __slots__ = ()
+    value = _value_property
+    
     def __init__(self, value):
         if not isinstance(value, _str_type):
             raise TypeError("'value' has to be str")
-        self.value = value
         
         # construct data
-        self._data = self.value
+        _setattr(self, "_data", value)
         
 class YesNoType(BaseDataType):
     """Yes or No boolean type.
     """
+    __slots__ = ()
+    value = _value_property
+    
     def __init__(self, value):
         if not isinstance(value, bool):
             raise TypeError("'value' has to be bool")
         
-        self.value = value
-        
         # construct data
-        self._data = self.value
+        _setattr(self, "_data", value)
         
 class SingleChoiceType(BaseDataType):
     """Single choice type.
     """
+    __slots__ = ()
+    value = _value_property
+    
     def __init__(self, value):
         if not isinstance(value, _str_type):
             raise TypeError("'value' has to be str")
-        self.value = value
         
         # construct data
-        self._data = self.value
+        _setattr(self, "_data", value)
         
 class MultipleChoiceType(BaseDataType):
-    """Multiple choice type.
+    """Multiple choice type. The value is a list, a copy of the given list,
+    so changing the caller's list later doesn't change this value.
     """
+    __slots__ = ()
+    value = _value_property
+    
     def __init__(self, value):
         if isinstance(value, list):
             for i in value:
@@ -75,10 +154,9 @@ class MultipleChoiceType(BaseDataType):
                     raise TypeError("'value' has to be list of str")
         else:
             raise TypeError("'value' has to be list of str")
-        self.value = value
         
         # construct data
-        self._data = self.value
+        _setattr(self, "_data", list(value))
         
 class DateTimeType(BaseDataType): # TODO
     """Date time type.
@@ -86,21 +164,25 @@ class DateTimeType(BaseDataType): # TODO
     :param value: Python datetime, date type
     :param is_date: Default False, True for date only
     """
+    __slots__ = ("value",)
+    
     def __init__(self, value, is_date=False):
         if isinstance(value, datetime):
             if is_date:
-                self.value = value.date()
-                self._data = {"date": self.value.strftime("%m/%d/%Y")}
+                _setattr(self, "value", value.date())
+                _setattr(self, "_data", 
+                         {"date": self.value.strftime("%m/%d/%Y")})
             else:
-                self.value = value
-                self._data = {
+                _setattr(self, "value", value)
+                _setattr(self, "_data", {
                     "date": self.value.strftime("%m/%d/%Y"),
                     "hours": self.value.hour,
                     "minutes": self.value.minute,
-                }
+                })
         elif isinstance(value, date):
-            self.value = value
-            self._data = {"date": self.value.strftime("%m/%d/%Y")}
+            _setattr(self, "value", value)
+            _setattr(self, "_data", 
+                     {"date": self.value.strftime("%m/%d/%Y")})
 
 class DateTimeFromToType(BaseDataType):
     """From xxx to xxx Type.
@@ -129,6 +211,8 @@ class DateTimeFromToType(BaseDataType):
             "start_date": "11/01/2015"
         },
     """
+    __slots__ = ("from_", "to_", "repeat")
+    
     def __init__(self, from_, to_, repeat=None, all_day=False):
         from_and_to = list()
         from_and_to_data = list()
@@ -151,69 +235,68 @@ class DateTimeFromToType(BaseDataType):
                     {"date": value.strftime("%m/%d/%Y")}
                 )
 
-        self.from_ = from_and_to[0]
-        self.to_ = from_and_to[1]
-        self._data = from_and_to_data[0]
-        self._data["to"] = from_and_to_data[1]
+        _setattr(self, "from_", from_and_to[0])
+        _setattr(self, "to_", from_and_to[1])
+        data = from_and_to_data[0]
+        data["to"] = from_and_to_data[1]
 
         if all_day:
-            self._data["all_day"] = True
+            data["all_day"] = True
             
+        _setattr(self, "repeat", repeat)
         if repeat:
-            self.repeat = repeat
-            self._data["repeat"] = repeat
+            data["repeat"] = repeat
+        _setattr(self, "_data", data)
             
 class NumberType(BaseDataType):
     """Integer or Float Type.
     """
+    __slots__ = ()
+    value = _value_property
+    
     def __init__(self, value):
         if not isinstance(value, _number_types):
             raise TypeError("'value' has to be int or float")
         
-        self.value = value
-        
         # construct data
-        self._data = self.value
+        _setattr(self, "_data", value)
 
-# class ImageType(BaseDataType):
-#     def __init__(self, path_or_url):
-#         if not isinstance(value, bytes):
-#             raise TypeError("'value' has to be binary")
-#         if not isinstance(filename, path_or_url):
-#             raise TypeError("'value' has to be str")
-#         self.url, self.path = None, None
-# 
-#         if path_or_url.startswith("http"):
-#             self.url = path_or_url
-#         else:
-#             if os.path.exists(path_or_url):
-#                 if os.path.isfile(path_or_url):
-#                     self.path = path_or_url
-#                 else:
-#                     raise ValueError("'%s' is not a file." % path_or_url)
-#             else:
-#                 raise FileNotFoundError("'%s' is not found." % path_or_url)
-#         
-#     @property
-#     def data(self):
-#         if self.url:
-#             return self.url
-#         
-#         if self.path:
-#             upload_url = ("https://api.knackhq.com/v1/applications/"
-#                           "%s/assets/file/upload" % self.application_id)
-#             
-#             basename = os.path.basename(self.path)
-#             files = {
-#                 basename: open(self.path)
-#             }
-#             res = self.auth.upload(upload_url, files)
-#             return res["id"]
-#         
-#         raise Exception("data error")
-#     
-# class FileType(ImageType):
-#     pass
+class FileType(BaseDataType):
+    """File type, an asset uploaded by 
+    :meth:`~pyknackhq.client.KnackhqClient.upload_assets`. The payload is 
+    the asset id, ``filename`` and ``url`` are kept for information.
+    """
+    __slots__ = ("filename", "url")
+    asset_id = _value_property
+    
+    def __init__(self, asset_id, filename=None, url=None):
+        if not isinstance(asset_id, _str_type):
+            raise TypeError("'asset_id' has to be str")
+        
+        # construct data
+        _setattr(self, "_data", asset_id)
+        _setattr(self, "filename", filename)
+        _setattr(self, "url", url)
+    
+    def __repr__(self):
+        return "%s(asset_id=%r, filename=%r)" % (
+            self.__class__.__name__, self._data, self.filename)
+    
+class ImageType(FileType):
+    """Image type, an uploaded image asset. For an image field using 
+    external link source, give only the ``url``, it is the payload.
+    """
+    __slots__ = ()
+    
+    def __init__(self, asset_id=None, filename=None, url=None):
+        if asset_id is None:
+            if not isinstance(url, _str_type):
+                raise TypeError("'asset_id' or 'url' has to be str")
+            _setattr(self, "_data", url)
+            _setattr(self, "filename", filename)
+            _setattr(self, "url", url)
+        else:
+            FileType.__init__(self, asset_id, filename, url)
 
 #-----------------------------------------------------------------------------#
 #                                Special Type                                 #
@@ -221,108 +304,78 @@ class NumberType(BaseDataType):
 class AddressType(BaseDataType):
     """Address type.
     """
+    __slots__ = ()
+    street = _payload_property("street")
+    street2 = _payload_property("street2")
+    city = _payload_property("city")
+    state = _payload_property("state")
+    zipcode = _payload_property("zipcode")
+    country = _payload_property("country")
+    
     def __init__(self, street=None, street2=None, 
                  city=None, state=None, zipcode=None, country=None):
-        self.street = street
-        self.street2 = street2
-        self.city = city
-        self.state = state
-        self.zipcode = zipcode
-        self.country = country
-        
-    @property
-    def _data(self):
-        attrs = ["street", "street2", 
-                 "city", "state", "zipcode", "country"]
-        d = dict()
-        for attr in attrs:
-            value = self.__getattribute__(attr)
-            if value:
-                d[attr] = value
-        return d
+        _setattr(self, "_data", _compact(
+            street=street, street2=street2, city=city, state=state, 
+            zipcode=zipcode, country=country))
 
 class NameType(BaseDataType):
     """Name type.
     """
+    __slots__ = ()
+    title = _payload_property("title")
+    first = _payload_property("first")
+    middle = _payload_property("middle")
+    last = _payload_property("last")
+    
     def __init__(self, title=None, first=None, middle=None, last=None):
-        self.title = title
-        self.first = first
-        self.middle = middle
-        self.last = last
-
-    @property
-    def _data(self):
-        attrs = ["title", "first", "middle", "last"]
-        d = dict()
-        for attr in attrs:
-            value = self.__getattribute__(attr)
-            if value:
-                d[attr] = value
-        return d
+        _setattr(self, "_data", _compact(
+            title=title, first=first, middle=middle, last=last))
 
 class LinkType(BaseDataType):
     """Link type.
     """
+    __slots__ = ()
+    url = _payload_property("url")
+    label = _payload_property("label")
+    
     def __init__(self, url, label=None):
-        self.url = url
-        self.label = label
-        
-    @property
-    def _data(self):
-        attrs = ["url", "label"]
-        d = dict()
-        for attr in attrs:
-            value = self.__getattribute__(attr)
-            if value:
-                d[attr] = value
-        return d
+        _setattr(self, "_data", _compact(url=url, label=label))
 
 class EmailType(BaseDataType):
     """Email type.
     """
+    __slots__ = ()
+    email = _payload_property("email")
+    label = _payload_property("label")
+    
     def __init__(self, email, label=None):
-        self.email = email
-        self.label = label
-        
-    @property
-    def _data(self):
-        attrs = ["email", "label"]
-        d = dict()
-        for attr in attrs:
-            value = self.__getattribute__(attr)
-            if value:
-                d[attr] = value
-        return d
+        _setattr(self, "_data", _compact(email=email, label=label))
     
 class PhoneType(BaseDataType):
     """Phone type.
     """
+    __slots__ = ()
+    full = _payload_property("full")
+    area = _payload_property("area")
+    country = _payload_property("country")
+    number = _payload_property("number")
+    
     def __init__(self, full=None, area=None, country=None, number=None):
-        self.full = full
-        self.area = area
-        self.country = country
-        self.number = number
-        
-    @property
-    def _data(self):
-        attrs = ["full", "area", "country", "number"]
-        d = dict()
-        for attr in attrs:
-            value = self.__getattribute__(attr)
-            if value:
-                d[attr] = value
-        return d
+        _setattr(self, "_data", _compact(
+            full=full, area=area, country=country, number=number))
 
 class RichTextType(BaseDataType):
     """Rich html text type.
     """
+    __slots__ = ()
+    value = _value_property
+    
     def __init__(self, value):
         if not isinstance(value, _str_type):
             raise TypeError("'value' has to be str")
-        self.value = value
         
         # construct data
-        self._data = self.value
+        _setattr(self, "_data", value)
 
 
 class TimerType(BaseDataType):
@@ -331,6 +384,8 @@ class TimerType(BaseDataType):
     :param from_: from datetime
     :param to_: to datetime
     """
+    __slots__ = ("from_", "to_")
+    
     def __init__(self, from_, to_):
         from_and_to_data = list()
         for value in [from_, to_]: 
@@ -340,35 +395,37 @@ class TimerType(BaseDataType):
                 "minutes": value.minute,
             })
 
-        self.from_ = from_
-        self.to_ = to_
+        _setattr(self, "from_", from_)
+        _setattr(self, "to_", to_)
         
         times = [{"from": from_and_to_data[0], "to": from_and_to_data[1]}]
-        self._data = {"times": times}
+        _setattr(self, "_data", {"times": times})
 
 class CurrencyType(BaseDataType):
     """Currency type.
     """
+    __slots__ = ()
+    value = _value_property
+    
     def __init__(self, value):
         if not isinstance(value, _number_types):
             raise TypeError("'value' has to be int or float")
         
-        self.value = value
-        
         # construct data
-        self._data = self.value
+        _setattr(self, "_data", value)
 
 class RatingType(BaseDataType):
     """Rating type.
     """
+    __slots__ = ()
+    value = _value_property
+    
     def __init__(self, value):
         if not isinstance(value, _number_types):
             raise TypeError("'value' has to be int or float")
         
-        self.value = value
-        
         # construct data
-        self._data = self.value
+        _setattr(self, "_data", value)
 
 class DataType(object):
     # basic type
@@ -380,6 +437,8 @@ class DataType(object):
     DateTimeType = DateTimeType
     DateTimeFromToType = DateTimeFromToType
     NumberType = NumberType
+    ImageType = ImageType
+    FileType = FileType
     # special type
     AddressType = AddressType
     NameType = NameType
@@ -0,0 +1,274 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Module description
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Schema driven record decoder, the reverse of :mod:`pyknackhq.encoder`. A
+:class:`Decoder` is compiled once per :class:`~pyknackhq.schema.Object` from
+``Field.type`` and ``Field.format``, and turns raw values returned by the api
+into native Python values:
+
+- ``date_time``: datetime, or date if the field ignores time. A field with
+  ``to`` becomes a :class:`DateTimeRange`.
+- ``timer``: list of :class:`DateTimeRange`
+- ``number``: int, float, or Decimal if the api returns a str
+- ``currency``: Decimal
+- ``rating``: float
+- ``boolean``: bool
+- ``multiple_choice``: list of str for multi selection, else str
+- ``address``, ``name``, ``link``, ``email``, ``phone``: :class:`Address`,
+  :class:`Name`, :class:`Link`, :class:`Email`, :class:`Phone` namedtuple
+
+Empty value is kept as it is. Repeated date str are only parsed once.
+
+
+Import Command
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+from pyknackhq.decoder import Decoder
+"""
+
+from pyknackhq.py23compatible import _str_type
+from collections import namedtuple
+from datetime import datetime, date
+from decimal import Decimal
+
+DateTimeRange = namedtuple("DateTimeRange", "from_ to_ all_day repeat")
+Address = namedtuple("Address",
+    "street street2 city state zip country latitude longitude")
+Name = namedtuple("Name", "title first middle last")
+Link = namedtuple("Link", "url label")
+Email = namedtuple("Email", "email label")
+Phone = namedtuple("Phone", "full area country number formatted")
+
+_date_cache = dict()
+
+def parse_date(text):
+    """Parse knackhq "mm/dd/YYYY" str to date, memoized.
+    """
+    try:
+        return _date_cache[text]
+    except KeyError:
+        if len(_date_cache) >= 100000:
+            _date_cache.clear()
+        month, day, year = text.split("/")
+        value = date(int(year), int(month), int(day))
+        _date_cache[text] = value
+        return value
+
+def _make_point(ignore_time):
+    def point(value):
+        d = parse_date(value["date"])
+        if ignore_time or value.get("all_day") or ("hours" not in value):
+            return d
+        hours = int(value["hours"])
+        am_pm = value.get("am_pm")
+        if am_pm == "PM" and hours < 12:
+            hours += 12
+        elif am_pm == "AM" and hours == 12:
+            hours = 0
+        return datetime(d.year, d.month, d.day,
+                        hours, int(value.get("minutes", 0)))
+    return point
+
+def _make_namedtuple_decoder(klass):
+    fields = klass._fields
+    def decode(value):
+        if isinstance(value, dict):
+            return klass(*[value.get(name) for name in fields])
+        return value
+    return decode
+
+#--- decoder factory of each field type, takes a Field instance ---
+def date_time_decoder(field):
+    format_ = getattr(field, "format", None) or dict()
+    point = _make_point(format_.get("time_format") == "Ignore Time")
+    def decode(value):
+        if not isinstance(value, dict) or (not value.get("date")):
+            return value
+        if "to" in value:
+            return DateTimeRange(point(value), point(value["to"]),
+                                 bool(value.get("all_day")),
+                                 value.get("repeat"))
+        return point(value)
+    return decode
+
+def timer_decoder(field):
+    point = _make_point(False)
+    def decode(value):
+        if not isinstance(value, dict):
+            return value
+        return [DateTimeRange(point(time["from"]), point(time["to"]),
+                              False, None)
+                for time in value.get("times", [])]
+    return decode
+
+def number_decoder(field):
+    def decode(value):
+        if isinstance(value, _str_type) and value:
+            return Decimal(value)
+        return value
+    return decode
+
+def currency_decoder(field):
+    def decode(value):
+        if isinstance(value, (_str_type, int, float)) and value != "":
+            return Decimal(str(value))
+        return value
+    return decode
+
+def rating_decoder(field):
+    def decode(value):
+        if value == "" or value is None:
+            return value
+        return float(value)
+    return decode
+
+_true_str = set(["yes", "true", "on"])
+
+def boolean_decoder(field):
+    def decode(value):
+        if isinstance(value, _str_type):
+            return value.lower() in _true_str
+        return bool(value)
+    return decode
+
+def multiple_choice_decoder(field):
+    format_ = getattr(field, "format", None) or dict()
+    if format_.get("type") in ("checkboxes", "multi"):
+        def decode(value):
+            if isinstance(value, _str_type):
+                return [value] if value else []
+            return value
+    else:
+        def decode(value):
+            if isinstance(value, list):
+                return value[0] if value else ""
+            return value
+    return decode
+
+def address_decoder(field):
+    to_namedtuple = _make_namedtuple_decoder(Address)
+    def decode(value):
+        value = to_namedtuple(value)
+        if isinstance(value, Address) and (value.latitude is not None):
+            value = value._replace(latitude=float(value.latitude),
+                                   longitude=float(value.longitude))
+        return value
+    return decode
+
+def _namedtuple_decoder_factory(klass):
+    def factory(field):
+        return _make_namedtuple_decoder(klass)
+    return factory
+
+FIELD_TYPE_DECODER = {
+    "date_time": date_time_decoder,
+    "timer": timer_decoder,
+    "number": number_decoder,
+    "currency": currency_decoder,
+    "rating": rating_decoder,
+    "boolean": boolean_decoder,
+    "multiple_choice": multiple_choice_decoder,
+    "address": address_decoder,
+    "name": _namedtuple_decoder_factory(Name),
+    "link": _namedtuple_decoder_factory(Link),
+    "email": _namedtuple_decoder_factory(Email),
+    "phone": _namedtuple_decoder_factory(Phone),
+}
+
+class Decoder(object):
+    """Record decoder compiled from the fields of an
+    :class:`~pyknackhq.schema.Object`. It works on records returned by
+    :meth:`~pyknackhq.client.Collection.get_raw_values`, keyed by either
+    field name or field key.
+
+    :param object_: :class:`~pyknackhq.schema.Object` instance
+
+    Usage::
+
+        >>> decoder = Decoder(object_)
+        >>> decoder.decode({"id": "...", "currency field": "3.14"})
+        {"id": "...", "currency field": Decimal("3.14")}
+
+    **中文文档**
+
+    根据Object中各个Field的类型编译出的解码器, 将API返回的原始数据转化为Python
+    原生数据类型。
+    """
+    def __init__(self, object_):
+        self.funcs = dict() # {field_name or field_key: decode function}
+        for field in object_:
+            try:
+                factory = FIELD_TYPE_DECODER[field.type]
+            except KeyError:
+                continue
+            func = factory(field)
+            self.funcs[field.name] = func
+            self.funcs[field.key] = func
+
+    def decode(self, record):
+        """Decode one record in place, and return it.
+        """
+        get_func = self.funcs.get
+        for name, value in record.items():
+            func = get_func(name)
+            if func is not None:
+                record[name] = func(value)
+        return record
+
+    def decode_many(self, records):
+        """Decode list of records in place, and return it.
+        """
+        decode = self.decode
+        for record in records:
+            decode(record)
+        return records
+
+if __name__ == "__main__":
+    from pyknackhq.schema import Application
+    import unittest
+    import json
+    import os
+
+    TESTS_DIR = os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "tests")
+
+    class DecoderUnittest(unittest.TestCase):
+        def setUp(self):
+            application = Application.from_json(
+                os.path.join(TESTS_DIR, "schema.json"))
+            self.application = application
+
+        def load_example(self, dirname):
+            abspath = os.path.join(
+                TESTS_DIR, "example_get_response", dirname, "raw.json")
+            with open(abspath, "rb") as f:
+                return json.loads(f.read().decode("utf-8"))
+
+        def test_test_object(self):
+            decoder = Decoder(self.application.get_object("test_object"))
+            record = decoder.decode(self.load_example("00 test"))
+            self.assertEqual(record["date time field"], date(2015, 11, 1))
+            self.assertEqual(record["currency field"], Decimal("123.45"))
+            self.assertEqual(record["address field"].latitude, 38.8976989)
+            self.assertEqual(record["email field"].email, "example@gmail.com")
+            self.assertTrue(isinstance(record["timer field"], list))
+
+        def test_date_time(self):
+            decoder = Decoder(self.application.get_object("date_time_object"))
+            record = decoder.decode(self.load_example("05 date time"))
+            self.assertEqual(record["datetime 12hour field"],
+                             datetime(2015, 11, 1, 17, 0))
+
+        def test_from_to(self):
+            decoder = Decoder(
+                self.application.get_object("date_time_from_to_object"))
+            record = decoder.decode(self.load_example("06 date time from to"))
+            value = record["all day field"]
+            self.assertEqual(value.to_, date(2015, 11, 30))
+            self.assertTrue(value.all_day)
+
+    unittest.main()
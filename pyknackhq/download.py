@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Module description
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Download the files and images referenced by records into a local
+content-addressed cache. See
+:meth:`~pyknackhq.client.Collection.download_assets`.
+
+Layout of the cache directory::
+
+    dest/
+        index.json                 # {asset id or url: "objects/ab/abcd...jpg"}
+        objects/ab/abcd...jpg      # file named by the sha256 of its content
+
+- an asset is identified by its asset id, or its url for external images.
+  An asset already in ``index.json`` is not downloaded again.
+- each asset is downloaded once per run, even if many records use it.
+- the response is streamed to a temporary file while its sha256 is
+  computed, then moved to its content address. Identical content under
+  different assets is stored once.
+
+Asset urls are outside of the knackhq api, they are fetched with a session
+without the api key, and don't take tokens from the rate budget.
+
+
+Import Command
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+from pyknackhq.download import AssetCache, asset_of
+"""
+
+from pyknackhq.js import load_js, safe_dump_js
+from pyknackhq.exc import KnackhqError
+from pyknackhq.pool import run_bulk, BulkResult
+from pyknackhq.py23compatible import _str_type
+import threading
+import tempfile
+import hashlib
+import requests
+import re
+import os
+
+try:
+    from urllib.parse import urlparse
+except ImportError: # Python2
+    from urlparse import urlparse
+
+_html_url = re.compile(r"""(?:src|href)=["']([^"']+)["']""")
+
+def asset_of(value):
+    """Return ``(key, url, filename)`` of a file or image field value, raw
+    dict, url or html format. None if there is no asset.
+    """
+    if isinstance(value, dict):
+        url = value.get("url")
+        if not url:
+            return None
+        return value.get("id") or url, url, value.get("filename")
+    if isinstance(value, _str_type) and value:
+        match = _html_url.search(value)
+        url = match.group(1) if match else value
+        if not url.startswith("http"):
+            return None
+        return url, url, None
+    return None
+
+class AssetCache(object):
+    """Content-addressed cache of downloaded assets in ``dirpath``.
+
+    :param chunk_size: bytes written at a time while downloading.
+
+    **中文文档**
+
+    以文件内容的哈希值为地址的本地资源缓存, 已经下载过的资源不会重复下载。
+    """
+    def __init__(self, dirpath, chunk_size=64 * 1024):
+        self.dirpath = dirpath
+        self.chunk_size = chunk_size
+        self.index_path = os.path.join(dirpath, "index.json")
+        if not os.path.exists(dirpath):
+            os.makedirs(dirpath)
+        if os.path.exists(self.index_path):
+            self.index = load_js(self.index_path, enable_verbose=False)
+        else:
+            self.index = dict() # {asset key: path relative to dirpath}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def session(self):
+        """``requests.Session`` of the current thread, without api key.
+        """
+        try:
+            return self._local.session
+        except AttributeError:
+            self._local.session = requests.Session()
+            return self._local.session
+
+    def get(self, key):
+        """Local path of a cached asset, None if not cached.
+        """
+        relpath = self.index.get(key)
+        if relpath is not None:
+            abspath = os.path.join(self.dirpath, relpath)
+            if os.path.exists(abspath):
+                return abspath
+        return None
+
+    def fetch(self, key, url, filename=None):
+        """Download an asset if it is not cached yet, returns its local
+        path.
+        """
+        abspath = self.get(key)
+        if abspath is not None:
+            return abspath
+        try:
+            res = self.session.get(url, stream=True)
+        except requests.RequestException as e:
+            raise KnackhqError(str(e), url=url)
+        if res.status_code >= 400:
+            res.close()
+            raise KnackhqError("%s %s" % (res.status_code, res.reason),
+                               status=res.status_code, url=url)
+
+        sha256 = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=self.dirpath, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in res.iter_content(self.chunk_size):
+                    sha256.update(chunk)
+                    f.write(chunk)
+        except (requests.RequestException, IOError, OSError) as e:
+            os.remove(tmp_path)
+            raise KnackhqError(str(e), url=url)
+        finally:
+            res.close()
+
+        digest = sha256.hexdigest()
+        ext = os.path.splitext(filename or urlparse(url).path)[1].lower()
+        relpath = os.path.join("objects", digest[:2], digest + ext)
+        target = os.path.join(self.dirpath, relpath)
+        with self._lock:
+            if os.path.exists(target): # same content already stored
+                os.remove(tmp_path)
+            else:
+                if not os.path.exists(os.path.dirname(target)):
+                    os.makedirs(os.path.dirname(target))
+                os.rename(tmp_path, target)
+            self.index[key] = relpath
+        return target
+
+    def save(self):
+        """Write ``index.json``.
+        """
+        with self._lock:
+            safe_dump_js(self.index, self.index_path,
+                         enable_verbose=False)
+
+def download_assets(values, dirpath, workers=4):
+    """Download the asset of each field value into the cache at
+    ``dirpath``. Returns a :class:`~pyknackhq.pool.BulkResult` aligned with
+    ``values``, each result is the local path, None if the value has no
+    asset or the download failed. ``skipped`` is the number of assets found
+    in the cache.
+    """
+    cache = AssetCache(dirpath)
+    assets = [asset_of(value) for value in values]
+    jobs = dict() # {key: (key, url, filename)}, one download per asset
+    skipped = 0
+    for asset in assets:
+        if asset is not None and asset[0] not in jobs:
+            if cache.get(asset[0]) is not None:
+                skipped += 1
+            jobs[asset[0]] = asset
+    jobs = list(jobs.values())
+    fetched = run_bulk(lambda job: cache.fetch(*job), jobs,
+                       workers=workers, errors=KnackhqError)
+    cache.save()
+
+    paths = dict()
+    errors = dict()
+    for job, path in zip(jobs, fetched.results):
+        paths[job[0]] = path
+    for _, job, error in fetched.failed:
+        errors[job[0]] = error
+
+    result = BulkResult()
+    for value, asset in zip(values, assets):
+        if asset is None:
+            result.add(value, True, None)
+        elif asset[0] in errors:
+            result.add(value, False, errors[asset[0]])
+        else:
+            result.add(value, True, paths[asset[0]])
+    result.skipped = skipped
+    return result
+
+if __name__ == "__main__":
+    import unittest
+
+    class AssetOfUnittest(unittest.TestCase):
+        def test_asset_of(self):
+            url = "http://assets.knackhq.com/assets/1/2/original/image1.jpg"
+            self.assertEqual(
+                asset_of({"id": "2", "filename": "image1.jpg", "url": url}),
+                ("2", url, "image1.jpg"))
+            self.assertEqual(asset_of('<img src="%s" />' % url),
+                             (url, url, None))
+            self.assertEqual(asset_of(url), (url, url, None))
+            self.assertEqual(asset_of(""), None)
+            self.assertEqual(asset_of(None), None)
+
+    unittest.main()
@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Module description
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Schema driven record encoder. An :class:`Encoder` is compiled once per
+:class:`~pyknackhq.schema.Object` from ``Field.type``, and turns plain Python
+values into knackhq payload, no :mod:`~pyknackhq.datatype` wrapper object is
+needed.
+
+Accepted values for each field type:
+
+- ``date_time``: datetime, date, ``(from_, to_)`` tuple, dict
+- ``timer``: ``(from_, to_)`` tuple, list of tuple, dict
+- ``address``: dict, ``(street, street2, city, state, zipcode, country)``
+- ``name``: dict, ``(title, first, middle, last)``
+- ``link``: url str, ``(url, label)``, dict
+- ``email``: email str, ``(email, label)``, dict
+- ``phone``: full number str, ``(full, area, country, number)``, dict
+- ``multiple_choice``: str, list or tuple of str
+- ``image``, ``file``: asset id str, raw value dict of a found record
+- others: the value itself
+
+:mod:`~pyknackhq.datatype` instances are still accepted everywhere.
+
+
+Import Command
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+from pyknackhq.encoder import Encoder
+"""
+
+from pyknackhq.py23compatible import _str_type, is_py3
+from pyknackhq.schema import normalize_name
+from datetime import datetime, date
+
+_date_cache = dict()
+
+def format_date(value):
+    """Format date or datetime to knackhq "mm/dd/YYYY" str, memoized.
+    """
+    if isinstance(value, datetime):
+        value = value.date()
+    try:
+        return _date_cache[value]
+    except KeyError:
+        if len(_date_cache) >= 100000:
+            _date_cache.clear()
+        text = "%02d/%02d/%04d" % (value.month, value.day, value.year)
+        _date_cache[value] = text
+        return text
+
+def _date_time_point(value):
+    if isinstance(value, datetime):
+        return {"date": format_date(value),
+                "hours": value.hour, "minutes": value.minute}
+    elif isinstance(value, date):
+        return {"date": format_date(value)}
+    return value
+
+def _drop_empty(attrs, value):
+    """dict or positional tuple to dict, empty value are dropped.
+    """
+    if isinstance(value, dict):
+        return {k: v for k, v in value.items() if v}
+    elif isinstance(value, tuple):
+        return {k: v for k, v in zip(attrs, value) if v}
+    return getattr(value, "_data", value)
+
+#--- encoder of each field type ---
+_plain_types = set([str, bytes, int, float, bool, list, dict, type(None)])
+if not is_py3: # pragma: no cover
+    _plain_types.update([unicode, long])
+
+def encode_value(value):
+    if type(value) in _plain_types:
+        return value
+    return getattr(value, "_data", value)
+
+def encode_multiple_choice(value):
+    if isinstance(value, tuple):
+        return list(value)
+    return getattr(value, "_data", value)
+
+def encode_date_time(value):
+    if isinstance(value, (datetime, date)):
+        return _date_time_point(value)
+    elif isinstance(value, tuple):
+        data = _date_time_point(value[0])
+        data["to"] = _date_time_point(value[1])
+        return data
+    return getattr(value, "_data", value)
+
+def encode_timer(value):
+    if isinstance(value, tuple):
+        value = [value]
+    if isinstance(value, list):
+        return {"times": [
+            {"from": _date_time_point(from_), "to": _date_time_point(to_)}
+            for from_, to_ in value]}
+    return getattr(value, "_data", value)
+
+_address_attrs = ("street", "street2", "city", "state", "zipcode", "country")
+
+def encode_address(value):
+    return _drop_empty(_address_attrs, value)
+
+_name_attrs = ("title", "first", "middle", "last")
+
+def encode_name(value):
+    return _drop_empty(_name_attrs, value)
+
+def _make_labeled(main_attr, attrs):
+    def encode(value):
+        if isinstance(value, _str_type):
+            return {main_attr: value}
+        return _drop_empty(attrs, value)
+    return encode
+
+encode_link = _make_labeled("url", ("url", "label"))
+encode_email = _make_labeled("email", ("email", "label"))
+encode_phone = _make_labeled("full", ("full", "area", "country", "number"))
+
+def encode_asset(value):
+    if isinstance(value, dict): # raw value of a found record
+        return value.get("id", value)
+    return getattr(value, "_data", value)
+
+FIELD_TYPE_ENCODER = {
+    "multiple_choice": encode_multiple_choice,
+    "date_time": encode_date_time,
+    "timer": encode_timer,
+    "address": encode_address,
+    "name": encode_name,
+    "link": encode_link,
+    "email": encode_email,
+    "phone": encode_phone,
+    "image": encode_asset,
+    "file": encode_asset,
+}
+
+class Encoder(object):
+    """Record encoder compiled from the fields of an
+    :class:`~pyknackhq.schema.Object`.
+
+    :param object_: :class:`~pyknackhq.schema.Object` instance
+
+    Usage::
+
+        >>> encoder = Encoder(object_)
+        >>> encoder.encode({"date time field": date(2015, 11, 1)})
+        {"field_29": {"date": "11/01/2015"}}
+
+    **中文文档**
+
+    根据Object中各个Field的类型编译出的编码器, 直接将Python原生数据转化为可用于
+    insert的字典。
+    """
+    def __init__(self, object_):
+        self.by_name = dict()
+        self.by_key = dict()
+        self.by_norm = dict() # {normalized field name: (key, func)}
+        for field in object_:
+            func = FIELD_TYPE_ENCODER.get(field.type, encode_value)
+            self.by_name[field.name] = (field.key, func)
+            self.by_key[field.key] = (field.key, func)
+            self.by_norm.setdefault(normalize_name(field.name), 
+                                    (field.key, func))
+
+    def encode(self, data, using_name=True):
+        """Encode one record, returns a new dict using field key.
+
+        :param using_name: True if ``data`` is using field name, case and
+          whitespace insensitive like :meth:`~pyknackhq.schema.Object.get_field`,
+          unknown field name raises ``ValueError``. If False, unknown key is 
+          kept as it is.
+        """
+        new_dict = dict()
+        if using_name:
+            lookup = self.by_name
+        else:
+            lookup = self.by_key
+        plain_types = _plain_types
+        for name, value in data.items():
+            try:
+                key, func = lookup[name]
+            except KeyError:
+                if using_name:
+                    try:
+                        key, func = self.by_norm[normalize_name(name)]
+                    except KeyError:
+                        raise ValueError("'%s' are not found!" % name)
+                else:
+                    key, func = name, encode_value
+            if func is encode_value and type(value) in plain_types:
+                new_dict[key] = value
+            else:
+                new_dict[key] = func(value)
+        return new_dict
+
+    def encode_many(self, records, using_name=True):
+        """Encode list of records.
+        """
+        encode = self.encode
+        return [encode(data, using_name) for data in records]
+
+if __name__ == "__main__":
+    from pyknackhq.schema import Application
+    from pyknackhq.datatype import AddressType, DateTimeType
+    import unittest
+    import os
+
+    SCHEMA_JSON_PATH = os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "tests", "schema.json")
+
+    class EncoderUnittest(unittest.TestCase):
+        def setUp(self):
+            application = Application.from_json(SCHEMA_JSON_PATH)
+            self.encoder = Encoder(application.get_object("test_object"))
+
+        def test_encode(self):
+            data = self.encoder.encode({
+                "short text field": "Hello",
+                "multiple choice field": ("First Choice", "Second Choice"),
+                "date time field": datetime(2015, 11, 1, 14, 30),
+                "address field": {"street": "123 St", "street2": None},
+                "name field": ("Mr.", "Obama", None, "Barrack"),
+                "email field": "test@example.com",
+                "timer field": (datetime(2015, 1, 1, 0, 0),
+                                datetime(2015, 1, 1, 23, 59)),
+            })
+            self.assertEqual(data["field_25"], "Hello")
+            self.assertEqual(data["field_28"], ["First Choice", "Second Choice"])
+            self.assertEqual(data["field_29"],
+                {"date": "11/01/2015", "hours": 14, "minutes": 30})
+            self.assertEqual(data["field_33"], {"street": "123 St"})
+            self.assertEqual(data["field_34"],
+                {"title": "Mr.", "first": "Obama", "last": "Barrack"})
+            self.assertEqual(data["field_37"], {"email": "test@example.com"})
+            self.assertEqual(data["field_42"]["times"][0]["to"]["hours"], 23)
+
+        def test_datatype_compatible(self):
+            data = self.encoder.encode({
+                "address field": AddressType(street="123 St"),
+                "date time field": DateTimeType(date(2015, 11, 1)),
+            })
+            self.assertEqual(data["field_33"], {"street": "123 St"})
+            self.assertEqual(data["field_29"], {"date": "11/01/2015"})
+
+        def test_unknown_field(self):
+            self.assertRaises(ValueError, self.encoder.encode, {"not a field": 1})
+
+        def test_normalized_name(self):
+            self.assertEqual(
+                self.encoder.encode({"Short  Text Field ": "Hello"}),
+                self.encoder.encode({"short text field": "Hello"}))
+
+    unittest.main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Module description
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Exception raised by :meth:`~pyknackhq.client.KnackhqAuth.request`.
+
+
+Import Command
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+from pyknackhq.exc import KnackhqError
+"""
+
+#: http status worth a retry, rate limit and temporary server error
+RETRYABLE_STATUS = frozenset([408, 429, 500, 502, 503, 504])
+
+class KnackhqError(Exception):
+    """A failed knackhq api request.
+
+    :attr status: http status code, None if the server is not reached.
+    :attr body: decoded json error body returned by knackhq, or the raw text.
+    :attr url: request url.
+    :attr retryable: True if sending the same request later may succeed.
+
+    **中文文档**
+
+    API请求失败时抛出的异常, 包含http状态码, knackhq返回的错误信息, 以及是否
+    值得重试。
+    """
+    def __init__(self, message, status=None, body=None, url=None,
+                 retryable=None):
+        Exception.__init__(self, message)
+        self.message = message
+        self.status = status
+        self.body = body
+        self.url = url
+        if retryable is None:
+            retryable = (status is None) or (status in RETRYABLE_STATUS)
+        self.retryable = retryable
+
+    def __repr__(self):
+        return "KnackhqError(status=%r, message=%r)" % (
+            self.status, self.message)
+
+    @staticmethod
+    def from_response(res, body):
+        """Build from a ``requests.Response`` with error status.
+
+        knackhq error body looks like ``{"errors": [{"message": "..."}]}``.
+        """
+        message = None
+        try:
+            message = "; ".join([
+                error.get("message", str(error)) if isinstance(error, dict)
+                else str(error) for error in body["errors"]])
+        except (KeyError, TypeError):
+            pass
+        if not message:
+            message = "%s %s" % (res.status_code, res.reason)
+        return KnackhqError(message, status=res.status_code, body=body,
+                            url=res.url)
@@ -19,6 +19,15 @@ This module is re-pack of some json utility functions.
     
 - :func:`prt_js`: Print Json in pretty format.
 
+- :class:`JsonlWriter`, :func:`dump_jsonl`, :func:`iter_jsonl`: Streaming
+  json lines writer and reader, support gzip, bz2, lzma compress.
+
+- :func:`dump_indexed_jsonl`, :class:`IndexedJsonl`: Json lines file with a
+  record id offset index, memory mapped for random access.
+
+- :class:`RecordStream`: Incrementally parse the ``records`` array of a
+  knackhq api response from a stream of bytes chunks.
+
 
 Highlight
 ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
@@ -26,6 +35,9 @@ Highlight
 - :func:`load_js`, :func:`dump_js`, :func:`safe_dump_js` support gzip compress, 
   size is **10 - 20 times** smaller in average.
 
+- :func:`load_js` and :func:`dump_js` with ``fastmode=True`` use
+  :mod:`pyknackhq.codec`, the fastest installed json library is used.
+
 
 Compatibility
 ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
@@ -45,8 +57,11 @@ Class, method, function, exception
 """
 
 from __future__ import print_function, unicode_literals
-import json, gzip
+from pyknackhq import codec
+import json, gzip, bz2
+import codecs
 import os, shutil
+import mmap
 import time
 
 def load_js(abspath, default=dict(), compress=False, enable_verbose=True):
@@ -103,17 +118,17 @@ def load_js(abspath, default=dict(), compress=False, enable_verbose=True):
 
     if enable_verbose:
         print("\nLoading from %s..." % abspath)
-        st = time.clock()
+        st = time.time()
         
     if os.path.exists(abspath): # exists, then load
         if compress:
             with gzip.open(abspath, "rb") as f:
-                js = json.loads(f.read().decode("utf-8"))
+                js = codec.loads(f.read())
         else:
-            with open(abspath, "r") as f:
-                js = json.load(f)
+            with open(abspath, "rb") as f:
+                js = codec.loads(f.read())
         if enable_verbose:
-            print("\tComplete! Elapse %.6f sec." % (time.clock() - st) )
+            print("\tComplete! Elapse %.6f sec." % (time.time() - st) )
         return js
     
     else:
@@ -212,17 +227,17 @@ def dump_js(js, abspath,
     
     if enable_verbose:
         print("\nDumping to %s..." % abspath)
-        st = time.clock()
+        st = time.time()
     
     if os.path.exists(abspath): # if exists, check replace option
         if replace: # replace existing file
             if fastmode: # no sort and indent, do the fastest dumping
                 if compress:
                     with gzip.open(abspath, "wb") as f:
-                        f.write(json.dumps(js).encode("utf-8"))
+                        f.write(codec.dumpb(js))
                 else:
-                    with open(abspath, "w") as f:
-                        json.dump(js, f)
+                    with open(abspath, "wb") as f:
+                        f.write(codec.dumpb(js))
             else:
                 if compress:
                     with gzip.open(abspath, "wb") as f:
@@ -240,10 +255,10 @@ def dump_js(js, abspath,
         if fastmode: # no sort and indent, do the fastest dumping
             if compress:
                 with gzip.open(abspath, "wb") as f:
-                    f.write(json.dumps(js).encode("utf-8"))
+                    f.write(codec.dumpb(js))
             else:
-                with open(abspath, "w") as f:
-                    json.dump(js, f)
+                with open(abspath, "wb") as f:
+                    f.write(codec.dumpb(js))
         else:
             if compress:
                 with gzip.open(abspath, "wb") as f:
@@ -255,7 +270,7 @@ def dump_js(js, abspath,
                               indent=4, separators=("," , ": ") )
             
     if enable_verbose:
-        print("\tComplete! Elapse %.6f sec" % (time.clock() - st) )
+        print("\tComplete! Elapse %.6f sec" % (time.time() - st) )
 
 def safe_dump_js(js, abspath, 
                  fastmode=False, compress=False, enable_verbose=True):
@@ -373,7 +388,422 @@ def prt_js(js, sort_keys=True, indent=4):
     以人类可读的方式打印可Json化的Python对象。
     """
     print(js2str(js, sort_keys, indent) )
-    
+
+class _ChunkReader(object):
+    """Character buffer over an iterable of utf-8 encoded byte chunks.
+
+    Only the unconsumed tail of the stream is kept in memory.
+    """
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.decoder_ = json.JSONDecoder()
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self, size=1):
+        """Read chunks into buffer until at least ``size`` more characters
+        are added, return False if stream is exhausted.
+        """
+        if self.eof:
+            return False
+        # drop the consumed part, so buffer never grows beyond one record
+        parts = [self.buf[self.pos:]]
+        self.pos = 0
+        n = 0
+        for chunk in self.chunks:
+            if chunk:
+                text = self.decoder.decode(chunk)
+                parts.append(text)
+                n += len(text)
+                if n >= size:
+                    self.buf = "".join(parts)
+                    return True
+        parts.append(self.decoder.decode(b"", final=True))
+        self.buf = "".join(parts)
+        self.eof = True
+        return False
+
+    def peek(self):
+        """Skip whitespace, return next non-whitespace character or "".
+        """
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError("expect %r at position %s" % (char, self.pos))
+        self.pos += 1
+
+    def decode(self):
+        """Decode next complete json value.
+
+        A value is only accepted when it is followed by at least one more
+        character, so a number cut at chunk boundary is never mis-read.
+        While a value is incomplete, the pending text is at least doubled
+        before the next attempt, so a value spanning many chunks is parsed
+        a logarithmic number of times, not once per chunk.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder_.raw_decode(self.buf, self.pos)
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except ValueError:
+                if self.eof:
+                    raise
+            self.fill(max(1, len(self.buf) - self.pos))
+
+class RecordStream(object):
+    """Incrementally parse a knackhq api response, yield each element of
+    the ``records`` array as soon as it is decoded. Other top level items,
+    for example ``total_pages``, ``current_page``, ``total_records``, are
+    collected in :attr:`RecordStream.meta`.
+
+    :param chunks: iterable of utf-8 encoded bytes, for example
+      ``requests.Response.iter_content(chunk_size)``
+    :param key: the top level key of the array to stream, default "records"
+    :param close: optional callable, called when the stream is finished
+
+    Usage::
+
+        >>> stream = RecordStream(response.iter_content(65536))
+        >>> for record in stream:
+        ...     process(record)
+        >>> stream.meta
+        {"total_pages": 1, "current_page": 1, "total_records": 3}
+
+    **中文文档**
+
+    以流的方式逐条解析API返回的 ``records`` 数组, 无需将整个响应读入内存。
+    """
+    def __init__(self, chunks, key="records", close=None):
+        self.reader = _ChunkReader(chunks)
+        self.key = key
+        self.close = close
+        self.meta = dict()
+        self._iterator = self._parse()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._iterator)
+
+    next = __next__
+
+    def map(self, func):
+        """Apply ``func`` to each record as it is decoded, returns the
+        stream itself, :attr:`RecordStream.meta` is still collected.
+        """
+        self._iterator = (func(data) for data in self._iterator)
+        return self
+
+    def _parse(self):
+        reader = self.reader
+        try:
+            reader.expect("{")
+            if reader.peek() == "}":
+                return
+            while True:
+                key = reader.decode()
+                reader.expect(":")
+                if key == self.key and reader.peek() == "[":
+                    reader.expect("[")
+                    if reader.peek() == "]":
+                        reader.pos += 1
+                    else:
+                        while True:
+                            yield reader.decode()
+                            char = reader.peek()
+                            reader.pos += 1
+                            if char == "]":
+                                break
+                            elif char != ",":
+                                raise ValueError(
+                                    "expect ',' or ']' at position %s" %
+                                    reader.pos)
+                else:
+                    self.meta[key] = reader.decode()
+                char = reader.peek()
+                reader.pos += 1
+                if char == "}":
+                    break
+                elif char != ",":
+                    raise ValueError(
+                        "expect ',' or '}' at position %s" % reader.pos)
+        finally:
+            if self.close is not None:
+                self.close()
+
+_jsonl_openers = {
+    ".jsonl": open,
+    ".gz": gzip.open,
+    ".bz2": lambda abspath, mode: bz2.BZ2File(abspath, mode),
+}
+try:
+    import lzma
+    _jsonl_openers[".xz"] = lzma.open
+    _jsonl_openers[".lzma"] = lzma.open
+except ImportError: # pragma: no cover, python2
+    pass
+
+def _open_jsonl(abspath, mode):
+    """Open a json lines file, compression is decided by file extension.
+    """
+    root, ext = os.path.splitext(abspath)
+    if ext == ".tmp":
+        root, ext = os.path.splitext(root)
+    try:
+        opener = _jsonl_openers[ext]
+    except KeyError:
+        raise Exception("json lines file extension has to be one of %s!" % 
+                        ", ".join(sorted(_jsonl_openers)))
+    return opener(abspath, mode)
+
+class JsonlWriter(object):
+    """Streaming newline-delimited json writer, one document per line.
+    Compression is decided by file extension: ``.jsonl`` (no compression),
+    ``.gz``, ``.bz2``, ``.xz`` / ``.lzma``.
+
+    Like :func:`safe_dump_js`, data is written to ``abspath + ".tmp"`` and 
+    renamed to ``abspath`` on :meth:`JsonlWriter.close`. If an exception 
+    is raised inside the ``with`` block, the temp file is removed and the 
+    existing file stays untouched.
+
+    :param abspath: ``save as`` path.
+    :param replace: (default False) If ``True``, silently overwrite existing
+      file. If False, an exception will be raised.
+
+    Usage::
+
+        >>> with JsonlWriter("records.jsonl.gz") as writer:
+        ...     for record in records:
+        ...         writer.write(record)
+
+    **中文文档**
+
+    以流的方式将多个Json文档逐行写入文件, 内存占用与数据量无关。写入完成后才会
+    覆盖原文件, 保证写操作的原子性。
+    """
+    def __init__(self, abspath, replace=False):
+        self.abspath = str(abspath)
+        if os.path.exists(self.abspath) and (not replace):
+            raise Exception("\tCANNOT WRITE to %s, it's already "
+                            "exists" % self.abspath)
+        self.temp_abspath = "%s.tmp" % self.abspath
+        self.f = _open_jsonl(self.temp_abspath, "wb")
+        self.count = 0
+        self.offset = 0
+
+    def write(self, js):
+        """Write one json serializable object as one line. Returns 
+        ``(offset, length)`` of the line in the uncompressed stream.
+        """
+        line = codec.dumpb(js) + b"\n"
+        self.f.write(line)
+        offset = self.offset
+        self.offset += len(line)
+        self.count += 1
+        return offset, len(line)
+
+    def write_many(self, iterable):
+        """Write every object from iterable.
+        """
+        for js in iterable:
+            self.write(js)
+
+    def close(self):
+        """Flush data and move temp file to ``abspath``.
+        """
+        self.f.close()
+        shutil.move(self.temp_abspath, self.abspath)
+
+    def abort(self):
+        """Discard everything written so far.
+        """
+        self.f.close()
+        try:
+            os.remove(self.temp_abspath)
+        except OSError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+def dump_jsonl(iterable, abspath, replace=False):
+    """Dump every json serializable object from iterable to a json lines 
+    file, atomically. Returns number of lines written.
+
+    See :class:`JsonlWriter` for supported file extension.
+
+    **中文文档**
+
+    将可迭代对象中的每一个元素作为一行Json写入文件, 返回写入的行数。
+    """
+    with JsonlWriter(abspath, replace=replace) as writer:
+        writer.write_many(iterable)
+    return writer.count
+
+def iter_jsonl(abspath):
+    """Iterate a json lines file written by :class:`JsonlWriter`, yield one
+    document at a time. Blank lines are skipped.
+
+    See :class:`JsonlWriter` for supported file extension.
+
+    **中文文档**
+
+    逐行读取Json lines文件, 每次只在内存中保留一个文档。
+    """
+    with _open_jsonl(str(abspath), "rb") as f:
+        for line in f:
+            if line.strip():
+                yield codec.loads(line)
+
+def _index_key(value):
+    """Canonical str key of a field value, used in the unique field index.
+    """
+    return json.dumps(value, sort_keys=True)
+
+def dump_indexed_jsonl(iterable, abspath, key="id", 
+                       index_fields=None, replace=False):
+    """Dump records to a uncompressed ``.jsonl`` file, plus a sidecar offset
+    index ``abspath + ".idx.json"`` mapping each record's ``key`` and unique
+    ``index_fields`` value to its byte range. Use :class:`IndexedJsonl` to 
+    read it. Returns the number of records written.
+
+    :param key: name of the primary key, default "id"
+    :param index_fields: list of unique field names to index
+
+    Raise ``ValueError`` if two records have the same primary key, or the
+    same value of an index field, nothing is written then.
+
+    **中文文档**
+
+    将记录写入Json lines文件, 同时生成一个记录主键(以及其他唯一字段)到字节位置
+    的索引文件, 用于随机读取。
+    """
+    abspath = str(abspath)
+    if os.path.splitext(abspath)[1] != ".jsonl":
+        raise Exception("indexed json lines file extension has to be '.jsonl'!")
+    
+    index_fields = list(index_fields or [])
+    index = {"key": key, "offset": dict(), 
+             "fields": dict([(name, dict()) for name in index_fields])}
+    with JsonlWriter(abspath, replace=replace) as writer:
+        for js in iterable:
+            offset, length = writer.write(js)
+            pk = js[key]
+            if pk in index["offset"]:
+                raise ValueError("duplicate %s %r!" % (key, pk))
+            index["offset"][pk] = [offset, length]
+            for name in index_fields:
+                if name in js:
+                    field_index = index["fields"][name]
+                    value = _index_key(js[name])
+                    if value in field_index:
+                        raise ValueError(
+                            "duplicate value %s of unique field %r, record "
+                            "%r and %r!" % (value, name, field_index[value], pk))
+                    field_index[value] = pk
+        index["size"] = writer.offset
+    # the data file is in place now, so the index never points at a file
+    # that was not written
+    safe_dump_js(index, "%s.idx.json" % abspath, 
+                 fastmode=True, enable_verbose=False)
+    return writer.count
+
+class IndexedJsonl(object):
+    """Read only random access to a file written by 
+    :func:`dump_indexed_jsonl`. The data file is memory mapped, a lookup only 
+    touches the bytes of that record, and several processes opening the same
+    file share the same pages of the os cache.
+
+    The index is not mapped, it is loaded from ``abspath + ".idx.json"`` and
+    held in memory by each process, its size grows with the number of
+    records and index fields.
+
+    Usage::
+
+        >>> with IndexedJsonl("records.jsonl") as db:
+        ...     db.get("564d0bacde3971932db54093")
+        ...     db.get_by("email", {"email": "test@example.com"})
+
+    **中文文档**
+
+    以内存映射方式打开带索引的Json lines文件, 按主键或唯一字段随机读取单条记录。
+    """
+    def __init__(self, abspath):
+        self.abspath = str(abspath)
+        self.index = load_js("%s.idx.json" % self.abspath, 
+                             default=None, enable_verbose=False)
+        if self.index is None:
+            raise Exception("index of %s not found!" % self.abspath)
+        self.f = open(self.abspath, "rb")
+        size = os.fstat(self.f.fileno()).st_size
+        if size != self.index["size"]:
+            self.f.close()
+            raise Exception("%s doesn't match its index!" % self.abspath)
+        if size:
+            self.mm = mmap.mmap(self.f.fileno(), 0, access=mmap.ACCESS_READ)
+        else: # empty file can't be mapped
+            self.mm = None
+
+    def __len__(self):
+        return len(self.index["offset"])
+
+    def __contains__(self, pk):
+        return pk in self.index["offset"]
+
+    def __iter__(self):
+        return iter(self.index["offset"])
+
+    def get(self, pk, default=None):
+        """Return the record by primary key, or ``default``.
+        """
+        try:
+            offset, length = self.index["offset"][pk]
+        except KeyError:
+            return default
+        return codec.loads(self.mm[offset:offset + length])
+
+    def get_by(self, field, value, default=None):
+        """Return the record by the value of a unique indexed field, or 
+        ``default``.
+        """
+        try:
+            pk = self.index["fields"][field][_index_key(value)]
+        except KeyError:
+            if field not in self.index["fields"]:
+                raise ValueError("'%s' is not indexed!" % field)
+            return default
+        return self.get(pk, default)
+
+    def close(self):
+        if self.mm is not None:
+            self.mm.close()
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
 ############
 # Unittest #
 ############
@@ -399,6 +829,76 @@ if __name__ == "__main__":
             safe_dump_js(data, "data.gz", compress=True)
             prt_js(load_js("data.gz", compress=True))
             
+        def test_record_stream(self):
+            data = {"total_pages": 1, "current_page": 1, "total_records": 123,
+                    "records": [{"id": str(i), "text": "是" * i} 
+                                for i in range(123)]}
+            binary = json.dumps(data).encode("utf-8")
+            chunks = [binary[i:i+7] for i in range(0, len(binary), 7)]
+            stream = RecordStream(chunks)
+            self.assertEqual(list(stream), data["records"])
+            self.assertEqual(stream.meta["total_records"], 123)
+            
+            # a record much larger than a chunk is parsed a few times only
+            big = {"id": "big", "text": "是" * 300000}
+            binary = json.dumps({"records": [big]}).encode("utf-8")
+            stream = RecordStream(
+                [binary[i:i+1024] for i in range(0, len(binary), 1024)])
+            calls = list()
+            raw_decode = stream.reader.decoder_.raw_decode
+            def counted(*args):
+                calls.append(None)
+                return raw_decode(*args)
+            stream.reader.decoder_.raw_decode = counted
+            self.assertEqual(list(stream), [big])
+            self.assertTrue(len(calls) < 30)
+            
+            stream = RecordStream(chunks).map(lambda data: data["id"])
+            self.assertEqual(list(stream), [str(i) for i in range(123)])
+            self.assertEqual(stream.meta["total_records"], 123)
+            
+            stream = RecordStream([b'{"records": [], "total_pages": 0}'])
+            self.assertEqual(list(stream), [])
+            self.assertEqual(stream.meta["total_pages"], 0)
+            
+        def test_jsonl(self):
+            data = [{"id": i, "text": "是"} for i in range(100)]
+            for path in ["data.jsonl", "data.gz", "data.bz2", "data.xz"]:
+                self.assertEqual(dump_jsonl(iter(data), path), 100)
+                self.assertEqual(list(iter_jsonl(path)), data)
+                os.remove(path)
+            
+        def test_jsonl_abort(self):
+            dump_jsonl([{"a": 1}], "data.gz")
+            try:
+                with JsonlWriter("data.gz", replace=True) as writer:
+                    writer.write({"a": 2})
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+            self.assertEqual(list(iter_jsonl("data.gz")), [{"a": 1}])
+            self.assertFalse(os.path.exists("data.gz.tmp"))
+            
+        def test_indexed_jsonl(self):
+            data = [{"id": "r%s" % i, "email": {"email": "%s@x.com" % i}}
+                    for i in range(100)]
+            dump_indexed_jsonl(data, "data.jsonl", index_fields=["email"])
+            with IndexedJsonl("data.jsonl") as db:
+                self.assertEqual(len(db), 100)
+                self.assertEqual(db.get("r42"), data[42])
+                self.assertEqual(
+                    db.get_by("email", {"email": "7@x.com"}), data[7])
+                self.assertEqual(db.get("r100"), None)
+            
+            data.append({"id": "r100", "email": {"email": "7@x.com"}})
+            with self.assertRaises(ValueError):
+                dump_indexed_jsonl(data, "data.jsonl", index_fields=["email"],
+                                   replace=True)
+            with IndexedJsonl("data.jsonl") as db: # old file is kept
+                self.assertEqual(len(db), 100)
+            os.remove("data.jsonl")
+            os.remove("data.jsonl.idx.json")
+            
         def tearDown(self):
             for path in ["data.json", "data.gz"]:
                 try:
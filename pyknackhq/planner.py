@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Module description
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Cost estimation of bulk jobs, so they can be scheduled within the daily api
+quota. See :meth:`~pyknackhq.client.Collection.explain`.
+
+- ``export``: one read request per page of 1000 records.
+- ``update``, ``delete``: pages to collect the records, plus one write
+  request per record.
+- ``insert``: one write request per record.
+
+Wall time is bound by the rate budget (``api_calls / rate``) or by the
+latency of each request divided over the workers, whichever is larger.
+
+
+Import Command
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+from pyknackhq.planner import Estimate, estimate
+"""
+
+from collections import namedtuple
+
+Estimate = namedtuple("Estimate", "operation records read_requests "
+                      "write_requests api_calls seconds bytes")
+
+OPERATIONS = ("export", "update", "delete", "insert")
+
+def estimate(operation, records, record_bytes=0, rate=10, workers=1,
+             rows_per_page=1000, latency=0.3):
+    """Estimate the cost of a bulk job.
+
+    :param operation: "export", "update", "delete" or "insert"
+    :param records: number of records involved
+    :param record_bytes: average size of one record in json
+    :param rate: requests per second allowed by the rate budget
+    :param workers: number of concurrent requests
+    :param rows_per_page: page size used to scan
+    :param latency: average seconds of one request
+    :returns: :class:`Estimate`
+
+    **中文文档**
+
+    估算批量操作所需的API调用次数, 时间和数据量。
+    """
+    if operation not in OPERATIONS:
+        raise ValueError("operation has to be one of %s!" % (OPERATIONS,))
+    pages = max(1, -(-records // rows_per_page))
+    if operation == "export":
+        read, write = pages, 0
+    elif operation == "insert":
+        read, write = 0, records
+    else:
+        read, write = pages, records
+    api_calls = read + write
+    # pages are scanned one by one, writes are spread over the workers
+    seconds = max(float(api_calls) / rate,
+                  read * latency + float(write) * latency / max(1, workers))
+    if operation == "delete":
+        n_bytes = 0
+    else:
+        n_bytes = records * record_bytes
+    return Estimate(operation, records, read, write, api_calls,
+                    round(seconds, 1), n_bytes)
+
+if __name__ == "__main__":
+    import unittest
+
+    class EstimateUnittest(unittest.TestCase):
+        def test_estimate(self):
+            e = estimate("export", 2500, record_bytes=1000)
+            self.assertEqual((e.read_requests, e.write_requests, e.bytes),
+                             (3, 0, 2500000))
+            e = estimate("update", 2500, rate=10, workers=8)
+            self.assertEqual(e.api_calls, 2503)
+            self.assertEqual(e.seconds, 250.3)
+            e = estimate("insert", 100, rate=10, workers=1, latency=0.5)
+            self.assertEqual(e.seconds, 50.0)
+            self.assertRaises(ValueError, estimate, "truncate", 1)
+
+    unittest.main()
@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Module description
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Concurrent execution of many api requests, shared by the bulk methods of
+:class:`~pyknackhq.client.Collection`.
+
+- :class:`RateBudget`: thread safe token bucket. knackhq allows 10 requests
+  per second per application. :class:`~pyknackhq.client.KnackhqAuth` takes
+  a token before sending each request, so all threads together never go
+  beyond the limit.
+- :func:`map_concurrent`: apply a function on each item with a pool of
+  threads, results are returned in input order.
+- :func:`run_bulk`: same as :func:`map_concurrent`, but failures of single
+  items are collected in a :class:`BulkResult` instead of aborting the run.
+
+Threads are used because the work is network bound.
+``multiprocessing.pool.ThreadPool`` is available on both Python2 and Python3.
+
+
+Import Command
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+from pyknackhq.pool import RateBudget, map_concurrent, run_bulk, BulkResult
+"""
+
+from multiprocessing.pool import ThreadPool
+import threading
+import time
+
+class RateBudget(object):
+    """Token bucket rate limiter, can be shared by many threads.
+
+    :param rate: number of tokens refilled per second.
+    :param burst: max number of tokens in the bucket, default equals rate.
+
+    **中文文档**
+
+    令牌桶限速器。每个请求发出前调用 :meth:`RateBudget.acquire` 获取一个令牌,
+    保证所有线程加起来不超过API的速率限制。
+    """
+    def __init__(self, rate=10, burst=None):
+        if rate <= 0:
+            raise ValueError("rate has to be positive!")
+        self.rate = float(rate)
+        self.burst = float(burst or rate)
+        self._tokens = self.burst
+        self._last = time.time()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """Block until ``tokens`` tokens are available, and take them.
+        Returns the seconds waited.
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.time()
+                self._tokens = min(
+                    self.burst, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+                delay = (tokens - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+def map_concurrent(func, iterable, workers=4, budget=None):
+    """Apply ``func`` on each item of ``iterable`` concurrently, returns list
+    of results in input order.
+
+    :param workers: number of threads. If ``workers <= 1``, items are
+      processed one by one in current thread.
+    :param budget: optional :class:`RateBudget`, a token is taken before
+      each call.
+
+    **中文文档**
+
+    使用线程池并发地对每个元素执行func, 按输入顺序返回结果。
+    """
+    if budget is not None:
+        def call(item):
+            budget.acquire()
+            return func(item)
+    else:
+        call = func
+
+    if workers <= 1:
+        return [call(item) for item in iterable]
+
+    pool = ThreadPool(workers)
+    try:
+        return pool.map(call, list(iterable), chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+class BulkResult(object):
+    """Outcome of a bulk operation.
+
+    :param keep_results: if False, results are only counted, ``results``
+      stays empty, only failed inputs are kept. Memory then doesn't grow
+      with the number of inputs that succeeded.
+
+    :attr total: number of inputs
+    :attr results: result of each input in input order, None if it failed
+    :attr failed: list of ``(index, input, exception)``
+    :attr skipped: number of inputs not sent because there was nothing to do
+
+    Usage::
+
+        >>> result = collection.insert(records, workers=4)
+        >>> result
+        BulkResult(total=1000, succeeded=997, failed=3)
+        >>> collection.insert(result.retryable_inputs) # retry only those
+
+    **中文文档**
+
+    批量操作的结果汇总, 包含失败的输入及其异常, 以便只重试失败的部分。
+    """
+    def __init__(self, keep_results=True):
+        self.keep_results = keep_results
+        self.total = 0
+        self.results = list()
+        self.failed = list()
+        self.skipped = 0
+
+    @property
+    def succeeded(self):
+        return self.total - len(self.failed)
+
+    @property
+    def ok(self):
+        return not self.failed
+
+    @property
+    def failed_inputs(self):
+        return [item for _, item, _ in self.failed]
+
+    @property
+    def retryable_inputs(self):
+        """Failed inputs whose error is worth a retry.
+        """
+        return [item for _, item, error in self.failed
+                if getattr(error, "retryable", False)]
+
+    def add(self, item, succeeded, value):
+        if not succeeded:
+            self.failed.append((self.total, item, value))
+            value = None
+        if self.keep_results:
+            self.results.append(value)
+        self.total += 1
+
+    def extend(self, other):
+        """Append another :class:`BulkResult`, indexes are shifted.
+        """
+        for index, item, error in other.failed:
+            self.failed.append((self.total + index, item, error))
+        if self.keep_results:
+            self.results.extend(other.results)
+        self.total += other.total
+        self.skipped += other.skipped
+        return self
+
+    def summary(self):
+        """Compact dict summary, failures are counted by http status.
+        """
+        by_status = dict()
+        for _, _, error in self.failed:
+            status = getattr(error, "status", None)
+            by_status[status] = by_status.get(status, 0) + 1
+        return {"total": self.total, "succeeded": self.succeeded,
+                "failed": len(self.failed), 
+                "retryable": len(self.retryable_inputs),
+                "skipped": self.skipped,
+                "failed_by_status": by_status}
+
+    def __repr__(self):
+        text = "BulkResult(total=%s, succeeded=%s, failed=%s" % (
+            self.total, self.succeeded, len(self.failed))
+        if self.skipped:
+            text += ", skipped=%s" % self.skipped
+        return text + ")"
+
+def run_bulk(func, iterable, workers=4, budget=None, errors=(Exception,),
+             keep_results=True):
+    """Apply ``func`` on each item like :func:`map_concurrent`. Exceptions
+    listed in ``errors`` are recorded per item, and the run goes on.
+
+    :param keep_results: see :class:`BulkResult`.
+
+    :returns: :class:`BulkResult`
+    """
+    items = list(iterable)
+
+    def call(item):
+        try:
+            return True, func(item)
+        except errors as e:
+            return False, e
+
+    result = BulkResult(keep_results=keep_results)
+    for item, (succeeded, value) in zip(
+            items, map_concurrent(call, items, workers=workers, budget=budget)):
+        result.add(item, succeeded, value)
+    return result
+
+if __name__ == "__main__":
+    import unittest
+
+    class RateBudgetUnittest(unittest.TestCase):
+        def test_acquire(self):
+            budget = RateBudget(rate=50, burst=5)
+            st = time.time()
+            for _ in range(15):
+                budget.acquire()
+            elapsed = time.time() - st
+            self.assertTrue(0.15 <= elapsed < 1.0)
+
+        def test_invalid_rate(self):
+            self.assertRaises(ValueError, RateBudget, 0)
+
+    class MapConcurrentUnittest(unittest.TestCase):
+        def test_order(self):
+            def slow_square(x):
+                time.sleep(0.01)
+                return x * x
+            self.assertEqual(map_concurrent(slow_square, range(20), workers=8),
+                             [x * x for x in range(20)])
+            self.assertEqual(map_concurrent(slow_square, range(5), workers=1),
+                             [0, 1, 4, 9, 16])
+
+        def test_budget(self):
+            budget = RateBudget(rate=100, burst=1)
+            st = time.time()
+            map_concurrent(lambda x: x, range(21), workers=8, budget=budget)
+            self.assertTrue(time.time() - st >= 0.18)
+
+    class RunBulkUnittest(unittest.TestCase):
+        def test_partial_failure(self):
+            from pyknackhq.exc import KnackhqError
+            def func(x):
+                if x % 3 == 0:
+                    raise KnackhqError("boom", status=429 if x else 400)
+                return x
+            result = run_bulk(func, range(7), workers=3, errors=KnackhqError)
+            self.assertEqual(result.results, [None, 1, 2, None, 4, 5, None])
+            self.assertEqual(result.failed_inputs, [0, 3, 6])
+            self.assertEqual(result.retryable_inputs, [3, 6])
+            self.assertEqual(result.summary()["failed_by_status"],
+                             {400: 1, 429: 2})
+            result.extend(run_bulk(func, [3], errors=KnackhqError))
+            self.assertEqual((result.total, result.failed[-1][0]), (8, 7))
+            result = run_bulk(func, range(7), errors=KnackhqError,
+                              keep_results=False)
+            self.assertEqual(result.results, [])
+            self.assertEqual((result.total, result.failed_inputs), 
+                             (7, [0, 3, 6]))
+            result.extend(run_bulk(func, [1, 3], errors=KnackhqError))
+            self.assertEqual((result.results, result.failed[-1][0]), ([], 8))
+            self.assertRaises(ValueError, run_bulk, 
+                              lambda x: int("x"), [1], errors=KnackhqError)
+
+    unittest.main()
@@ -0,0 +1,290 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Module description
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Prepared find query. A :class:`Query` resolves field names, serializes the
+filter and compiles the record translator once, then can be executed any
+number of times, page after page, without touching the criteria again.
+See :meth:`~pyknackhq.client.Collection.query`.
+
+The criteria given by the caller are copied, never modified, so the same
+filter list can be reused for many queries. Two queries of the same
+collection with the same criteria, sort, page size and output options are
+equal and have the same hash, a query can be used as a cache key.
+
+If the schema of the collection is refreshed, see
+:meth:`~pyknackhq.client.KnackhqClient.refresh_schema`, the query is
+prepared again before its next execution. Its key is computed once when the
+query is created, from field keys which don't change with the schema, so a
+refresh never changes the hash of a query used as a cache key.
+
+:meth:`~pyknackhq.client.Collection.find` and
+:meth:`~pyknackhq.client.Collection.iter_find` build a one-off
+:class:`Query` for each call.
+
+
+Import Command
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+from pyknackhq.query import Query
+"""
+
+from pyknackhq.datatype import json_default
+from pyknackhq.include import ConnectionResolver
+from pyknackhq.py23compatible import _int_types
+import json
+
+def translate_filter(collection, filter, using_name=True):
+    """Return a copy of ``filter`` using field keys. ``filter`` is a list of
+    criterion, or a ``{"match": "and" / "or", "rules": [criterion]}`` dict.
+    """
+    def translate(criterion):
+        criterion = dict(criterion)
+        if using_name:
+            criterion["field"] = collection.get_field_key(criterion["field"])
+        return criterion
+
+    if isinstance(filter, dict):
+        new_filter = dict(filter)
+        new_filter["rules"] = [translate(c) for c in filter.get("rules", [])]
+        return new_filter
+    return [translate(criterion) for criterion in filter]
+
+def _is_page_number(value):
+    return isinstance(value, _int_types) and (not isinstance(value, bool)) \
+        and value >= 1
+
+class Query(object):
+    """A find query prepared once, executed many times.
+
+    :param collection: the :class:`~pyknackhq.client.Collection` to query
+    :param filter: list of criterion, or a ``{"match", "rules"}`` dict.
+      Copied, the caller's dicts are never modified.
+    :param rows_per_page: page size, :meth:`Query.find` only paginates if it
+      is given, :meth:`Query.iter_find` uses 1000 by default.
+
+    Other parameters are the same as :meth:`~pyknackhq.client.Collection.find`.
+
+    :attr params: http get parameters shared by every execution, the filter
+      is already serialized.
+    :attr key: hashable tuple identifying the query, fixed at creation.
+
+    **中文文档**
+
+    预编译的查询。字段名解析, 过滤条件的序列化, 记录转换函数只在创建时执行一次,
+    之后可以反复执行或翻页。可以作为缓存的键。
+    """
+    def __init__(self, collection, filter=None,
+                 sort_field=None, sort_order=None, rows_per_page=None,
+                 using_name=True, raw=True, recovery_name=True,
+                 include=None, fields=None):
+        self.collection = collection
+        self.raw = raw
+        self.recovery_name = recovery_name
+        self.rows_per_page = rows_per_page
+        self.include = tuple(include) if include else None
+        self.fields = tuple(fields) if fields is not None else None
+        self.using_name = using_name
+
+        if include and (not raw):
+            raise ValueError("include only works with raw=True")
+
+        if sort_order is None:
+            pass
+        elif sort_order == 1:
+            sort_order = "asc"
+        elif sort_order == -1:
+            sort_order = "desc"
+        else:
+            raise ValueError("sort_order has to be 1 or -1!")
+        self.sort_field = sort_field
+        self.sort_order = sort_order
+        # copy, names are resolved again if the schema changes
+        self.filter = translate_filter(collection, filter or [], False)
+        self._prepare()
+        self.key = (collection.key, tuple(sorted(self.params.items())),
+                    self.rows_per_page, self.raw, self.recovery_name,
+                    self._field_keys(self.include),
+                    self._field_keys(self.fields))
+
+    def _prepare(self):
+        """Resolve field names, serialize the filter, compile the record
+        translator, for the current schema of the collection.
+        """
+        collection = self.collection
+        using_name = self.using_name
+        params = dict()
+        if self.filter:
+            params["filters"] = json.dumps(
+                translate_filter(collection, self.filter, using_name),
+                sort_keys=True, default=json_default)
+        if self.sort_field:
+            sort_field = self.sort_field
+            if using_name:
+                sort_field = collection.get_field_key(sort_field)
+            params["sort_field"] = sort_field
+            params["sort_order"] = self.sort_order
+        self.params = params
+
+        self.translate = collection._make_translator(
+            self.raw, self.recovery_name, self.fields, using_name)
+        self.schema_version = collection.schema_version
+
+    def _check_schema(self):
+        if self.schema_version != self.collection.schema_version:
+            self._prepare()
+
+    def _field_keys(self, names):
+        if names is None:
+            return None
+        return tuple([self.collection.get_field_key(
+            name, using_name=self.using_name) for name in names])
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __eq__(self, other):
+        return isinstance(other, Query) and self.key == other.key
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __repr__(self):
+        return "Query(%r, %r)" % (self.collection.key, self.params)
+
+    def page_params(self, page=None, rows_per_page=None):
+        """Http get parameters of one page. Without a valid page number and
+        page size, no pagination parameter is added.
+        """
+        if rows_per_page is None:
+            rows_per_page = self.rows_per_page
+        params = dict(self.params)
+        if _is_page_number(page) and _is_page_number(rows_per_page):
+            params["page"] = page
+            params["rows_per_page"] = rows_per_page
+        return params
+
+    def _resolver(self):
+        if not self.include:
+            return None
+        return ConnectionResolver(self.collection, self.include,
+                                  using_name=self.using_name,
+                                  recovery_name=self.recovery_name)
+
+    def find(self, page=None, data_only=True, decode=False, stream=False):
+        """Execute the query, returns one page of records, see
+        :meth:`~pyknackhq.client.Collection.find`.
+        """
+        self._check_schema()
+        collection = self.collection
+        params = self.page_params(page)
+        if stream:
+            if self.include:
+                raise ValueError("include doesn't work with stream=True")
+            return collection._translate_stream(
+                collection.get_stream(collection.get_url, params),
+                self.raw, self.recovery_name, decode, self.translate)
+
+        res = collection.get(collection.get_url, params)
+        translate = self.translate
+        try:
+            records = [translate(data) for data in res["records"]]
+        except (KeyError, TypeError):
+            return res
+        if self.raw:
+            if self.include:
+                self._resolver().resolve(records)
+            if decode:
+                collection.decoder.decode_many(records)
+        if data_only:
+            return records
+        res["records"] = records
+        return res
+
+    def iter_find(self, decode=False):
+        """Iterate all records matching the query page by page, see
+        :meth:`~pyknackhq.client.Collection.iter_find`.
+        """
+        self._check_schema()
+        collection = self.collection
+        rows_per_page = self.rows_per_page or 1000
+        resolver = self._resolver()
+        page = 1
+        while True:
+            params = self.page_params(page, rows_per_page)
+            if resolver is not None:
+                stream = collection._translate_stream(
+                    collection.get_stream(collection.get_url, params),
+                    self.raw, self.recovery_name, translate=self.translate)
+                records = resolver.resolve(list(stream))
+                if decode:
+                    collection.decoder.decode_many(records)
+                for record in records:
+                    yield record
+            else:
+                stream = collection._translate_stream(
+                    collection.get_stream(collection.get_url, params),
+                    self.raw, self.recovery_name, decode, self.translate)
+                for record in stream:
+                    yield record
+            if page >= int(stream.meta.get("total_pages", 0)):
+                break
+            page += 1
+
+if __name__ == "__main__":
+    from pyknackhq.schema import Application
+    from pyknackhq.client import Collection
+    import unittest
+    import os
+
+    SCHEMA_JSON_PATH = os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "tests", "schema.json")
+
+    application = Application.from_json(SCHEMA_JSON_PATH)
+    collection = Collection.from_dict(
+        application.get_object("test_object").__dict__)
+
+    class QueryUnittest(unittest.TestCase):
+        def test_filter_not_modified(self):
+            filter = [{"field": "short text field", "operator": "is",
+                       "value": "a"}]
+            q1 = Query(collection, filter, sort_field="number field",
+                       sort_order=-1, rows_per_page=100)
+            q2 = Query(collection, filter, sort_field="number field",
+                       sort_order=-1, rows_per_page=100)
+            self.assertEqual(filter[0]["field"], "short text field")
+            self.assertEqual(q1, q2)
+            self.assertEqual(len(set([q1, q2])), 1)
+            self.assertNotEqual(q1, Query(collection, filter))
+            key = collection.get_field_key("short text field")
+            self.assertIn('"%s"' % key, q1.params["filters"])
+            self.assertEqual(q1.params["sort_order"], "desc")
+
+        def test_page_params(self):
+            q = Query(collection, rows_per_page=100)
+            self.assertEqual(q.page_params(), {})
+            self.assertEqual(q.page_params(2),
+                             {"page": 2, "rows_per_page": 100})
+            self.assertNotIn("page", q.params)
+            self.assertRaises(ValueError, Query, collection, sort_order=0)
+
+        def test_key_survives_refresh(self):
+            q = Query(collection, [{"field": "short text field",
+                                    "operator": "is", "value": "a"}])
+            key = q.key
+            collection.schema_version += 1
+            try:
+                q._check_schema()
+                self.assertEqual(q.schema_version, collection.schema_version)
+                self.assertEqual(q.key, key)
+                field_key = collection.get_field_key("short text field")
+                self.assertEqual(q, Query(collection, [
+                    {"field": field_key, "operator": "is", "value": "a"}],
+                    using_name=False))
+            finally:
+                del collection.schema_version
+
+    unittest.main()
@@ -0,0 +1,271 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Module description
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Make a :class:`~pyknackhq.client.Collection` match a local source of truth
+(csv file, database query, ...) with the minimal number of api calls.
+
+1. Source rows are encoded and spooled to a temporary indexed json lines
+   file, see :func:`~pyknackhq.js.dump_indexed_jsonl`. Only the byte
+   offset of each key is held in memory, not the rows.
+2. The collection is scanned once with
+   :meth:`~pyknackhq.client.Collection.iter_find`. Each remote record is
+   compared with its source row, read back by key, and dropped right away,
+   only the id and the changed fields are kept.
+3. The resulting :class:`ReconcilePlan` lists the inserts, updates (changed
+   fields only) and deletes. It can be applied concurrently, or just
+   reported in dry run mode.
+
+Remote raw values carry more than what is sent (date time ``timestamp``,
+address ``latitude``, connection ``identifier``, ...), so a dict value only
+compares the keys the source has. Values of numeric fields compare by value
+(``"3.50"`` equals ``3.5``), all other values compare exactly, so
+``"02134"`` and ``"2134"`` differ. A value that still can't be matched is
+reported as changed, which costs one extra update but never loses data.
+
+
+Import Command
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+from pyknackhq.reconcile import ReconcilePlan, plan_reconcile
+"""
+
+from pyknackhq.py23compatible import _str_type, _number_types
+from pyknackhq.pool import run_bulk
+from pyknackhq.exc import KnackhqError
+from pyknackhq.js import dump_indexed_jsonl, IndexedJsonl
+from decimal import Decimal, InvalidOperation
+import tempfile
+import shutil
+import json
+import os
+
+def _is_empty(value):
+    return value is None or value == "" or value == [] or value == {}
+
+def _as_number(value):
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, _number_types + (_str_type,)):
+        try:
+            return Decimal(str(value))
+        except InvalidOperation:
+            return None
+    return None
+
+def same_value(local, remote, numeric=False):
+    """Whether the encoded ``local`` value equals the ``remote`` raw value.
+
+    :param numeric: True for the value of a numeric field, see
+      :data:`NUMERIC_FIELD_TYPE`, then numbers and numeric strings compare by
+      value. Otherwise values have to be equal.
+    """
+    if local == remote and \
+            isinstance(local, bool) == isinstance(remote, bool):
+        return True
+    if _is_empty(local) and _is_empty(remote):
+        return True
+    if isinstance(local, dict) and isinstance(remote, dict):
+        for key, value in local.items():
+            if not same_value(value, remote.get(key)):
+                return False
+        return True
+    if isinstance(local, list) and isinstance(remote, list):
+        if len(local) != len(remote):
+            return False
+        for a, b in zip(local, remote):
+            if isinstance(b, dict) and not isinstance(a, dict): # connection
+                b = b.get("id")
+            if not same_value(a, b):
+                return False
+        return True
+    if numeric:
+        number = _as_number(local)
+        if number is not None:
+            return number == _as_number(remote)
+    return False
+
+NUMERIC_FIELD_TYPE = frozenset(["number", "currency", "rating",
+                                "auto_increment"])
+
+def key_of(value, numeric=False):
+    """Hashable key of a key field value. Value of numeric field compares
+    by value, so 5, 5.0 and "5" are the same key. Email, link and phone
+    values are keyed by their address, url or full number, the label and
+    the other parts knackhq adds are ignored.
+    """
+    if isinstance(value, dict): # email, link, phone
+        labeled = value.get("email") or value.get("url") or value.get("full")
+        if labeled is not None:
+            value = labeled
+    if numeric:
+        number = _as_number(value)
+        if number is not None:
+            return str(number.normalize())
+    if isinstance(value, _str_type):
+        return value
+    return json.dumps(value, sort_keys=True)
+
+class ReconcilePlan(object):
+    """Minimal set of changes to make a collection match the source.
+
+    :attr inserts: list of payload (field key based)
+    :attr updates: list of ``(id, changed fields payload)``
+    :attr deletes: list of record id
+    :attr unchanged: number of records already up to date
+    :attr scan_requests: number of pages requested to scan the collection
+    :attr results: after :meth:`ReconcilePlan.apply`,
+      ``{"insert": BulkResult, "update": BulkResult, "delete": BulkResult}``
+
+    **中文文档**
+
+    同步计划, 包含需要插入, 更新, 删除的记录。
+    """
+    def __init__(self, collection):
+        self.collection = collection
+        self.inserts = list()
+        self.updates = list()
+        self.deletes = list()
+        self.unchanged = 0
+        self.scan_requests = 0
+        self.results = None
+
+    @property
+    def api_calls(self):
+        """Number of write requests needed to apply the plan.
+        """
+        return len(self.inserts) + len(self.updates) + len(self.deletes)
+
+    def summary(self):
+        return {"insert": len(self.inserts), "update": len(self.updates),
+                "delete": len(self.deletes), "unchanged": self.unchanged,
+                "api_calls": self.api_calls,
+                "scan_requests": self.scan_requests}
+
+    def __repr__(self):
+        return ("ReconcilePlan(insert=%s, update=%s, delete=%s, "
+                "unchanged=%s)") % (len(self.inserts), len(self.updates),
+                                    len(self.deletes), self.unchanged)
+
+    def apply(self, workers=1):
+        """Send all changes, deletes first, then updates and inserts.
+        Returns :attr:`ReconcilePlan.results`.
+        """
+        collection = self.collection
+        url = "https://api.knackhq.com/v1/objects/%s/records/%s"
+        self.results = dict()
+        self.results["delete"] = run_bulk(
+            lambda id_: collection.request("DELETE", url % (collection.key, id_)),
+            self.deletes, workers=workers,
+            errors=KnackhqError)
+        self.results["update"] = run_bulk(
+            lambda job: collection.request(
+                "PUT", url % (collection.key, job[0]), data=job[1]),
+            self.updates, workers=workers,
+            errors=KnackhqError)
+        self.results["insert"] = run_bulk(
+            lambda data: collection.request(
+                "POST", collection.post_url, data=data),
+            self.inserts, workers=workers,
+            errors=KnackhqError)
+        return self.results
+
+def plan_reconcile(collection, source, key_field, using_name=True,
+                   delete=True):
+    """Compare ``source`` with the collection, returns a
+    :class:`ReconcilePlan`.
+
+    :param source: iterable of dict, one row per record
+    :param key_field: field identifying a record, values have to be unique
+      in the source.
+    :param using_name: True if source rows and key_field use field name
+    :param delete: if False, records not in the source are kept
+    """
+    key = collection.get_field_key(key_field, using_name=using_name)
+    numeric_keys = set([field.key for field in collection
+                        if field.type in NUMERIC_FIELD_TYPE])
+    numeric = key in numeric_keys
+    encode = collection.encoder.encode
+
+    def spool():
+        keys = set()
+        for row in source:
+            data = encode(row, using_name)
+            data.pop("id", None)
+            try:
+                k = key_of(data[key], numeric)
+            except KeyError:
+                raise ValueError(
+                    "source row without '%s': %r" % (key_field, row))
+            if k in keys:
+                raise ValueError(
+                    "duplicate '%s' in source: %r" % (key_field, k))
+            keys.add(k)
+            yield {"key": k, "data": data}
+
+    dirpath = tempfile.mkdtemp(prefix="pyknackhq-reconcile-")
+    abspath = os.path.join(dirpath, "source.jsonl")
+    try:
+        dump_indexed_jsonl(spool(), abspath, key="key")
+        with IndexedJsonl(abspath) as rows: # {key: encoded row} on disk
+            plan = ReconcilePlan(collection)
+            seen = set()
+            rows_per_page = 1000
+            n_scanned = 0
+            for record in collection.iter_find(
+                    rows_per_page=rows_per_page,
+                    using_name=False, recovery_name=False):
+                n_scanned += 1
+                k = key_of(record.get(key), numeric)
+                # not in source, or duplicate remote
+                if (k not in rows) or (k in seen):
+                    if delete:
+                        plan.deletes.append(record["id"])
+                    continue
+                seen.add(k)
+                changed = dict([
+                    (field_key, value)
+                    for field_key, value in rows.get(k)["data"].items()
+                    if not same_value(value, record.get(field_key),
+                                      field_key in numeric_keys)])
+                if changed:
+                    plan.updates.append((record["id"], changed))
+                else:
+                    plan.unchanged += 1
+            plan.scan_requests = max(1, -(-n_scanned // rows_per_page))
+            plan.inserts = [rows.get(k)["data"] for k in rows
+                            if k not in seen]
+    finally:
+        shutil.rmtree(dirpath, ignore_errors=True)
+    return plan
+
+if __name__ == "__main__":
+    import unittest
+
+    class SameValueUnittest(unittest.TestCase):
+        def test_same_value(self):
+            self.assertTrue(same_value({"date": "11/01/2015"},
+                {"date": "11/01/2015", "timestamp": "11/01/2015 12:00 am"}))
+            self.assertTrue(same_value("3.50", 3.5, numeric=True))
+            self.assertFalse(same_value("3.50", 3.5))
+            self.assertFalse(same_value("02134", "2134"))
+            self.assertFalse(same_value("1e2", "100"))
+            self.assertFalse(same_value({"zip": "02134"}, {"zip": "2134"}))
+            self.assertTrue(same_value(["564d0bacde3971932db54093"],
+                [{"id": "564d0bacde3971932db54093", "identifier": "Bob"}]))
+            self.assertTrue(same_value(None, ""))
+            self.assertFalse(same_value("a", "b"))
+            self.assertFalse(same_value(["a"], ["a", "b"]))
+            self.assertFalse(same_value(True, 1))
+
+        def test_key_of(self):
+            self.assertEqual(key_of(5, True), key_of("5.0", True))
+            self.assertNotEqual(key_of("007"), key_of("7"))
+            self.assertEqual(key_of({"email": "a@b.com"}),
+                key_of({"email": "a@b.com", "label": "A"}))
+            self.assertNotEqual(key_of({"zip": "02134"}), key_of("02134"))
+
+    unittest.main()
@@ -4,6 +4,12 @@
 from __future__ import print_function
 from pyknackhq.js import load_js, safe_dump_js, js2str, prt_js
 from collections import OrderedDict
+
+def normalize_name(name):
+    """Normalize a field or column name for lookup, case and whitespace 
+    insensitive: ``"  Short  Text field"`` -> ``"short text field"``.
+    """
+    return " ".join(name.lower().split())
         
 class Field(object):
     """Field of object class.
@@ -43,10 +49,12 @@ class Object(object):
             
         self.f = OrderedDict() # {field_key: Field instance}
         self.f_name = OrderedDict() # {field_name: Field instance}
+        self.f_norm = dict() # {normalized field_name: Field instance}
         for d in self.fields:
             field = Field.from_dict(d)
             self.f.setdefault(d["key"], field)
             self.f_name.setdefault(d["name"], field)
+            self.f_norm.setdefault(normalize_name(d["name"]), field)
             
     def __str__(self):
         return "Object('%s')" % self.name
@@ -80,24 +88,93 @@ class Object(object):
     def get_field_key(self, key, using_name=True):
         """Given a field key or name, return it's field key.
         """
-        try:
-            if using_name:
-                return self.f_name[key].key
-            else:
-                return self.f[key].key
-        except KeyError:
-            raise ValueError("'%s' are not found!" % key)
+        return self.get_field(key, using_name=using_name).key
 
     def get_field(self, key, using_name=True):
-        """Given a field key or name, return the Field instance.
+        """Given a field key or name, return the Field instance. A name
+        without exact match is looked up case and whitespace insensitive.
         """
         try:
             if using_name:
-                return self.f_name[key]
+                try:
+                    return self.f_name[key]
+                except KeyError:
+                    return self.f_norm[normalize_name(key)]
             else:
                 return self.f[key]
-        except KeyError:
+        except (KeyError, AttributeError):
             raise ValueError("'%s' are not found!" % key)
+    
+    @property
+    def connection_fields(self):
+        """Return list of (connection field, connected object_key).
+        """
+        connections = list()
+        for field in self.f.values():
+            if field.type == "connection":
+                relationship = getattr(field, "relationship", None) or dict()
+                if relationship.get("object"):
+                    connections.append((field, relationship["object"]))
+        return connections
+
+class FieldIndex(object):
+    """Application wide index of fields, by field key and by normalized 
+    field name, see :func:`normalize_name`. Built once by 
+    :attr:`Application.field_index`.
+    
+    :attr keys: ``{field_key: object_key}``
+    :attr names: ``{normalized field_name: [(object_key, field_key)]}``, a
+      name can be used by many objects.
+    
+    **中文文档**
+    
+    整个App的字段索引, 可以用字段key或者不区分大小写和空格的字段名查找字段。
+    """
+    def __init__(self, keys, names):
+        self.keys = keys
+        self.names = names
+    
+    @staticmethod
+    def from_application(application):
+        keys = dict()
+        names = dict()
+        for object_ in application:
+            for field in object_:
+                keys[field.key] = object_.key
+                names.setdefault(normalize_name(field.name), list()).append(
+                    (object_.key, field.key))
+        return FieldIndex(keys, names)
+    
+    def lookup(self, name, object_key=None):
+        """Find fields by field key or field name (case and whitespace 
+        insensitive). Returns list of (object_key, field_key), empty if not
+        found.
+        
+        :param object_key: only search in this object.
+        """
+        if name in self.keys:
+            pairs = [(self.keys[name], name)]
+        else:
+            pairs = self.names.get(normalize_name(name), [])
+        if object_key is not None:
+            pairs = [pair for pair in pairs if pair[0] == object_key]
+        return pairs
+    
+    def match(self, names, object_key=None):
+        """Map many column headers to field key at once. Returns an 
+        OrderedDict ``{name: field_key}``, None for a header without match or
+        matching fields of many objects.
+        
+        :param names: list of field key or field name
+        :param object_key: only match fields of this object.
+        """
+        result = OrderedDict()
+        for name in names:
+            if name in result:
+                continue
+            pairs = self.lookup(name, object_key)
+            result[name] = pairs[0][1] if len(pairs) == 1 else None
+        return result
 
 class Application(object):
     """Application class that holding object and its fields information.
@@ -122,6 +199,8 @@ class Application(object):
 
     @staticmethod
     def from_dict(d):
+        # a "field_index" entry saved by older versions is ignored, the 
+        # index is always built from the objects, so it can't be stale
         return Application(**d["application"])
     
     @staticmethod
@@ -146,6 +225,81 @@ class Application(object):
         """
         return [o.name for o in self.o.values()]
     
+    @property
+    def field_index(self):
+        """The :class:`FieldIndex` of all objects, built on first access.
+        """
+        try:
+            return self._field_index
+        except AttributeError:
+            self._field_index = FieldIndex.from_application(self)
+            return self._field_index
+    
+    def find_field(self, name, object_key=None):
+        """Given a field key or name (case and whitespace insensitive), 
+        return (Object, Field). Raise ValueError if not found or if fields of
+        many objects match, use ``object_key`` to choose.
+        """
+        pairs = self.field_index.lookup(name, object_key)
+        if not pairs:
+            raise ValueError("'%s' are not found!" % name)
+        if len(pairs) > 1:
+            raise ValueError("'%s' is ambiguous, found in %s!" % (
+                name, ", ".join([object_key for object_key, _ in pairs])))
+        object_ = self.o[pairs[0][0]]
+        return object_, object_.f[pairs[0][1]]
+    
+    def diff(self, other):
+        """Compare with a newer version ``other``, returns a 
+        :class:`SchemaDiff`. Record ``counts`` are ignored.
+        """
+        diff = SchemaDiff()
+        old = _by_key(self.data["application"]["objects"])
+        new = _by_key(other.data["application"]["objects"])
+        diff.added = [key for key in new if key not in old]
+        diff.removed = [key for key in old if key not in new]
+        for key, d in new.items():
+            if key not in old:
+                continue
+            old_fields = _by_key(old[key].get("fields", []))
+            new_fields = _by_key(d.get("fields", []))
+            fields = {
+                "added": [k for k in new_fields if k not in old_fields],
+                "removed": [k for k in old_fields if k not in new_fields],
+                "changed": [k for k, v in new_fields.items() 
+                            if k in old_fields and old_fields[k] != v],
+            }
+            same_object = dict([(k, v) for k, v in old[key].items() 
+                                if k != "fields"]) == \
+                dict([(k, v) for k, v in d.items() if k != "fields"])
+            if fields["added"] or fields["removed"] or fields["changed"] \
+                    or (not same_object):
+                diff.changed[key] = fields
+        return diff
+    
+    def dependency_order(self):
+        """Return all object_key, every object comes after the objects its 
+        connection fields point to. Objects in a connection cycle are kept in
+        schema order.
+        """
+        depends = OrderedDict()
+        for object_ in self.o.values():
+            depends[object_.key] = set([
+                key for _, key in object_.connection_fields 
+                if key != object_.key and key in self.o])
+        
+        order = list()
+        while depends:
+            ready = [key for key, keys in depends.items() if not keys]
+            if not ready: # cycle, break it with the first remaining object
+                ready = [next(iter(depends))]
+            for key in ready:
+                order.append(key)
+                del depends[key]
+            for keys in depends.values():
+                keys.difference_update(ready)
+        return order
+    
     def get_object_key(self, key, using_name=True):
         """Given a object key or name, return it's object key.
         """
@@ -168,10 +322,48 @@ class Application(object):
         except KeyError:
             raise ValueError("'%s' are not found!" % key)
     
+class SchemaDiff(object):
+    """Difference between two versions of an application schema, by object
+    key and field key. See :meth:`Application.diff`.
+    
+    :attr added: list of new object_key
+    :attr removed: list of deleted object_key
+    :attr changed: ``{object_key: {"added": [field_key], "removed": 
+      [field_key], "changed": [field_key]}}``, the three lists can be empty
+      if only the object itself changed (name, identifier, ...).
+    
+    **中文文档**
+    
+    两个版本的Schema之间的差异。
+    """
+    def __init__(self):
+        self.added = list()
+        self.removed = list()
+        self.changed = OrderedDict()
+    
+    def __bool__(self):
+        return bool(self.added or self.removed or self.changed)
+    
+    __nonzero__ = __bool__
+    
+    def __repr__(self):
+        return "SchemaDiff(added=%r, removed=%r, changed=%r)" % (
+            self.added, self.removed, list(self.changed))
+    
+    def summary(self):
+        return {"added": self.added, "removed": self.removed, 
+                "changed": dict(self.changed)}
+
+def _by_key(dicts):
+    return OrderedDict([(d["key"], d) for d in dicts])
+
 if __name__ == "__main__":
     from pyknackhq.tests import AUTH_JSON_PATH, SCHEMA_JSON_PATH
     from pprint import pprint as ppt
     import unittest
+    import tempfile
+    import shutil
+    import os
     
     class FieldUnittest(unittest.TestCase):
         def test_from_dict(self):
@@ -210,4 +402,64 @@ if __name__ == "__main__":
             
             short_text_field = test_object.get_field("short text field")
 
+        def test_dependency_order(self):
+            def connection(key, target):
+                return {"key": key, "name": key, "type": "connection",
+                        "relationship": {"object": target, "has": "one"}}
+            application = Application(name="app", objects=[
+                {"key": "object_1", "name": "order", "fields": [
+                    connection("field_1", "object_2"),
+                    connection("field_2", "object_3")]},
+                {"key": "object_2", "name": "customer", "fields": [
+                    connection("field_3", "object_3"),
+                    connection("field_4", "object_2")]},
+                {"key": "object_3", "name": "company", "fields": []},
+            ])
+            self.assertEqual(application.dependency_order(),
+                             ["object_3", "object_2", "object_1"])
+            order = application.get_object("order")
+            self.assertEqual([key for _, key in order.connection_fields],
+                             ["object_2", "object_3"])
+
+        def test_field_index(self):
+            application = Application.from_json(SCHEMA_JSON_PATH)
+            test_object = application.get_object("test_object")
+            key = test_object.get_field_key("short text field")
+            self.assertEqual(test_object.get_field_key(" Short  TEXT field"),
+                             key)
+            object_, field = application.find_field(
+                "SHORT TEXT FIELD", object_key=test_object.key)
+            self.assertEqual((object_.key, field.key), (test_object.key, key))
+            self.assertEqual(application.find_field(key)[1].key, key)
+            self.assertRaises(ValueError, application.find_field, "nothing")
+            match = application.field_index.match(
+                ["short text  field", "nothing"], object_key=test_object.key)
+            self.assertEqual(list(match.values()), [key, None])
+            
+            
+            # the schema file keeps its format, the index is rebuilt
+            dirpath = tempfile.mkdtemp()
+            try:
+                abspath = os.path.join(dirpath, "schema.json")
+                application.to_json(abspath)
+                self.assertEqual(load_js(abspath, enable_verbose=False), 
+                                 application.data)
+                index = Application.from_json(abspath).field_index
+                self.assertEqual(index.names, application.field_index.names)
+            finally:
+                shutil.rmtree(dirpath)
+        
+        def test_diff(self):
+            old = Application.from_json(SCHEMA_JSON_PATH)
+            d = load_js(SCHEMA_JSON_PATH, enable_verbose=False)
+            self.assertFalse(old.diff(Application.from_dict(d)))
+            objects = d["application"]["objects"]
+            removed = objects.pop()
+            objects[0]["fields"][0] = dict(objects[0]["fields"][0], 
+                                           name="renamed field")
+            diff = old.diff(Application.from_dict(d))
+            self.assertEqual(diff.removed, [removed["key"]])
+            self.assertEqual(diff.changed[objects[0]["key"]]["changed"],
+                             [objects[0]["fields"][0]["key"]])
+
     unittest.main()
\ No newline at end of file
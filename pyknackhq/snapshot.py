@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Module description
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Last-known version of records, for change-aware update. A :class:`Snapshot`
+keeps a short hash of each field value of each record, ``{id: {field_key:
+hash}}``, instead of the value itself, so millions of records fit in memory
+and in a small file.
+
+:meth:`~pyknackhq.client.Collection.update_one` and
+:meth:`~pyknackhq.client.Collection.update` with ``snapshot=`` only send the
+fields whose hash changed, and skip the request if nothing changed. The
+snapshot is updated after every successful request.
+
+Hashes are computed from the encoded payload, the one sent to knackhq. Raw
+values returned by the api may contain extra keys (for example date time
+``timestamp``), so a snapshot seeded by :meth:`Snapshot.add_records` from
+exported records can report those fields as changed once.
+
+
+Import Command
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+from pyknackhq.snapshot import Snapshot
+"""
+
+from pyknackhq.js import load_js, safe_dump_js
+from pyknackhq.datatype import json_default
+import hashlib
+import json
+
+def value_hash(value):
+    """Stable short hash of a json serializable value, dict key order
+    doesn't matter.
+    """
+    text = json.dumps(value, sort_keys=True, separators=(",", ":"),
+                      default=json_default)
+    return hashlib.md5(text.encode("utf-8")).hexdigest()[:16]
+
+class Snapshot(object):
+    """Per field hash of the last-known version of records.
+
+    Usage::
+
+        >>> snapshot = Snapshot.load("snapshot.json") # or Snapshot()
+        >>> collection.update(records, snapshot=snapshot)
+        BulkResult(total=12, succeeded=12, failed=0, skipped=9988)
+        >>> snapshot.save("snapshot.json")
+
+    **中文文档**
+
+    记录每条记录每个字段上一次的值的哈希。更新时只发送发生变化的字段, 没有变化
+    则不发送请求。
+    """
+    def __init__(self, data=None):
+        self.data = data or dict() # {record id: {field_key: hash}}
+
+    def __len__(self):
+        return len(self.data)
+
+    def __contains__(self, id_):
+        return id_ in self.data
+
+    def diff(self, id_, payload):
+        """Return the part of ``payload`` (field key based) that differs
+        from the last-known version of record ``id_``.
+        """
+        known = self.data.get(id_, dict())
+        changed = dict()
+        for key, value in payload.items():
+            if known.get(key) != value_hash(value):
+                changed[key] = value
+        return changed
+
+    def update(self, id_, payload):
+        """Remember ``payload`` as the last-known value of record ``id_``.
+        """
+        hashes = dict([(key, value_hash(value))
+                       for key, value in payload.items() if key != "id"])
+        known = self.data.get(id_)
+        if known is None:
+            self.data[id_] = hashes
+        else:
+            known.update(hashes)
+
+    def add_records(self, records):
+        """Seed from records keyed by field key, each having an ``id``, for
+        example the output of ``collection.iter_find(recovery_name=False)``.
+        """
+        for record in records:
+            self.update(record["id"], record)
+
+    def discard(self, id_):
+        self.data.pop(id_, None)
+
+    @staticmethod
+    def load(abspath):
+        return Snapshot(load_js(abspath, enable_verbose=False))
+
+    def save(self, abspath):
+        safe_dump_js(self.data, abspath, fastmode=True, enable_verbose=False)
+
+if __name__ == "__main__":
+    import unittest
+    import os
+
+    class SnapshotUnittest(unittest.TestCase):
+        def test_diff(self):
+            snapshot = Snapshot()
+            self.assertEqual(snapshot.diff("a", {"field_1": 1}),
+                             {"field_1": 1})
+            snapshot.update("a", {"field_1": 1, "field_2": {"x": 1, "y": 2}})
+            self.assertEqual(
+                snapshot.diff("a", {"field_1": 1, "field_2": {"y": 2, "x": 1}}),
+                {})
+            self.assertEqual(snapshot.diff("a", {"field_1": 2, "field_3": 3}),
+                             {"field_1": 2, "field_3": 3})
+
+        def test_save_load(self):
+            snapshot = Snapshot()
+            snapshot.add_records([{"id": "a", "field_1": "hello"}])
+            snapshot.save("snapshot.json")
+            try:
+                snapshot = Snapshot.load("snapshot.json")
+                self.assertEqual(snapshot.diff("a", {"field_1": "hello"}), {})
+                self.assertTrue("a" in snapshot)
+            finally:
+                os.remove("snapshot.json")
+
+    unittest.main()
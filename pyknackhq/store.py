@@ -0,0 +1,288 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Module description
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Compact in-memory store of many records of one object. See
+:meth:`~pyknackhq.client.Collection.to_store`.
+
+A record dict carries a hash table and a pointer to each of its key
+strings. :func:`make_record_class` generates, from the fields of an
+:class:`~pyknackhq.schema.Object`, a ``namedtuple`` subclass with
+``__slots__ = ()``: a record is a fixed size tuple of values, the field
+names are stored once in the class. Values are read by attribute, field
+names are turned into python identifiers (``"short text field"`` ->
+``short_text_field``).
+
+Values repeated in many records (choice fields, and any field given in
+``intern_fields``) are deduplicated by :class:`RecordStore`, all records
+share one string object per distinct value.
+
+Records and stores can be pickled, for example to be sent to a
+``multiprocessing`` worker. A record is pickled as its object key, field
+layout and values, the record class is generated again on unpickling.
+
+
+Import Command
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+from pyknackhq.store import RecordStore, make_record_class
+"""
+
+from pyknackhq.py23compatible import _str_type
+from collections import namedtuple
+import keyword
+import re
+
+INTERN_FIELD_TYPE = frozenset(["multiple_choice", "boolean"])
+
+_reserved = frozenset(["from_dict", "to_dict", "get", "count", "index"])
+
+def attr_name(name, used=()):
+    """Python identifier of a field name, not in ``used``.
+    """
+    attr = re.sub(r"\W+", "_", name.strip().lower()).strip("_")
+    if (not attr) or attr[0].isdigit() or keyword.iskeyword(attr) \
+            or attr in _reserved:
+        attr = "f_" + attr
+    candidate, i = attr, 1
+    while candidate in used:
+        i += 1
+        candidate = "%s_%s" % (attr, i)
+    return candidate
+
+_record_classes = dict() # {(object key, name, attrs, keys): record class}
+
+def _record_class(object_key, name, attrs, keys):
+    """The record class of a field layout, generated once per process.
+    """
+    spec = (object_key, name, tuple(attrs), tuple(keys))
+    try:
+        return _record_classes[spec]
+    except KeyError:
+        pass
+
+    base = namedtuple(name, attrs)
+    positions = dict([(key, i) for i, key in enumerate(keys)])
+
+    def from_dict(cls, data):
+        get = data.get
+        return tuple.__new__(cls, [get(key) for key in keys])
+
+    def to_dict(self):
+        """Record dict, None values are left out.
+        """
+        return dict([(key, value) for key, value in zip(keys, self)
+                     if value is not None])
+
+    def get(self, key, default=None):
+        """Value by record dict key.
+        """
+        try:
+            value = self[positions[key]]
+        except KeyError:
+            return default
+        return default if value is None else value
+
+    def __reduce__(self):
+        return _rebuild_record, spec + (tuple(self),)
+
+    klass = type(name, (base,), {
+        "__slots__": (),
+        "_spec": spec,
+        "_keys": spec[3],
+        "from_dict": classmethod(from_dict),
+        "to_dict": to_dict,
+        "get": get,
+        "__reduce__": __reduce__,
+    })
+    return _record_classes.setdefault(spec, klass)
+
+def _rebuild_record(object_key, name, attrs, keys, values):
+    """Unpickle a record.
+    """
+    return tuple.__new__(_record_class(object_key, name, attrs, keys), values)
+
+def make_record_class(object_, fields=None, recovery_name=True,
+                      using_name=True):
+    """Generate a slotted tuple record class for an object.
+
+    :param fields: fields to keep, all if None, field name if using_name
+      is True, otherwise field key.
+    :param recovery_name: True if records use field name, otherwise key.
+
+    The class has ``_keys``, the record dict keys of each position, and
+    ``from_dict``, ``to_dict``, ``get`` to convert from and to a dict. The
+    same object and fields give the same class.
+    """
+    if fields is None:
+        selected = list(object_)
+    else:
+        selected = [object_.get_field(name, using_name=using_name)
+                    for name in fields]
+    keys = ["id"] + [field.name if recovery_name else field.key
+                     for field in selected]
+    attrs = ["id"]
+    for field in selected:
+        attrs.append(attr_name(field.name, attrs))
+
+    name = "%sRecord" % attr_name(object_.name).title().replace("_", "")
+    return _record_class(object_.key, name, attrs, keys)
+
+class RecordStore(object):
+    """List like store of records of one object, kept as instances of a
+    record class made by :func:`make_record_class`.
+
+    :param object_: :class:`~pyknackhq.schema.Object` the records come from
+    :param fields: fields to keep, see :func:`make_record_class`.
+    :param recovery_name: True if records use field name, otherwise key.
+    :param intern_fields: extra fields whose values are deduplicated, choice
+      fields always are. True for all fields, worth it when most values are
+      repeated.
+
+    Usage::
+
+        >>> store = collection.to_store(intern_fields=["department"])
+        >>> store[0].short_text_field
+        'Hello World'
+        >>> store[0].to_dict()
+        {"id": "...", "short text field": "Hello World", ...}
+
+    **中文文档**
+
+    紧凑的内存记录存储。每条记录是根据字段生成的 ``__slots__`` 元组类的实例,
+    重复的选项字符串只保存一份, 内存占用远小于字典列表。
+    """
+    def __init__(self, object_, fields=None, recovery_name=True,
+                 using_name=True, intern_fields=None):
+        self.record_class = make_record_class(
+            object_, fields, recovery_name, using_name)
+        if intern_fields is True:
+            interned = set(object_.f)
+        else:
+            interned = set([
+                object_.get_field(name, using_name=using_name).key
+                for name in (intern_fields or [])])
+        by_record_key = dict([
+            (field.name if recovery_name else field.key, field)
+            for field in object_])
+        self._intern_positions = [
+            i for i, key in enumerate(self.record_class._keys)
+            if i and ((by_record_key[key].type in INTERN_FIELD_TYPE)
+                      or (by_record_key[key].key in interned))]
+        self._pool = dict() # {value: the shared value}
+        self.records = list()
+
+    def _intern(self, value):
+        if isinstance(value, _str_type):
+            return self._pool.setdefault(value, value)
+        if isinstance(value, list):
+            setdefault = self._pool.setdefault
+            return [setdefault(v, v) if isinstance(v, _str_type) else v
+                    for v in value]
+        return value
+
+    def _make(self, data):
+        record = self.record_class.from_dict(data)
+        if self._intern_positions:
+            values = list(record)
+            for i in self._intern_positions:
+                values[i] = self._intern(values[i])
+            record = tuple.__new__(self.record_class, values)
+        return record
+
+    def append(self, data):
+        """Add one record dict.
+        """
+        self.records.append(self._make(data))
+
+    def extend(self, records):
+        """Add many record dicts, for example from
+        :meth:`~pyknackhq.client.Collection.iter_find`, they are converted
+        one by one.
+        """
+        make = self._make
+        self.records.extend(make(data) for data in records)
+        return self
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __getitem__(self, index):
+        return self.records[index]
+
+    def to_dicts(self):
+        """Iterate records as dict.
+        """
+        for record in self.records:
+            yield record.to_dict()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["record_class"] = self.record_class._spec
+        return state
+
+    def __setstate__(self, state):
+        state["record_class"] = _record_class(*state["record_class"])
+        self.__dict__.update(state)
+
+if __name__ == "__main__":
+    from pyknackhq.schema import Application
+    import unittest
+    import pickle
+    import os
+
+    SCHEMA_JSON_PATH = os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "tests", "schema.json")
+
+    class RecordStoreUnittest(unittest.TestCase):
+        def setUp(self):
+            application = Application.from_json(SCHEMA_JSON_PATH)
+            self.object_ = application.get_object("test_object")
+
+        def test_attr_name(self):
+            self.assertEqual(attr_name("Short Text field"), "short_text_field")
+            self.assertEqual(attr_name("2nd name"), "f_2nd_name")
+            self.assertEqual(attr_name("class"), "f_class")
+            self.assertEqual(attr_name("a-b", ["a_b"]), "a_b_2")
+            self.assertEqual(attr_name("From Dict"), "f_from_dict")
+
+        def test_store(self):
+            store = RecordStore(self.object_,
+                                intern_fields=["short text field"])
+            records = [{"id": str(i), "short text field": "x" * 20 + "a",
+                        "number field": i} for i in range(3)]
+            store.extend(records)
+            self.assertEqual(len(store), 3)
+            self.assertEqual(store[1].number_field, 1)
+            self.assertEqual(store[1].get("number field"), 1)
+            self.assertEqual(list(store.to_dicts()), records)
+            self.assertTrue(store[0].short_text_field is
+                            store[2].short_text_field)
+
+        def test_pickle(self):
+            store = RecordStore(self.object_)
+            store.extend([{"id": str(i), "number field": i,
+                           "multiple choice field": "First Choice"}
+                          for i in range(3)])
+            record = pickle.loads(pickle.dumps(store[1]))
+            self.assertEqual(record, store[1])
+            self.assertTrue(type(record) is store.record_class)
+
+            # a new process generates the class again
+            store_class = _record_classes.pop(store.record_class._spec)
+            copied = pickle.loads(pickle.dumps(store))
+            self.assertFalse(copied.record_class is store_class)
+            self.assertEqual(copied[1].number_field, 1)
+            self.assertEqual(list(copied.to_dicts()), list(store.to_dicts()))
+            self.assertTrue(copied[0].multiple_choice_field is
+                            copied[2].multiple_choice_field)
+            copied.append({"id": "3"})
+            self.assertEqual(len(copied), 4)
+
+    unittest.main()
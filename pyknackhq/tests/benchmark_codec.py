@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Compare all installed json backends of :mod:`pyknackhq.codec` on a realistic
+1000 records page, built from the example get responses.
+
+Usage::
+
+    $ python benchmark_codec.py
+"""
+
+from __future__ import print_function
+from pyknackhq import codec
+import timeit
+import json
+import os
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def make_page(n_records=1000):
+    dirname = os.path.join(HERE, "example_get_response", "00 test")
+    with open(os.path.join(dirname, "html.json"), "rb") as f:
+        html = json.loads(f.read().decode("utf-8"))
+    with open(os.path.join(dirname, "raw.json"), "rb") as f:
+        raw = json.loads(f.read().decode("utf-8"))
+    record = dict()
+    for i, (key, value) in enumerate(sorted(html.items())):
+        record["field_%s" % i] = value
+        record["field_%s_raw" % i] = raw.get(key, value)
+    records = list()
+    for i in range(n_records):
+        record = dict(record)
+        record["id"] = "%024x" % i
+        records.append(record)
+    return {"total_pages": 1, "current_page": 1,
+            "total_records": n_records, "records": records}
+
+def benchmark(number=20):
+    page = make_page()
+    binary = json.dumps(page).encode("utf-8")
+    print("payload: %s records, %.1f KB" % (
+        len(page["records"]), len(binary) / 1024.0))
+    print("%-12s %12s %12s" % ("backend", "loads (ms)", "dumpb (ms)"))
+    for name in codec.available_backends():
+        codec.set_backend(name)
+        t_loads = timeit.timeit(lambda: codec.loads(binary), number=number)
+        t_dumps = timeit.timeit(lambda: codec.dumpb(page), number=number)
+        print("%-12s %12.2f %12.2f" % (
+            name, t_loads / number * 1000, t_dumps / number * 1000))
+    codec.set_backend()
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Overhead of :meth:`pyknackhq.client.KnackhqClient.get_collection` in a
+request handler, which gets the collection and encodes one record. The
+uncached case builds a new :class:`~pyknackhq.client.Collection` (and its
+encoder) on every call, like before the client cached them.
+
+Usage::
+
+    $ python benchmark_collection.py
+"""
+
+from __future__ import print_function
+from pyknackhq.client import KnackhqAuth, KnackhqClient
+from pyknackhq.schema import Application
+import timeit
+import os
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def benchmark(number=2000):
+    application = Application.from_json(os.path.join(HERE, "schema.json"))
+    client = KnackhqClient(KnackhqAuth("app id", "api key"), application)
+    record = {"short text field": "Hello World", "number field": 3.14}
+
+    def cached():
+        collection = client.get_collection("test_object")
+        collection.encoder.encode(record)
+
+    def uncached():
+        client.clear_collections()
+        collection = client.get_collection("test_object")
+        collection.encoder.encode(record)
+
+    for name, func in [("uncached", uncached), ("cached", cached)]:
+        t = timeit.timeit(func, number=number)
+        print("%-10s %8.1f us per handler" % (name, t / number * 1000000))
+
+if __name__ == "__main__":
+    benchmark()
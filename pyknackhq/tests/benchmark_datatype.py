@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Memory and throughput of :mod:`pyknackhq.datatype` over 1M instances,
+compared with the previous ``__dict__`` based implementation, which rebuilds
+the payload on every ``._data`` access.
+
+Usage::
+
+    $ python benchmark_datatype.py [n_instances]
+"""
+
+from __future__ import print_function
+from pyknackhq.datatype import AddressType, ShortTextType
+from pyknackhq import codec
+import tracemalloc
+import time
+import json
+import sys
+
+class LegacyAddressType(object):
+    """The previous implementation of AddressType.
+    """
+    def __init__(self, street=None, street2=None, 
+                 city=None, state=None, zipcode=None, country=None):
+        self.street = street
+        self.street2 = street2
+        self.city = city
+        self.state = state
+        self.zipcode = zipcode
+        self.country = country
+        
+    @property
+    def _data(self):
+        attrs = ["street", "street2", 
+                 "city", "state", "zipcode", "country"]
+        d = dict()
+        for attr in attrs:
+            value = self.__getattribute__(attr)
+            if value:
+                d[attr] = value
+        return d
+
+class LegacyShortTextType(object):
+    """The previous implementation of ShortTextType.
+    """
+    def __init__(self, value):
+        self.value = value
+        self._data = self.value
+
+def convert_values(pydict):
+    """The previous Collection.convert_values.
+    """
+    new_dict = dict()
+    for key, value in pydict.items():
+        try:
+            new_dict[key] = value._data
+        except AttributeError:
+            new_dict[key] = value
+    return new_dict
+
+def build(klass, n):
+    tracemalloc.start()
+    st = time.time()
+    records = [
+        {"field_1": klass(street="%s St" % i, city="My City", zipcode="20500"),
+         "field_2": i}
+        for i in range(n)
+    ]
+    elapsed = time.time() - st
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return records, elapsed, size
+
+def benchmark(n=1000000):
+    print("%s instances" % n)
+    
+    records, elapsed, size = build(LegacyAddressType, n)
+    print("legacy:  build %.3f sec, %.1f MB" % (elapsed, size / 1048576.0))
+    st = time.time()
+    json.dumps([convert_values(record) for record in records])
+    print("legacy:  convert_values + json.dumps %.3f sec" % (time.time() - st))
+    del records
+    
+    records, elapsed, size = build(AddressType, n)
+    print("slotted: build %.3f sec, %.1f MB" % (elapsed, size / 1048576.0))
+    st = time.time()
+    codec.dumpb(records)
+    print("slotted: codec.dumpb (%s) %.3f sec" % (
+        codec.backend, time.time() - st))
+    del records
+    
+    text = "short text"
+    for klass in [LegacyShortTextType, ShortTextType]:
+        tracemalloc.start()
+        instances = [klass(text) for i in range(n)]
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del instances
+        print("%s: %.1f MB" % (klass.__name__, size / 1048576.0))
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2:
+        benchmark(int(sys.argv[1]))
+    else:
+        benchmark()
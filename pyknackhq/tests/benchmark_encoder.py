@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Compare encoding a 100k records batch with datatype wrapper objects plus
+``convert_values`` / ``convert_keys``, against :class:`pyknackhq.encoder.Encoder`
+on plain python values.
+
+Usage::
+
+    $ python benchmark_encoder.py
+"""
+
+from __future__ import print_function
+from pyknackhq.client import Collection
+from pyknackhq.schema import Application
+from pyknackhq.datatype import (ShortTextType, DateTimeType, AddressType, 
+    EmailType, NumberType)
+from datetime import datetime, timedelta
+import time
+import os
+
+SCHEMA_JSON_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "schema.json")
+
+def benchmark(n_records=100000):
+    application = Application.from_json(SCHEMA_JSON_PATH)
+    collection = Collection.from_dict(
+        application.get_object("test_object").__dict__)
+    start = datetime(2015, 1, 1)
+    records = [
+        {
+            "short text field": "record %s" % i,
+            "date time field": start + timedelta(hours=i % 5000),
+            "address field": {"street": "123 St", "city": "My City"},
+            "email field": "%s@example.com" % i,
+            "number field": i,
+        } for i in range(n_records)
+    ]
+    
+    st = time.time()
+    for record in records:
+        data = {
+            "short text field": ShortTextType(record["short text field"]),
+            "date time field": DateTimeType(record["date time field"]),
+            "address field": AddressType(**record["address field"]),
+            "email field": EmailType(email=record["email field"]),
+            "number field": NumberType(record["number field"]),
+        }
+        collection.convert_keys(collection.convert_values(data))
+    elapsed_wrapper = time.time() - st
+    
+    st = time.time()
+    collection.encoder.encode_many(records)
+    elapsed_encoder = time.time() - st
+    
+    print("%s records" % n_records)
+    print("datatype wrapper + convert_values: %.3f sec" % elapsed_wrapper)
+    print("Encoder.encode_many:               %.3f sec (%.1fx)" % (
+        elapsed_encoder, elapsed_wrapper / elapsed_encoder))
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Compare record translation of :meth:`pyknackhq.client.Collection.find`
+with and without ``fields=`` projection, on a page of 1000 records of
+``test_object``.
+
+Usage::
+
+    $ python benchmark_projection.py
+"""
+
+from __future__ import print_function
+from pyknackhq.client import Collection
+from pyknackhq.schema import Application
+import timeit
+import os
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def make_page(collection, n_records=1000):
+    record = {"id": "564d0bacde3971932db54093"}
+    for field in collection:
+        record[field.key] = "<span>%s</span>" % field.name
+        record["%s_raw" % field.key] = field.name
+    return [dict(record) for _ in range(n_records)]
+
+def benchmark(number=20):
+    application = Application.from_json(os.path.join(HERE, "schema.json"))
+    collection = Collection.from_dict(
+        application.get_object("test_object").__dict__)
+    page = make_page(collection)
+    fields = ["short text field", "number field", "email field"]
+
+    full = collection._make_translator()
+    projected = collection._make_translator(fields=fields)
+    cases = [
+        ("get_raw_values",
+         lambda: [collection.get_raw_values(d) for d in page]),
+        ("all fields", lambda: [full(d) for d in page]),
+        ("%s fields" % len(fields), lambda: [projected(d) for d in page]),
+    ]
+    print("%s records, %s fields" % (len(page), len(collection.f)))
+    for name, func in cases:
+        t = timeit.timeit(func, number=number)
+        print("%-16s %8.2f ms" % (name, t / number * 1000))
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Memory used by records of ``test_object`` held as a list of dict, as
+returned by :meth:`pyknackhq.client.Collection.find`, and in a
+:class:`pyknackhq.store.RecordStore`.
+
+Usage::
+
+    $ python benchmark_store.py
+"""
+
+from __future__ import print_function
+from pyknackhq.schema import Application
+from pyknackhq.store import RecordStore
+import tracemalloc
+import json
+import os
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def make_records(object_, n_records):
+    """Records decoded from json, every string is a distinct object, like
+    records parsed from api responses.
+    """
+    departments = ["sales", "engineering", "support", "marketing"]
+    records = list()
+    for i in range(n_records):
+        record = {"id": "%024x" % i}
+        for field in object_:
+            if field.type == "multiple_choice":
+                record[field.name] = departments[i % 4]
+            elif field.type in ("number", "currency", "rating"):
+                record[field.name] = i
+            elif field.type == "boolean":
+                record[field.name] = bool(i % 2)
+            else:
+                record[field.name] = "%s %s" % (field.name, i % 1000)
+        records.append(record)
+    return json.loads(json.dumps(records))
+
+def measure(func):
+    tracemalloc.start()
+    value = func()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return value, size
+
+def benchmark(n_records=100000):
+    application = Application.from_json(os.path.join(HERE, "schema.json"))
+    object_ = application.get_object("test_object")
+    text = json.dumps(make_records(object_, n_records))
+
+    _, dict_size = measure(lambda: json.loads(text))
+
+    def load_store(intern_fields=None):
+        store = RecordStore(object_, intern_fields=intern_fields)
+        store.extend(json.loads(text))
+        return store
+    _, store_size = measure(load_store)
+    _, interned_size = measure(lambda: load_store(True))
+
+    print("%s records, %s fields" % (n_records, len(object_.f)))
+    for name, size in [("list of dict", dict_size),
+                       ("RecordStore", store_size),
+                       ("interned", interned_size)]:
+        print("%-14s %8.1f MB %6.0f bytes per record" % (
+            name, size / 1e6, float(size) / n_records))
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Local http server standing in for the knackhq api, used by the tests which
+don't need a knackhq account.
+
+Usage::
+
+    class Handler(StubHandler):
+        def do_GET(self):
+            self.reply({"records": []})
+
+    server, base = serve(Handler)
+    client = KnackhqClient(StubAuth(base), application)
+    ...
+    stop(server)
+"""
+
+from pyknackhq.client import KnackhqAuth
+from requests.adapters import HTTPAdapter
+import threading
+import json
+import sys
+
+try:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from socketserver import ThreadingMixIn
+except ImportError: # Python2
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+    from SocketServer import ThreadingMixIn
+
+API = "https://api.knackhq.com"
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Base request handler, keep-alive, silent.
+    """
+    protocol_version = "HTTP/1.1" # keep-alive
+
+    def reply(self, body, status=200):
+        """Send ``body`` as json.
+        """
+        content = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def read_body(self):
+        length = int(self.headers["Content-Length"])
+        return self.rfile.read(length)
+
+    def log_message(self, *args):
+        pass
+
+class StubServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # a client closing its connection early is expected
+        if not isinstance(sys.exc_info()[1], (IOError, OSError)):
+            HTTPServer.handle_error(self, request, client_address)
+
+class RedirectAdapter(HTTPAdapter):
+    """Send requests for ``prefix`` to the stub server.
+    """
+    def __init__(self, base, prefix=API):
+        HTTPAdapter.__init__(self)
+        self.base = base
+        self.prefix = prefix
+
+    def send(self, request, **kwargs):
+        request.url = request.url.replace(self.prefix, self.base, 1)
+        return HTTPAdapter.send(self, request, **kwargs)
+
+class StubAuth(KnackhqAuth):
+    """Auth whose sessions send knackhq api requests to the stub server.
+    ``sessions`` is the id of every session created.
+    """
+    def __init__(self, base):
+        KnackhqAuth.__init__(self, "app id", "api key")
+        self.base = base
+        self.sessions = set()
+
+    def new_session(self):
+        session = KnackhqAuth.new_session(self)
+        session.mount(API, RedirectAdapter(self.base))
+        self.sessions.add(id(session))
+        return session
+
+def serve(handler_class):
+    """Start a stub server on a free local port in a background thread.
+    Returns ``(server, base url)``.
+    """
+    server = StubServer(("127.0.0.1", 0), handler_class)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server, "http://127.0.0.1:%s" % server.server_address[1]
+
+def stop(server):
+    server.shutdown()
+    server.server_close()
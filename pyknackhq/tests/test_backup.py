@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Round trip of :mod:`pyknackhq.backup` against a local stub server holding
+the records in memory, no knackhq account is needed.
+
+Usage::
+
+    $ python test_backup.py
+"""
+
+from pyknackhq.client import KnackhqClient
+from pyknackhq.schema import Application
+from pyknackhq.backup import backup, restore, MANIFEST_FILE
+from pyknackhq.tests.stub import StubHandler, StubAuth, serve, stop
+from collections import OrderedDict
+import unittest
+import threading
+import warnings
+import tempfile
+import shutil
+import json
+import os
+import re
+
+try:
+    from urllib.parse import urlparse, parse_qs
+except ImportError: # Python2
+    from urlparse import urlparse, parse_qs
+
+URL = re.compile(r"^/v1/objects/(object_\d+)/records(?:/([^/?]+))?")
+
+def to_raw(value):
+    """Connection ids sent by the client to the stored raw value.
+    """
+    if isinstance(value, list):
+        return [{"id": id_, "identifier": id_} for id_ in value]
+    return value
+
+class Handler(StubHandler):
+    """In memory knackhq, ``server.db`` is ``{object_key: {id: record}}``,
+    ``server.writes`` is every ``(method, object_key)`` in order.
+    """
+    def do_GET(self):
+        object_key, _ = URL.match(self.path).groups()
+        query = parse_qs(urlparse(self.path).query)
+        page = int(query["page"][0])
+        rows_per_page = int(query["rows_per_page"][0])
+        records = list(self.server.db.get(object_key, dict()).values())
+        start = (page - 1) * rows_per_page
+        page_records = list()
+        for record in records[start:start + rows_per_page]:
+            data = {"id": record["id"]}
+            for key, value in record.items():
+                if key != "id":
+                    data[key] = data["%s_raw" % key] = value
+            page_records.append(data)
+        self.reply({
+            "total_pages": (len(records) + rows_per_page - 1) // rows_per_page,
+            "current_page": page, "total_records": len(records),
+            "records": page_records})
+
+    def do_POST(self):
+        object_key, _ = URL.match(self.path).groups()
+        data = json.loads(self.read_body().decode("utf-8"))
+        with self.server.lock:
+            self.server.writes.append(("POST", object_key))
+            self.server.next_id += 1
+            record = {"id": "new%s" % self.server.next_id}
+        for key, value in data.items():
+            record[key] = to_raw(value)
+        self.server.db.setdefault(object_key, OrderedDict())[record["id"]] = \
+            record
+        self.reply(record)
+
+    def do_PUT(self):
+        object_key, id_ = URL.match(self.path).groups()
+        data = json.loads(self.read_body().decode("utf-8"))
+        with self.server.lock:
+            self.server.writes.append(("PUT", object_key))
+        record = self.server.db[object_key][id_]
+        for key, value in data.items():
+            record[key] = to_raw(value)
+        self.reply(record)
+
+def make_application():
+    """A note belongs to a person, a person works for a company and has a
+    manager, another person. The notes come first, so schema order is not
+    dependency order.
+    """
+    return Application(name="app", objects=[
+        {"key": "object_3", "name": "note", "fields": [
+            {"key": "field_30", "name": "text", "type": "short_text"},
+            {"key": "field_31", "name": "author", "type": "connection",
+             "relationship": {"object": "object_2"}}]},
+        {"key": "object_2", "name": "person", "fields": [
+            {"key": "field_20", "name": "name", "type": "short_text"},
+            {"key": "field_21", "name": "company", "type": "connection",
+             "relationship": {"object": "object_1"}},
+            {"key": "field_22", "name": "manager", "type": "connection",
+             "relationship": {"object": "object_2"}}]},
+        {"key": "object_1", "name": "company", "fields": [
+            {"key": "field_10", "name": "name", "type": "short_text"}]},
+    ])
+
+def conn(*ids):
+    return [{"id": id_, "identifier": id_} for id_ in ids]
+
+def make_db():
+    return {
+        "object_1": OrderedDict([
+            ("c1", {"id": "c1", "field_10": "acme"})]),
+        "object_2": OrderedDict([
+            ("p1", {"id": "p1", "field_20": "alice", "field_21": conn("c1"),
+                    "field_22": conn()}),
+            ("p2", {"id": "p2", "field_20": "bob", "field_21": conn("c1"),
+                    "field_22": conn("p1")})]),
+        "object_3": OrderedDict([
+            ("n1", {"id": "n1", "field_30": "hello",
+                    "field_31": conn("p2")})]),
+    }
+
+def ids(value):
+    return [v["id"] for v in value]
+
+class BackupUnittest(unittest.TestCase):
+    def setUp(self):
+        self.server, base = serve(Handler)
+        self.server.lock = threading.Lock()
+        self.server.db = make_db()
+        self.server.writes = list()
+        self.server.next_id = 0
+        self.client = KnackhqClient(StubAuth(base), make_application())
+        self.client.auth.budget = None
+        self.dirpath = tempfile.mkdtemp()
+
+    def tearDown(self):
+        stop(self.server)
+        shutil.rmtree(self.dirpath)
+
+    def backup_and_clear(self):
+        manifest = backup(self.client, self.dirpath, workers=2)
+        self.assertEqual(manifest,
+                         {"object_1": 1, "object_2": 2, "object_3": 1})
+        self.server.db = dict()
+
+    def find(self, object_key, field_key, value):
+        for record in self.server.db[object_key].values():
+            if record[field_key] == value:
+                return record
+
+    def test_round_trip(self):
+        self.backup_and_clear()
+        results = restore(self.client, self.dirpath, workers=2)
+        for key in ["object_1", "object_2", "object_3"]:
+            self.assertEqual(results[key].failed, [])
+        self.assertEqual(results["connections"].failed, [])
+
+        # inserted in dependency order, self reference set afterwards
+        posts = [key for method, key in self.server.writes if method == "POST"]
+        self.assertEqual(posts,
+                         ["object_1", "object_2", "object_2", "object_3"])
+        self.assertEqual(self.server.writes[-1], ("PUT", "object_2"))
+
+        # connections point to the new id
+        company = self.find("object_1", "field_10", "acme")
+        alice = self.find("object_2", "field_20", "alice")
+        bob = self.find("object_2", "field_20", "bob")
+        note = self.find("object_3", "field_30", "hello")
+        self.assertNotEqual(company["id"], "c1")
+        self.assertEqual(ids(alice["field_21"]), [company["id"]])
+        self.assertEqual(ids(bob["field_21"]), [company["id"]])
+        self.assertEqual(ids(bob["field_22"]), [alice["id"]])
+        self.assertEqual(ids(note["field_31"]), [bob["id"]])
+
+    def test_partial_restore_warns(self):
+        self.backup_and_clear()
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            restore(self.client, self.dirpath,
+                    object_keys=["object_2", "object_3"])
+        messages = [str(w.message) for w in caught]
+        self.assertEqual(len(messages), 1)
+        self.assertIn("object_2.field_21", messages[0])
+        self.assertNotIn("object_1", self.server.db)
+        bob = self.find("object_2", "field_20", "bob")
+        self.assertNotIn("field_21", bob)
+        self.assertEqual(len(ids(bob["field_22"])), 1)
+
+    def test_missing_manifest(self):
+        self.backup_and_clear()
+        os.remove(os.path.join(self.dirpath, MANIFEST_FILE))
+        with self.assertRaises(IOError):
+            restore(self.client, self.dirpath)
+        with self.assertRaises(IOError):
+            restore(self.client, self.dirpath, object_keys=["object_1"])
+        self.assertEqual(self.server.writes, [])
+
+if __name__ == "__main__":
+    unittest.main()
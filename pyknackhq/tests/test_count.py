@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+:meth:`~pyknackhq.client.Collection.count` and
+:meth:`~pyknackhq.client.Collection.explain` against a local stub server,
+no knackhq account is needed. A failed request raises
+:class:`~pyknackhq.exc.KnackhqError` with its http status.
+
+Usage::
+
+    $ python test_count.py
+"""
+
+from pyknackhq.client import KnackhqClient
+from pyknackhq.schema import Application
+from pyknackhq.exc import KnackhqError
+from pyknackhq.tests.stub import StubHandler, StubAuth, serve, stop
+import unittest
+
+class Handler(StubHandler):
+    """A one row page of 42 records, or status ``server.status`` if set.
+    """
+    def do_GET(self):
+        if self.server.status:
+            return self.reply({"errors": [{"message": "try later"}]},
+                              self.server.status)
+        self.reply({"total_pages": 42, "current_page": 1,
+                    "total_records": 42,
+                    "records": [{"id": "a", "field_1": "alice",
+                                 "field_1_raw": "alice"}]})
+
+def make_application():
+    return Application(name="app", objects=[
+        {"key": "object_1", "name": "person", "fields": [
+            {"key": "field_1", "name": "name", "type": "short_text"}]},
+    ])
+
+class CountUnittest(unittest.TestCase):
+    def setUp(self):
+        self.server, base = serve(Handler)
+        self.server.status = None
+        self.client = KnackhqClient(StubAuth(base), make_application())
+        self.client.auth.budget = None
+        self.collection = self.client.get_collection("person")
+
+    def tearDown(self):
+        stop(self.server)
+
+    def test_count(self):
+        self.assertEqual(self.collection.count(exact=True), 42)
+        self.assertEqual(
+            self.collection.explain("delete").records, 42)
+
+    def test_failed_request(self):
+        self.server.status = 503
+        with self.assertRaises(KnackhqError) as cm:
+            self.collection.count(exact=True)
+        self.assertEqual(cm.exception.status, 503)
+        with self.assertRaises(KnackhqError) as cm:
+            self.collection.explain("delete")
+        self.assertEqual(cm.exception.status, 503)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Immutable :mod:`pyknackhq.datatype` instances can be copied and pickled.
+
+Usage::
+
+    $ python test_datatype.py
+"""
+
+from pyknackhq.datatype import (
+    ShortTextType, MultipleChoiceType, DateTimeType, DateTimeFromToType,
+    FileType, ImageType, AddressType, TimerType,
+)
+from datetime import datetime, date
+import unittest
+import pickle
+import copy
+
+class DataTypeUnittest(unittest.TestCase):
+    def values(self):
+        return [
+            ShortTextType("Hello"),
+            MultipleChoiceType(["First Choice", "Second Choice"]),
+            DateTimeType(datetime(2015, 7, 1, 14, 30)),
+            DateTimeFromToType(date(2015, 7, 1), date(2015, 7, 31),
+                               repeat={"frequency": "weekly"}),
+            FileType("asset1", filename="report.pdf", url="http://x/1"),
+            ImageType(url="http://x/image.jpg"),
+            AddressType(street="2130 H St NW", city="Washington"),
+            TimerType(datetime(2015, 1, 1), datetime(2015, 1, 1, 23, 59)),
+        ]
+
+    def assertSameValue(self, value, other):
+        self.assertTrue(type(other) is type(value))
+        self.assertEqual(other.__getstate__(), value.__getstate__())
+        with self.assertRaises(AttributeError):
+            other._data = None
+
+    def test_copy(self):
+        for value in self.values():
+            self.assertSameValue(value, copy.copy(value))
+            self.assertSameValue(value, copy.deepcopy(value))
+
+    def test_pickle(self):
+        for value in self.values():
+            for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+                self.assertSameValue(
+                    value, pickle.loads(pickle.dumps(value, protocol)))
+
+    def test_multiple_choice_is_copied(self):
+        choices = ["First Choice"]
+        value = MultipleChoiceType(choices)
+        choices.append("Second Choice")
+        self.assertEqual(value.value, ["First Choice"])
+
+if __name__ == "__main__":
+    unittest.main()
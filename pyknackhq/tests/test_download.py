@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+:func:`pyknackhq.download.download_assets` against a local stub server
+serving the asset urls, no knackhq account is needed.
+
+- an asset already in the cache index is not fetched again
+- an asset used by many records is fetched once
+- identical content under different assets is stored once
+- a failed download leaves no ``.part`` file behind
+
+Usage::
+
+    $ python test_download.py
+"""
+
+from pyknackhq.download import download_assets
+from pyknackhq.exc import KnackhqError
+from pyknackhq.tests.stub import StubHandler, serve, stop
+import threading
+import tempfile
+import unittest
+import shutil
+import os
+
+CONTENT = {
+    "/assets/a1.txt": b"alpha" * 1000,
+    "/assets/a2.txt": b"alpha" * 1000, # same content, another asset
+    "/assets/b.txt": b"beta" * 1000,
+}
+
+class Handler(StubHandler):
+    """Serve :data:`CONTENT`. ``/assets/broken.txt`` announces more bytes
+    than it sends, anything else is 404. Requests are counted by path in
+    ``server.hits``.
+    """
+    def do_GET(self):
+        with self.server.lock:
+            self.server.hits[self.path] = self.server.hits.get(self.path, 0) + 1
+        if self.path == "/assets/broken.txt":
+            self.send_response(200)
+            self.send_header("Content-Length", "100000")
+            self.end_headers()
+            self.wfile.write(b"partial")
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        try:
+            content = CONTENT[self.path]
+        except KeyError:
+            return self.reply({"error": "not found"}, 404)
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+class DownloadUnittest(unittest.TestCase):
+    def setUp(self):
+        self.server, self.base = serve(Handler)
+        self.server.hits = dict()
+        self.server.lock = threading.Lock()
+        self.dirpath = tempfile.mkdtemp()
+
+    def tearDown(self):
+        stop(self.server)
+        shutil.rmtree(self.dirpath)
+
+    def asset(self, id_, path):
+        return {"id": id_, "filename": os.path.basename(path),
+                "url": self.base + path}
+
+    def stored_files(self):
+        paths = list()
+        for root, _, basenames in os.walk(self.dirpath):
+            paths.extend([os.path.join(root, basename)
+                          for basename in basenames])
+        return paths
+
+    def test_download(self):
+        values = [
+            self.asset("1", "/assets/a1.txt"),
+            self.asset("1", "/assets/a1.txt"), # shared by two records
+            self.asset("2", "/assets/a2.txt"),
+            self.asset("3", "/assets/b.txt"),
+            None,
+        ]
+        result = download_assets(values, self.dirpath, workers=3)
+        self.assertTrue(result.ok)
+        self.assertEqual(self.server.hits, {
+            "/assets/a1.txt": 1, "/assets/a2.txt": 1, "/assets/b.txt": 1})
+        paths = result.results
+        self.assertEqual(paths[0], paths[1])
+        self.assertEqual(paths[0], paths[2]) # same content, same file
+        self.assertNotEqual(paths[0], paths[3])
+        self.assertEqual(paths[4], None)
+        with open(paths[3], "rb") as f:
+            self.assertEqual(f.read(), CONTENT["/assets/b.txt"])
+        objects = [path for path in self.stored_files()
+                   if os.path.basename(path) != "index.json"]
+        self.assertEqual(len(objects), 2)
+
+        # everything is in the index now, nothing is fetched again
+        result = download_assets(values, self.dirpath, workers=3)
+        self.assertEqual(result.results, paths)
+        self.assertEqual(result.skipped, 3)
+        self.assertEqual(sum(self.server.hits.values()), 3)
+
+    def test_failed_download(self):
+        values = [
+            self.asset("1", "/assets/broken.txt"),
+            self.asset("2", "/assets/missing.txt"),
+            self.asset("3", "/assets/b.txt"),
+        ]
+        result = download_assets(values, self.dirpath)
+        self.assertEqual(result.failed_inputs, values[:2])
+        for _, _, error in result.failed:
+            self.assertTrue(isinstance(error, KnackhqError))
+        self.assertEqual(result.failed[1][2].status, 404)
+        self.assertTrue(os.path.exists(result.results[2]))
+        self.assertEqual(
+            [path for path in self.stored_files() if path.endswith(".part")],
+            [])
+
+        # failed assets are not in the index, they are fetched again
+        download_assets(values[:1], self.dirpath)
+        self.assertEqual(self.server.hits["/assets/broken.txt"], 2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Measure the start up cost of ``import pyknackhq`` and ``pyknackhq --help``.
+Each measurement runs in a fresh interpreter, so nothing is cached.
+
+Usage::
+
+    $ python test_import_time.py
+"""
+
+from __future__ import print_function
+import subprocess
+import unittest
+import sys
+import os
+
+PACKAGE_PARENT = os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__))))
+
+def run(code):
+    env = dict(os.environ)
+    env["PYTHONPATH"] = PACKAGE_PARENT
+    return subprocess.check_output(
+        [sys.executable, "-c", code], env=env).decode("utf-8").strip()
+
+def import_time(statement, number=5):
+    """Best wall time in milliseconds of running ``statement`` in a new
+    interpreter.
+    """
+    code = ("import time; st = time.time(); %s; "
+            "print((time.time() - st) * 1000)" % statement)
+    return min([float(run(code)) for _ in range(number)])
+
+class ImportTimeUnittest(unittest.TestCase):
+    def test_lazy(self):
+        loaded = run("import sys, pyknackhq; "
+                     "print(sorted(m for m in ['requests', 'pyknackhq.client', "
+                     "'pyknackhq.datatype'] if m in sys.modules))")
+        self.assertEqual(loaded, "[]")
+        loaded = run("import sys, pyknackhq.cli; "
+                     "print('requests' in sys.modules)")
+        self.assertEqual(loaded, "False")
+
+    def test_attribute_access(self):
+        self.assertEqual(
+            run("import pyknackhq; print(pyknackhq.KnackhqClient.__name__)"),
+            "KnackhqClient")
+
+    def test_import_time(self):
+        lazy = import_time("import pyknackhq")
+        cli = import_time("import pyknackhq.cli")
+        full = import_time("import pyknackhq.client")
+        print("\nimport pyknackhq: %.1f ms, pyknackhq.cli: %.1f ms, "
+              "pyknackhq.client: %.1f ms" % (lazy, cli, full))
+        self.assertTrue(lazy < full)
+
+if __name__ == "__main__":
+    unittest.main()
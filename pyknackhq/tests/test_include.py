@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Batched lookups of :mod:`pyknackhq.include` against a local stub server,
+no knackhq account is needed. A failed query is an error, never a miss.
+
+Usage::
+
+    $ python test_include.py
+"""
+
+from pyknackhq.client import KnackhqClient
+from pyknackhq.schema import Application
+from pyknackhq.include import ConnectionResolver, fetch_by
+from pyknackhq.exc import KnackhqError
+from pyknackhq.tests.stub import StubHandler, StubAuth, serve, stop
+import unittest
+import json
+
+try:
+    from urllib.parse import urlparse, parse_qs
+except ImportError: # Python2
+    from urlparse import urlparse, parse_qs
+
+CUSTOMERS = dict([("c%s" % i, {"id": "c%s" % i, "field_20": "cust%s" % i,
+                               "field_20_raw": "cust%s" % i})
+                  for i in range(5)])
+
+class Handler(StubHandler):
+    """Answer an ``or`` filter query on customer id, ``server.page_size``
+    records per page. Status ``server.status`` is returned instead if it
+    is set.
+    """
+    def do_GET(self):
+        self.server.requests += 1
+        if self.server.status:
+            return self.reply({"errors": [{"message": "try later"}]},
+                              self.server.status)
+        query = parse_qs(urlparse(self.path).query)
+        rules = json.loads(query["filters"][0])["rules"]
+        records = [CUSTOMERS[rule["value"]] for rule in rules
+                   if rule["value"] in CUSTOMERS]
+        size = self.server.page_size
+        page = int(query["page"][0])
+        self.reply({"total_pages": max(1, -(-len(records) // size)),
+                    "records": records[(page - 1) * size:page * size]})
+
+def make_application():
+    return Application(name="app", objects=[
+        {"key": "object_1", "name": "order", "fields": [
+            {"key": "field_10", "name": "number", "type": "short_text"},
+            {"key": "field_1", "name": "customer", "type": "connection",
+             "relationship": {"object": "object_2"}}]},
+        {"key": "object_2", "name": "customer", "fields": [
+            {"key": "field_20", "name": "name", "type": "short_text"}]},
+    ])
+
+class IncludeUnittest(unittest.TestCase):
+    def setUp(self):
+        self.server, base = serve(Handler)
+        self.server.requests = 0
+        self.server.status = None
+        self.server.page_size = 1000
+        self.client = KnackhqClient(StubAuth(base), make_application())
+        self.client.auth.budget = None
+
+    def tearDown(self):
+        stop(self.server)
+
+    def orders(self):
+        return [{"id": "o%s" % i, "customer": [{"id": id_, "identifier": ""}]}
+                for i, id_ in enumerate(["c1", "c2", "c1", "c9"])]
+
+    def test_resolve(self):
+        resolver = ConnectionResolver(
+            self.client.get_collection("order"), ["customer"])
+        records = resolver.resolve(self.orders())
+        self.assertEqual(self.server.requests, 1)
+        self.assertEqual(records[0]["customer"], [{"id": "c1", "name": "cust1"}])
+        self.assertEqual(records[3]["customer"], [{"id": "c9", "identifier": ""}])
+        self.assertEqual(resolver.not_found, set(["c9"]))
+
+    def test_failed_query_is_not_a_miss(self):
+        resolver = ConnectionResolver(
+            self.client.get_collection("order"), ["customer"])
+        self.server.status = 429
+        with self.assertRaises(KnackhqError) as cm:
+            resolver.resolve(self.orders())
+        self.assertEqual(cm.exception.status, 429)
+        self.assertEqual(resolver.not_found, set())
+
+        self.server.status = None # the same ids are fetched again
+        records = resolver.resolve(self.orders())
+        self.assertEqual(records[1]["customer"], [{"id": "c2", "name": "cust2"}])
+        self.assertEqual(resolver.not_found, set(["c9"]))
+
+    def test_get_many(self):
+        collection = self.client.get_collection("customer")
+        result = collection.get_many(["c3", "c1", "c9", "c3"], chunk_size=2)
+        self.assertEqual(list(result), ["c3", "c1", "c9"])
+        self.assertEqual(result["c1"], {"id": "c1", "name": "cust1"})
+        self.assertEqual(result["c9"], None)
+        self.assertEqual(self.server.requests, 2)
+
+        self.server.status = 503
+        with self.assertRaises(KnackhqError) as cm:
+            collection.get_many(["c3", "c1", "c9"], chunk_size=2, workers=2)
+        self.assertEqual(cm.exception.status, 503)
+
+    def test_fetch_by_pages(self):
+        self.server.page_size = 2
+        records = fetch_by(self.client.get_collection("customer"), "id",
+                           ["c0", "c1", "c2", "c3", "c4", "c9"])
+        self.assertEqual([record["id"] for record in records],
+                         ["c0", "c1", "c2", "c3", "c4"])
+        self.assertEqual(self.server.requests, 3)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+:func:`~pyknackhq.reconcile.plan_reconcile` against a local stub server,
+no knackhq account is needed. The key field is an email field, whose raw
+value knackhq returns as a dict with a label.
+
+Usage::
+
+    $ python test_reconcile.py
+"""
+
+from pyknackhq.client import KnackhqClient
+from pyknackhq.schema import Application
+from pyknackhq.reconcile import plan_reconcile
+from pyknackhq.tests.stub import StubHandler, StubAuth, serve, stop
+import unittest
+
+PEOPLE = [("alice@example.com", "alice"), ("bob@example.com", "bob"),
+          ("carol@example.com", "carol")]
+
+class Handler(StubHandler):
+    """One page with all records of ``server.people``.
+    """
+    def do_GET(self):
+        records = list()
+        for i, (email, name) in enumerate(self.server.people):
+            records.append({
+                "id": "r%s" % i,
+                "field_1": '<a href="mailto:%s">%s</a>' % (email, name),
+                "field_1_raw": {"email": email, "label": name},
+                "field_2": name, "field_2_raw": name,
+            })
+        self.reply({"total_pages": 1, "current_page": 1,
+                    "total_records": len(records), "records": records})
+
+def make_application():
+    return Application(name="app", objects=[
+        {"key": "object_1", "name": "person", "fields": [
+            {"key": "field_1", "name": "email", "type": "email"},
+            {"key": "field_2", "name": "name", "type": "short_text"}]},
+    ])
+
+class ReconcileUnittest(unittest.TestCase):
+    def setUp(self):
+        self.server, base = serve(Handler)
+        self.server.people = list(PEOPLE)
+        self.client = KnackhqClient(StubAuth(base), make_application())
+        self.client.auth.budget = None
+        self.collection = self.client.get_collection("person")
+
+    def tearDown(self):
+        stop(self.server)
+
+    def test_labeled_key_field(self):
+        source = [{"email": email, "name": name} for email, name in PEOPLE]
+        plan = plan_reconcile(self.collection, source, "email")
+        self.assertEqual(plan.summary()["unchanged"], 3)
+        self.assertEqual(plan.api_calls, 0)
+
+        source[1]["name"] = "bobby"
+        source[2] = {"email": "dave@example.com", "name": "dave"}
+        plan = plan_reconcile(self.collection, source, "email")
+        self.assertEqual(plan.updates, [("r1", {"field_2": "bobby"})])
+        self.assertEqual(plan.inserts, [
+            {"field_1": {"email": "dave@example.com"}, "field_2": "dave"}])
+        self.assertEqual(plan.deletes, ["r2"])
+        self.assertEqual(plan.unchanged, 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Stress test of one :class:`~pyknackhq.client.KnackhqClient` shared by many
+threads, against a local http server standing in for the knackhq api. No
+knackhq account is needed.
+
+- every response reaches the thread which sent the request
+- each thread keeps one keep-alive connection, its own session
+- all threads together stay within the shared rate budget
+- field lookups keep working while the schema is refreshed
+
+Usage::
+
+    $ python test_thread_safety.py
+"""
+
+from __future__ import print_function
+from pyknackhq.client import KnackhqClient
+from pyknackhq.schema import Application
+from pyknackhq.pool import RateBudget, map_concurrent
+from pyknackhq.exc import KnackhqError
+from pyknackhq.tests.stub import StubHandler, StubAuth, serve, stop
+import threading
+import unittest
+import copy
+import time
+import sys
+import json
+import os
+
+try:
+    from urllib.parse import urlparse, parse_qs
+except ImportError: # Python2
+    from urlparse import urlparse, parse_qs
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+class Handler(StubHandler):
+    """Answer a find with one record echoing the filter value, an insert
+    with the posted data. Client ports are recorded to count connections.
+    """
+    def do_GET(self):
+        self.server.ports.add(self.client_address[1])
+        query = parse_qs(urlparse(self.path).query)
+        rule = json.loads(query["filters"][0])[0]
+        if rule["value"] == "error":
+            return self.reply({"errors": [{"message": "unavailable"}]}, 503)
+        self.reply({"total_pages": 1, "total_records": 1, "records": [
+            {"id": "id-%s" % rule["value"],
+             "%s_raw" % rule["field"]: rule["value"]}]})
+
+    def do_POST(self):
+        self.server.ports.add(self.client_address[1])
+        data = json.loads(self.read_body().decode("utf-8"))
+        data["id"] = "new"
+        self.reply(data)
+
+class ThreadSafetyUnittest(unittest.TestCase):
+    workers = 16
+
+    def setUp(self):
+        self.server, base = serve(Handler)
+        self.server.ports = set()
+        self.auth = StubAuth(base)
+        self.client = KnackhqClient(self.auth, Application.from_json(
+            os.path.join(HERE, "schema.json")))
+
+    def tearDown(self):
+        stop(self.server)
+
+    def run_jobs(self, n):
+        def job(i):
+            collection = self.client.get_collection("test_object")
+            if i % 2:
+                res = collection.insert_one({"short text field": str(i)})
+                return res["id"] == "new" and \
+                    res[collection.get_field_key("short text field")] == str(i)
+            records = collection.find([{"field": "short text field",
+                                        "operator": "is", "value": str(i)}])
+            return records == [{"id": "id-%s" % i, "short text field": str(i)}]
+        return map_concurrent(job, range(n), workers=self.workers)
+
+    def test_stress(self):
+        self.auth.budget = None
+        st = time.time()
+        results = self.run_jobs(2000)
+        elapsed = time.time() - st
+        self.assertTrue(all(results))
+        self.assertTrue(len(self.auth.sessions) <= self.workers)
+        self.assertTrue(len(self.server.ports) <= self.workers)
+        print("\n2000 requests, %s threads: %.2f sec, %s connections" % (
+            self.workers, elapsed, len(self.server.ports)))
+
+    def test_stream_error_status(self):
+        collection = self.client.get_collection("test_object")
+        filter = [{"field": "short text field", "operator": "is",
+                   "value": "error"}]
+        with self.assertRaises(KnackhqError) as cm:
+            list(collection.iter_find(filter))
+        self.assertEqual(cm.exception.status, 503)
+        self.assertEqual(cm.exception.message, "unavailable")
+
+    def test_shared_budget(self):
+        self.auth.budget = RateBudget(rate=200, burst=1)
+        st = time.time()
+        results = self.run_jobs(300)
+        elapsed = time.time() - st
+        self.assertTrue(all(results))
+        self.assertTrue(elapsed >= 1.4) # 300 requests at 200 per second
+
+class SchemaRefreshUnittest(unittest.TestCase):
+    def setUp(self):
+        with open(os.path.join(HERE, "schema.json")) as f:
+            self.schema = json.load(f)
+        self.client = KnackhqClient(StubAuth("http://127.0.0.1:1"),
+                                    Application.from_dict(
+                                        copy.deepcopy(self.schema)))
+
+    def application(self, version):
+        """Schema with a description changed, so test_object differs.
+        """
+        schema = copy.deepcopy(self.schema)
+        for object_ in schema["application"]["objects"]:
+            if object_["key"] == "object_5":
+                object_["fields"][0]["description"] = str(version)
+        return Application.from_dict(schema)
+
+    def test_get_field_during_refresh(self):
+        collection = self.client.get_collection("test_object")
+        applications = [self.application(i) for i in range(200)]
+        errors = list()
+        done = threading.Event()
+
+        def lookup():
+            while not done.is_set():
+                try:
+                    collection.get_field("short text field")
+                    collection.get_field_key("Short Text Field")
+                except Exception as e:
+                    errors.append(e)
+        threads = [threading.Thread(target=lookup) for _ in range(4)]
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6) # switch threads as often as possible
+        for thread in threads:
+            thread.start()
+        try:
+            for application in applications:
+                self.assertTrue(self.client.refresh_schema(application))
+        finally:
+            done.set()
+            for thread in threads:
+                thread.join()
+            sys.setswitchinterval(interval)
+        self.assertEqual(errors, [])
+        self.assertEqual(collection.schema_version, 200)
+
+    def test_watcher_keeps_polling(self):
+        applications = [self.application(i) for i in range(3)]
+        calls = list()
+
+        def fetch_application():
+            calls.append(None)
+            if len(calls) == 1:
+                raise KeyError("objects") # malformed schema
+            return applications[len(calls) % 3]
+
+        def callback(diff):
+            raise RuntimeError("callback failed")
+
+        self.client.fetch_application = fetch_application
+        watcher = self.client.watch_schema(interval=0.02, callback=callback)
+        time.sleep(0.3)
+        watcher.stop()
+        self.assertTrue(len(calls) > 3)
+        self.assertTrue(isinstance(watcher.error, RuntimeError))
+
+if __name__ == "__main__":
+    unittest.main()
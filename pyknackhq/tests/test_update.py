@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Bulk :meth:`~pyknackhq.client.Collection.update` against a local stub
+server, with a :class:`~pyknackhq.snapshot.Snapshot` and a retry of the
+failed records, no knackhq account is needed.
+
+Usage::
+
+    $ python test_update.py
+"""
+
+from pyknackhq.client import KnackhqClient
+from pyknackhq.schema import Application
+from pyknackhq.snapshot import Snapshot
+from pyknackhq.tests.stub import StubHandler, StubAuth, serve, stop
+import unittest
+import json
+
+class Handler(StubHandler):
+    """Accept every update, except for the record ids in ``server.broken``.
+    ``server.puts`` is every ``(id, payload)`` received.
+    """
+    def do_PUT(self):
+        id_ = self.path.rstrip("/").split("/")[-1]
+        data = json.loads(self.read_body().decode("utf-8"))
+        self.server.puts.append((id_, data))
+        if id_ in self.server.broken:
+            return self.reply({"errors": [{"message": "try later"}]}, 503)
+        record = dict(data)
+        record["id"] = id_
+        self.reply(record)
+
+def make_application():
+    return Application(name="app", objects=[
+        {"key": "object_1", "name": "person", "fields": [
+            {"key": "field_1", "name": "name", "type": "short_text"},
+            {"key": "field_2", "name": "city", "type": "short_text"}]},
+    ])
+
+class UpdateUnittest(unittest.TestCase):
+    def setUp(self):
+        self.server, base = serve(Handler)
+        self.server.puts = list()
+        self.server.broken = set()
+        self.client = KnackhqClient(StubAuth(base), make_application())
+        self.client.auth.budget = None
+        self.collection = self.client.get_collection("person")
+
+    def tearDown(self):
+        stop(self.server)
+
+    def test_snapshot(self):
+        snapshot = Snapshot()
+        snapshot.add_records([
+            {"id": "a", "field_1": "alice", "field_2": "paris"},
+            {"id": "b", "field_1": "bob", "field_2": "rome"},
+        ])
+        records = [
+            {"id": "a", "name": "alice", "city": "paris"}, # unchanged
+            {"id": "b", "name": "bob", "city": "oslo"},
+            {"id": "c", "name": "carol", "city": "lima"}, # not known yet
+        ]
+        result = self.collection.update(iter(records), validate=True,
+                                        snapshot=snapshot, workers=2)
+        self.assertEqual(result.total, 2)
+        self.assertEqual(result.skipped, 1)
+        self.assertTrue(result.ok)
+        self.assertEqual(sorted(self.server.puts), [
+            ("b", {"field_2": "oslo"}),
+            ("c", {"field_1": "carol", "field_2": "lima"}),
+        ])
+
+        # the snapshot knows the new version, nothing is sent again
+        self.server.puts = list()
+        result = self.collection.update(records, snapshot=snapshot)
+        self.assertEqual(result.skipped, 3)
+        self.assertEqual(self.server.puts, [])
+
+    def test_retry_failed(self):
+        snapshot = Snapshot()
+        records = [{"id": "a", "name": "alice"}, {"id": "bad", "name": "bob"}]
+        self.server.broken.add("bad")
+        result = self.collection.update(records, snapshot=snapshot)
+        self.assertEqual(result.succeeded, 1)
+        self.assertEqual(result.failed_inputs, [records[1]])
+        self.assertEqual(result.retryable_inputs, [records[1]])
+        self.assertEqual(result.failed[0][2].status, 503)
+
+        # a failed update is not remembered, the retry sends it again
+        self.server.broken.clear()
+        self.server.puts = list()
+        result = self.collection.update(result.failed_inputs,
+                                        snapshot=snapshot)
+        self.assertTrue(result.ok)
+        self.assertEqual(self.server.puts, [("bad", {"field_1": "bob"})])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -15,4 +15,17 @@ application = Application.from_json(SCHEMA_JSON_PATH)
 client = KnackhqClient(auth=auth, application=application)
 
 upload_url = "https://api.knackhq.com/v1/applications/%s/assets/file/upload" % auth.application_id
-abspath = os.path.abspath("__init__.py")
\ No newline at end of file
+abspath = os.path.abspath("__init__.py")
+
+def upload_test():
+    test_file_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 
+                                 "test_file")
+    paths = [os.path.join(test_file_dir, basename) 
+             for basename in sorted(os.listdir(test_file_dir))]
+    result = client.upload_assets(paths, asset_type="file", workers=3)
+    print(result.summary())
+    file_obj = client.get_collection("file_object")
+    file_obj.insert([{"file field": asset} for asset in result.results 
+                     if asset is not None])
+
+# upload_test()
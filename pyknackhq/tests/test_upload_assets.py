@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+:meth:`~pyknackhq.client.KnackhqClient.upload_assets` against a local stub
+server, no knackhq account is needed.
+
+- the multipart body is sent with a ``Content-Length`` header, not chunked
+- the server receives the exact file content
+- each response maps to a ``FileType`` or ``ImageType``, failures are
+  reported per file
+
+Usage::
+
+    $ python test_upload_assets.py
+"""
+
+from pyknackhq.client import KnackhqClient
+from pyknackhq.schema import Application
+from pyknackhq.datatype import FileType, ImageType
+from pyknackhq.exc import KnackhqError
+from pyknackhq.tests.stub import StubHandler, StubAuth, serve, stop
+import unittest
+import re
+import os
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+class Handler(StubHandler):
+    """Answer an upload with a new asset id, ``file3.txt`` is rejected.
+    Each upload is recorded in ``server.uploads``.
+    """
+    def do_POST(self):
+        content_type = self.headers["Content-Type"]
+        boundary = content_type.split("boundary=")[1].encode("utf-8")
+        body = self.read_body()
+        filename = re.search(b'filename="([^"]+)"', body).group(1)
+        content = body.split(b"\r\n\r\n", 1)[1].rsplit(
+            b"\r\n--" + boundary + b"--\r\n", 1)[0]
+        self.server.uploads.append({
+            "path": self.path,
+            "content_type": content_type,
+            "content_length": self.headers["Content-Length"],
+            "transfer_encoding": self.headers["Transfer-Encoding"],
+            "filename": filename.decode("utf-8"),
+            "content": content,
+        })
+        if filename == b"file3.txt":
+            return self.reply({"errors": [{"message": "rejected"}]}, 400)
+        self.reply({"id": "asset-%s" % len(self.server.uploads),
+                    "filename": filename.decode("utf-8"),
+                    "public_url": "https://assets/%s" % filename.decode()})
+
+class UploadAssetsUnittest(unittest.TestCase):
+    def setUp(self):
+        self.server, base = serve(Handler)
+        self.server.uploads = list()
+        self.client = KnackhqClient(StubAuth(base), Application.from_json(
+            os.path.join(HERE, "schema.json")))
+
+    def tearDown(self):
+        stop(self.server)
+
+    def test_upload_files(self):
+        dirpath = os.path.join(HERE, "test_file")
+        paths = [os.path.join(dirpath, basename) for basename in
+                 ["file1.txt", "file2.txt", "file3.txt", "missing.txt"]]
+        result = self.client.upload_assets(paths, workers=2)
+
+        self.assertEqual(result.total, 4)
+        self.assertEqual(result.failed_inputs, paths[2:])
+        self.assertEqual(result.failed[0][2].status, 400)
+        self.assertFalse(isinstance(result.failed[1][2], KnackhqError))
+        for asset, path in zip(result.results[:2], paths[:2]):
+            self.assertTrue(type(asset) is FileType)
+            self.assertEqual(asset.filename, os.path.basename(path))
+            self.assertTrue(asset.asset_id.startswith("asset-"))
+
+        self.assertEqual(len(self.server.uploads), 3)
+        for upload in self.server.uploads:
+            self.assertTrue("/assets/file/upload" in upload["path"])
+            self.assertTrue(upload["content_type"].startswith(
+                "multipart/form-data; boundary="))
+            self.assertEqual(upload["transfer_encoding"], None)
+            with open(os.path.join(dirpath, upload["filename"]), "rb") as f:
+                self.assertEqual(upload["content"], f.read())
+
+    def test_upload_images(self):
+        abspath = os.path.join(HERE, "test_image", "image1.jpg")
+        result = self.client.upload_assets([abspath], asset_type="image")
+        asset = result.results[0]
+        self.assertTrue(type(asset) is ImageType)
+        self.assertEqual(asset.url, "https://assets/image1.jpg")
+
+        upload = self.server.uploads[0]
+        self.assertTrue("/assets/image/upload" in upload["path"])
+        with open(abspath, "rb") as f:
+            self.assertEqual(upload["content"], f.read())
+        self.assertTrue(int(upload["content_length"]) >
+                        os.path.getsize(abspath))
+
+    def test_asset_type(self):
+        self.assertRaises(ValueError, self.client.upload_assets, [],
+                          asset_type="video")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Module description
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Upload files and images to knackhq, to be used as value of file and image
+fields. See :meth:`~pyknackhq.client.KnackhqClient.upload_assets`.
+
+A file is sent as a ``multipart/form-data`` body built by
+:class:`MultipartFile`. The body is an iterable with a known length, the
+file is read from disk chunk by chunk while it is sent, it is never loaded
+whole in memory. Files are uploaded concurrently, each request takes a
+token from the rate budget of the client.
+
+Each uploaded asset is returned as a :class:`~pyknackhq.datatype.FileType`
+or :class:`~pyknackhq.datatype.ImageType`, its payload is the asset id::
+
+    >>> result = client.upload_assets(["report.pdf"])
+    >>> collection.insert_one({"file field": result.results[0]})
+
+
+Import Command
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+from pyknackhq.upload import MultipartFile, upload_assets
+"""
+
+from pyknackhq.datatype import FileType, ImageType
+from pyknackhq.exc import KnackhqError
+from pyknackhq.pool import run_bulk
+import mimetypes
+import uuid
+import os
+
+UPLOAD_URL = "https://api.knackhq.com/v1/applications/%s/assets/%s/upload"
+
+ASSET_TYPE = {"file": FileType, "image": ImageType}
+
+class MultipartFile(object):
+    """``multipart/form-data`` body of one file, streamed from disk.
+
+    :param abspath: path of the file
+    :param field: form field name
+    :param chunk_size: bytes read from the file at a time
+
+    ``len()`` is the exact body size, so it is sent with a
+    ``Content-Length`` header instead of chunked transfer encoding.
+    """
+    def __init__(self, abspath, field="files", chunk_size=64 * 1024):
+        self.abspath = abspath
+        self.chunk_size = chunk_size
+        self.boundary = uuid.uuid4().hex
+        filename = os.path.basename(abspath)
+        mimetype = mimetypes.guess_type(filename)[0] \
+            or "application/octet-stream"
+        self.head = (
+            "--%s\r\n"
+            "Content-Disposition: form-data; name=\"%s\"; filename=\"%s\"\r\n"
+            "Content-Type: %s\r\n\r\n" % (
+                self.boundary, field, filename.replace('"', "%22"), mimetype)
+        ).encode("utf-8")
+        self.tail = ("\r\n--%s--\r\n" % self.boundary).encode("utf-8")
+        self.size = os.path.getsize(abspath)
+
+    @property
+    def content_type(self):
+        return "multipart/form-data; boundary=%s" % self.boundary
+
+    def __len__(self):
+        return len(self.head) + self.size + len(self.tail)
+
+    def __iter__(self):
+        yield self.head
+        with open(self.abspath, "rb") as f:
+            while True:
+                chunk = f.read(self.chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        yield self.tail
+
+def upload_assets(client, paths, asset_type="file", workers=4):
+    """Upload files concurrently, returns a
+    :class:`~pyknackhq.pool.BulkResult`, ``results`` are
+    :class:`~pyknackhq.datatype.FileType` (or
+    :class:`~pyknackhq.datatype.ImageType`) in input order, None for a
+    failed file.
+
+    :param asset_type: "file" or "image", has to match the field type the
+      assets are used for.
+    """
+    try:
+        klass = ASSET_TYPE[asset_type]
+    except KeyError:
+        raise ValueError("asset_type has to be 'file' or 'image'!")
+    url = UPLOAD_URL % (client.auth.application_id, asset_type)
+
+    def upload(abspath):
+        body = MultipartFile(abspath)
+        res = client.auth.request("POST", url, data=body,
+                                  content_type=body.content_type)
+        try:
+            return klass(res["id"], filename=res.get("filename"),
+                         url=res.get("public_url") or res.get("url"))
+        except (KeyError, TypeError):
+            raise KnackhqError("unexpected response: %r" % (res,),
+                               body=res, url=url)
+
+    return run_bulk(upload, list(paths), workers=workers,
+                    errors=(KnackhqError, IOError, OSError))
+
+if __name__ == "__main__":
+    import unittest
+
+    class MultipartFileUnittest(unittest.TestCase):
+        def test_body(self):
+            abspath = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                   "tests", "test_file", "file1.txt")
+            body = MultipartFile(abspath, chunk_size=4)
+            content = b"".join(body)
+            self.assertEqual(len(content), len(body))
+            with open(abspath, "rb") as f:
+                self.assertIn(b"\r\n\r\n" + f.read() + b"\r\n--", content)
+            self.assertIn(b'filename="file1.txt"', content)
+            self.assertIn(b"Content-Type: text/plain", content)
+
+    unittest.main()
@@ -116,4 +116,7 @@ setup(
     platforms = PLATFORMS,
     license = LICENSE,
     install_requires = REQUIRES,
+    entry_points = {
+        "console_scripts": ["pyknackhq = pyknackhq.cli:main"],
+    },
 )
\ No newline at end of file